@@ -1,13 +1,20 @@
 import logging
-from flask import Flask, jsonify
+import time
+from flask import Flask, Response, g, jsonify, request
 from flask_restx import Api
 from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
 from werkzeug.exceptions import RequestEntityTooLarge
 from .config import Config
 from .routes import ns as ocr_namespace
 from .utils.error_handler import register_error_handlers
 from .schemas.response import error_response
+from .services.cache import OCRCache
+from .services.phash import PerceptualIndex
+from .services.search import SearchIndex
+from .services import vision_client
+from .services.ratelimit import TokenBucketQuota, client_key
+from .services.uploads import UploadRequest, get_byte_budget
+from .utils import metrics, profiling
 
 
 def create_app():
@@ -16,6 +23,8 @@ def create_app():
 
     app = Flask(__name__)
     app.config.from_object(Config)
+    # Large multipart bodies are spooled to disk and mapped, not read into memory
+    app.request_class = UploadRequest
 
     # Configure logging
     logging.basicConfig(
@@ -25,15 +34,37 @@ def create_app():
 
     app.logger.info("App starting up...")
 
-    # Rate limiting
+    # Process-wide OCR result cache, shared by every request in this worker
+    app.extensions["ocr_cache"] = OCRCache.from_config(app.config)
+    # Near-duplicate index over that cache (re-encoded/resized copies of an image)
+    app.extensions["ocr_phash"] = PerceptualIndex.from_config(app.config)
+    # Full-text index of results for /api/search (SEARCH_ENABLED)
+    app.extensions["ocr_search"] = SearchIndex.from_config(app.config)
+
+    # The Vision library is imported and its client pool built off the request
+    # path; /api/health/ready reports when that has finished
+    if app.config["VISION_WARMUP"]:
+        if app.config["VISION_WARMUP_AFTER_FORK"]:
+            # Preloading gunicorn master: import once to share with every
+            # worker, which warms up its own channels after fork (post_fork)
+            vision_client.import_modules()
+            vision_client.defer_warm_up(app.config)
+        else:
+            vision_client.start_warm_up(app.config)
+
+    # Rate limiting (per API key, else per IP); importing .services.ratelimit
+    # registers the sqlite:// storage used to share counters between workers
     limiter = Limiter(
-        key_func=get_remote_address,
-        default_limits=["5 per minute"],  # 5 requests per minute per IP
-        storage_uri="memory://",
+        key_func=client_key,
+        default_limits=[app.config["RATELIMIT_DEFAULT"]],  # 5/min by default
+        storage_uri=app.config["RATELIMIT_STORAGE_URI"],
         headers_enabled=True,
     )
     limiter.init_app(app)
 
+    # Image/byte-weighted quotas, charged by the OCR routes
+    app.extensions["ocr_quota"] = TokenBucketQuota.from_config(app.config)
+
     # Create API with docs
     api = Api(
         app,
@@ -46,7 +77,42 @@ def create_app():
     # Register OCR namespace
     api.add_namespace(ocr_namespace, path="/api")
 
+    # Probes poll these every few seconds and profiles are fetched in bursts;
+    # they must never be rate limited
+    for endpoint in ("OCR_health", "OCR_ready", "OCR_profiles", "OCR_profile_download"):
+        limiter.exempt(app.view_functions[endpoint])
+
     # Register error handlers
     register_error_handlers(app)
 
+    # Sampled per-request profiles (PROFILE_ENABLED); no hooks at all when off
+    profiling.init_app(app)
+
+    # Prometheus metrics (merged across gunicorn workers, see gunicorn.conf.py)
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        start = g.pop("request_start", None)
+        endpoint = request.endpoint or "unknown"
+        if start is not None and endpoint != "metrics":
+            metrics.REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - start)
+            metrics.REQUESTS.labels(endpoint, str(response.status_code)).inc()
+        return response
+
+    @app.teardown_request
+    def release_upload_bytes(exc):
+        # Runs after a streamed response has finished too
+        reserved = g.pop("upload_bytes", 0)
+        if reserved:
+            get_byte_budget(app.config).release(reserved)
+
+    @app.route("/metrics")
+    @limiter.exempt
+    def metrics_endpoint():
+        payload, content_type = metrics.render()
+        return Response(payload, content_type=content_type)
+
     return app
@@ -0,0 +1,349 @@
+"""ASGI entry point: the OCR routes on asyncio (see services/async_ocr.py).
+
+    uvicorn asgi:app --port 8080
+    gunicorn -k uvicorn.workers.UvicornWorker --workers 2 --bind :8080 asgi:app
+
+Each request runs in a request context of the regular Flask app, so rate
+limiting, quotas, upload validation and responses are the same code as under
+WSGI; only the Vision calls are awaited instead of holding a worker.
+/api/extract-text, /api/extract-text-batch and the health probes are served
+here, every other path (jobs, docs, cache stats, metrics) by the Flask app
+on the thread pool.
+"""
+import asyncio, json, logging, sys, tempfile, time
+from flask import Flask, Response, g, request
+from werkzeug.exceptions import ClientDisconnected, HTTPException, RequestEntityTooLarge
+from . import create_app
+from .routes import (
+    admit_batch_upload,
+    admit_single_upload,
+    ocr_error_response,
+    request_deadline,
+    request_priority,
+    wants_mosaic,
+    wants_ndjson,
+)
+from .schemas.response import error_response, ndjson_response, overloaded_response, success_response
+from .services import vision_client
+from .services.admission import Overloaded
+from .services.async_ocr import AsyncOCRService, get_runtime, get_thread_pool, offload
+from .services.ratelimit import client_key
+from .services.ocr_service import batch_result
+from .utils import profiling
+
+logger = logging.getLogger(__name__)
+
+
+def wsgi_environ(scope: dict, body, length: int) -> dict:
+    """A WSGI environ for an ASGI HTTP scope whose body was read into `body`."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "REMOTE_ADDR": client[0],
+        "CONTENT_LENGTH": str(length),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_LENGTH":
+            continue
+        key = name if name == "CONTENT_TYPE" else f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def call_wsgi(app, environ: dict):
+    """Run a WSGI app to completion; returns (status, headers, body)."""
+    started, chunks = [], []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [int(status.split(" ", 1)[0]), headers]
+        return chunks.append
+
+    iterable = app(environ, start_response)
+    try:
+        chunks.extend(iterable)
+    finally:
+        if hasattr(iterable, "close"):
+            iterable.close()
+    return started[0], started[1], b"".join(chunks)
+
+
+def asgi_headers(headers) -> list:
+    return [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+
+
+async def send_response(send, response: Response, stream=None):
+    """Send a Flask response; with `stream` (async iterable of dicts) as NDJSON lines instead of its body."""
+    await send(
+        {
+            "type": "http.response.start",
+            "status": response.status_code,
+            "headers": asgi_headers(response.headers.items()),
+        }
+    )
+    if stream is None:
+        await send({"type": "http.response.body", "body": response.get_data()})
+        return
+    async for item in stream:
+        line = json.dumps(item, ensure_ascii=False) + "\n"
+        await send({"type": "http.response.body", "body": line.encode("utf-8"), "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+
+class OCRApp:
+    """ASGI application serving the OCR routes with AsyncOCRService."""
+
+    def __init__(self, flask_app: Flask):
+        self.flask = flask_app
+        self.config = flask_app.config
+        self.views = {
+            ("POST", "/api/extract-text"): self.extract_text,
+            ("POST", "/api/extract-text-batch"): self.extract_text_batch,
+        }
+        self.probes = {"/api/health": self.health, "/api/health/ready": self.ready}
+        # Outcome of the async client warm-up: ("starting" | "ready" | "failed", error)
+        self.warmup = ("starting", None) if self.config["VISION_WARMUP"] else ("ready", None)
+        self._warmup_task = None
+
+    async def offload(self, fn, *args):
+        # Looked up per call: a forked worker gets a fresh pool
+        return await offload(get_thread_pool(self.config), fn, *args)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self.lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self.http(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                if self.config["VISION_WARMUP"]:
+                    # Like create_app(): serve liveness while the channels connect
+                    self._warmup_task = asyncio.ensure_future(self.warm_up())
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def warm_up(self):
+        """Build this loop's async client pool and optionally wait for its channels."""
+        try:
+            runtime = get_runtime(self.config)
+            timeout = float(self.config.get("VISION_WARMUP_TIMEOUT_SECONDS", 0))
+            for client in runtime.clients.clients if timeout > 0 else ():
+                channel = getattr(getattr(client, "transport", None), "grpc_channel", None)
+                if channel is not None:
+                    try:
+                        await asyncio.wait_for(channel.channel_ready(), timeout)
+                    except asyncio.TimeoutError:
+                        logger.warning("Vision channel not ready after %ss; continuing", timeout)
+            self.warmup = ("ready", None)
+        except Exception as e:
+            logger.exception("Vision warm-up failed")
+            self.warmup = ("failed", str(e))
+
+    def health(self):
+        return {"status": "healthy"}, 200, {}
+
+    def ready(self):
+        # The sync pool is still used for multi-frame images
+        status, error = vision_client.readiness()
+        if status == "ready":
+            status, error = self.warmup
+        if status == "ready":
+            return {"status": status}, 200, {}
+        body = {"status": status}
+        if error:
+            body["error"] = error
+        return body, 503, {"Retry-After": "1"}
+
+    async def read_body(self, scope, receive):
+        """Read the request body into a spooled temp file; returns (file, size)."""
+        limit = self.config.get("MAX_CONTENT_LENGTH")
+        declared = dict(scope["headers"]).get(b"content-length")
+        if limit and declared and declared.isdigit() and int(declared) > limit:
+            raise RequestEntityTooLarge()
+        body = tempfile.SpooledTemporaryFile(
+            max_size=int(self.config.get("UPLOAD_SPOOL_THRESHOLD", 1024 * 1024)),
+            dir=self.config.get("UPLOAD_SPOOL_DIR") or None,
+        )
+        size, more = 0, True
+        try:
+            while more:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    raise ClientDisconnected()
+                chunk = message.get("body", b"")
+                size += len(chunk)
+                if limit and size > limit:
+                    raise RequestEntityTooLarge()
+                body.write(chunk)
+                more = message.get("more_body", False)
+        except BaseException:
+            body.close()
+            raise
+        body.seek(0)
+        return body, size
+
+    async def http(self, scope, receive, send):
+        probe = self.probes.get(scope["path"])
+        if probe is not None and scope["method"] == "GET":
+            payload, status, headers = probe()
+            await send_response(send, Response(json.dumps(payload), status, headers, mimetype="application/json"))
+            return
+
+        try:
+            body, size = await self.read_body(scope, receive)
+        except ClientDisconnected:
+            return
+        except RequestEntityTooLarge:
+            await send_response(send, error_response("File too large", 413))
+            return
+
+        with body:
+            environ = wsgi_environ(scope, body, size)
+            view = self.views.get((scope["method"], scope["path"]))
+            if view is None:
+                status, headers, content = await self.offload(call_wsgi, self.flask, environ)
+                await send({"type": "http.response.start", "status": status, "headers": asgi_headers(headers)})
+                await send({"type": "http.response.body", "body": content})
+                return
+            await self.dispatch(view, environ, send)
+
+    async def dispatch(self, view, environ: dict, send):
+        """Flask's full_dispatch_request around an async view.
+
+        before_request (rate limiting, request timer) and after_request
+        (rate-limit headers, metrics) hooks run on the thread pool; the
+        request context is popped, releasing the upload bytes, only once the
+        response, streamed or not, has been sent. A profiled request samples
+        the pool threads while they work for it; the event loop is shared by
+        every request, so time spent on it is not attributed.
+        """
+        with self.flask.request_context(environ):
+            stream = None
+            if self.config["PROFILE_ENABLED"]:
+                profiling.begin(self.config)
+            try:
+                rv = await self.offload(self.flask.preprocess_request)
+                if rv is None:
+                    rv, stream = await view()
+            except HTTPException as e:
+                rv = await self.offload(self.flask.handle_user_exception, e)
+            except Exception as e:
+                logger.exception("Unhandled error in %s", request.path)
+                rv = error_response(f"Unexpected error: {str(e)}", 500)
+            response = await self.offload(self.flask.finalize_request, rv)
+            await send_response(send, response, stream)
+            if g.get("profile") is not None:
+                # Saved off the loop; teardown would write it on the loop thread
+                await self.offload(profiling.finish)
+
+    async def extract_text(self):
+        upload = await self.offload(admit_single_upload)
+        if isinstance(upload, Response):
+            return upload, None
+        content, filename = upload
+
+        try:
+            ocr = AsyncOCRService(
+                request_deadline(),
+                request.args.get("level", "text"),
+                priority=request_priority("interactive"),
+                client_key=client_key(),
+            )
+            result = await ocr.extract_text(content)
+            result["metadata"] = await self.offload(ocr.extract_metadata, content)
+            # Hashing the upload for the index is CPU work too
+            await self.offload(ocr.index_result, content, filename, result)
+            return success_response(result), None
+        except Exception as e:
+            return ocr_error_response(e), None
+
+    async def extract_text_batch(self):
+        try:
+            ocr = AsyncOCRService(
+                request_deadline(),
+                request.args.get("level", "text"),
+                priority=request_priority("batch"),
+                client_key=client_key(),
+            )
+        except ValueError as e:
+            return error_response(str(e), 400), None
+        admitted = await self.offload(admit_batch_upload)
+        if isinstance(admitted, Response):
+            return admitted, None
+        results, pending = admitted
+
+        if wants_ndjson():
+            return ndjson_response(iter(())), self.stream_batch_results(
+                ocr, results, pending, wants_mosaic()
+            )
+
+        # Images are packed into batch_annotate_images calls; errors stay per image
+        contents = [content for _, _, content in pending]
+        try:
+            ocr_results = await ocr.extract_text_batch(contents, wants_mosaic())
+        except Overloaded as e:
+            return overloaded_response(e), None
+
+        def shape():
+            for (position, filename, content), result in zip(pending, ocr_results):
+                results[position] = batch_result(ocr, filename, content, result)
+
+        await self.offload(shape)
+        return success_response({"results": results}), None
+
+    async def stream_batch_results(self, ocr, results: list, pending: list, mosaic: bool):
+        """routes.stream_batch_results over the async batch iterator.
+
+        Shed chunks arrive as per-image errors, like any other failure.
+        """
+        start_time = time.perf_counter()
+        succeeded = failed = 0
+
+        for position, result in enumerate(results):
+            if result is not None:
+                failed += 1
+                yield {"index": position, **result}
+
+        contents = [content for _, _, content in pending]
+        async for index, result in ocr.iter_extract_text_batch(contents, mosaic):
+            position, filename, _ = pending[index]
+            item = await self.offload(batch_result, ocr, filename, contents[index], result)
+            # Drop our reference so memory is released as the stream progresses
+            contents[index] = None
+            if item["success"]:
+                succeeded += 1
+            else:
+                failed += 1
+            yield {"index": position, **item}
+
+        yield {
+            "summary": True,
+            "total": len(results),
+            "succeeded": succeeded,
+            "failed": failed,
+            "processing_time_ms": int((time.perf_counter() - start_time) * 1000),
+        }
+
+
+def create_asgi_app() -> OCRApp:
+    return OCRApp(create_app())
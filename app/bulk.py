@@ -0,0 +1,315 @@
+"""Bulk OCR from the command line, without the HTTP API.
+
+    python -m app.bulk sample_images/ --output results.jsonl
+    python -m app.bulk "scans/**/*.tif" manifest.jsonl --workers 4 --mode process
+
+Each input is a directory (searched recursively), a glob pattern or a JSONL
+manifest with one {"path": ..., "id": ...} object per line (relative paths
+are resolved against the manifest's directory). Images are packed into batch
+chunks by file size, and a process or thread pool runs each chunk through
+OCRService with no Flask app, rate limits or upload cap. Only file paths are
+sent to the pool, and at most two chunks per worker are in flight, so memory
+stays bounded however long the input is.
+
+Results are appended to --output as JSONL in completion order. After each
+chunk's results are written, its IDs and the output's length are appended to
+the checkpoint (<output>.ckpt). A rerun with the same output skips those IDs
+and cuts off anything written after the last checkpoint entry, so only the
+chunks in flight when the run stopped are sent to Vision again.
+"""
+import argparse, glob, json, logging, os, sys, threading, time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from .config import Config
+from .services.admission import Overloaded
+from .services.cache import OCRCache
+from .services.layout import LEVELS
+from .services.ocr_service import OCRService, batch_result, pack_stream
+from .services.phash import PerceptualIndex
+from .services.search import SearchIndex
+from .utils.file_utils import allowed_file
+
+logger = logging.getLogger(__name__)
+
+# Chunks shed by admission control wait and retry, as background jobs do
+MAX_SHED_RETRIES = 20
+
+
+def iter_manifest(path: str):
+    """(id, path) per line of a JSONL manifest; malformed lines are logged and skipped."""
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                image = entry["path"]
+            except (ValueError, TypeError, KeyError):
+                logger.warning("%s:%d: expected a JSON object with a \"path\"", path, number)
+                continue
+            image = os.path.join(base, image)
+            yield str(entry.get("id") or entry.get("request_id") or image), image
+
+
+def iter_inputs(specs: list, extensions: set):
+    """(id, path) for every image named by the inputs, lazily; the id of a file is its path."""
+    for spec in specs:
+        if os.path.isdir(spec):
+            for root, dirs, files in os.walk(spec):
+                dirs.sort()
+                for name in sorted(files):
+                    if allowed_file(name, extensions):
+                        path = os.path.join(root, name)
+                        yield path, path
+        elif spec.endswith(".jsonl") and os.path.isfile(spec):
+            yield from iter_manifest(spec)
+        else:
+            paths = sorted(glob.glob(spec, recursive=True))
+            if not paths:
+                logger.warning("%s: no such file, directory or matching path", spec)
+            for path in paths:
+                if os.path.isfile(path) and allowed_file(path, extensions):
+                    yield path, path
+
+
+def file_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0  # reported when the worker fails to read it
+
+
+class Checkpoint:
+    """Append-only record of finished IDs, each entry with the output length at that point."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> tuple:
+        """(finished ids, output length to keep); a torn last entry is ignored."""
+        done, offset = set(), 0
+        if not os.path.exists(self.path):
+            return done, offset
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                done.update(entry["ids"])
+                offset = entry["offset"]
+        return done, offset
+
+    def open(self):
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def record(self, ids: list, offset: int):
+        self._file.write(json.dumps({"offset": offset, "ids": ids}) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+# Worker side: one set of these per process (or shared by the threads)
+_settings = None
+_shared = None
+_lock = threading.Lock()
+
+
+def init_worker(overrides: dict, level: str, mosaic: bool):
+    global _settings
+    _settings = (Config.to_dict(**overrides), level, mosaic)
+
+
+def worker_service() -> tuple:
+    """(OCRService, mosaic) for this worker; the cache and indexes are built once."""
+    global _shared
+    config, level, mosaic = _settings
+    with _lock:
+        if _shared is None:
+            _shared = (
+                OCRCache.from_config(config),
+                PerceptualIndex.from_config(config),
+                SearchIndex.from_config(config),
+            )
+    cache, phash, search = _shared
+    ocr = OCRService(
+        level=level,
+        config=config,
+        cache=cache,
+        phash=phash,
+        search=search,
+        priority="backfill",
+        client_key="bulk",
+    )
+    return ocr, mosaic
+
+
+def read_image(path: str, extensions: set):
+    """File contents, or the error to report for it."""
+    if not allowed_file(path, extensions):
+        return ValueError("Invalid file type. Allowed: " + ", ".join(sorted(extensions)))
+    try:
+        with open(path, "rb") as f:
+            content = f.read()
+    except OSError as e:
+        return ValueError(f"Could not read file: {e.strerror}")
+    return content or ValueError("File is empty")
+
+
+def ocr_chunk(items: list) -> list:
+    """OCR one chunk of (id, path); returns one output row per item."""
+    ocr, mosaic = worker_service()
+    contents = [read_image(path, ocr.config["ALLOWED_EXTENSIONS"]) for _, path in items]
+    results = [c if isinstance(c, Exception) else None for c in contents]
+
+    pending = [i for i, c in enumerate(contents) if isinstance(c, bytes)]
+    for attempt in range(MAX_SHED_RETRIES + 1):
+        if not pending:
+            break
+        last = attempt == MAX_SHED_RETRIES
+        retry_after = 1
+        try:
+            batch = ocr.extract_text_batch([contents[i] for i in pending], mosaic)
+        except Overloaded as e:
+            batch, retry_after = [e] * len(pending), e.retry_after
+        shed = []
+        for index, result in zip(pending, batch):
+            if isinstance(result, Overloaded) and not last:
+                shed.append(index)
+                retry_after = result.retry_after
+            else:
+                results[index] = result
+        pending = shed
+        if pending:
+            time.sleep(retry_after)
+
+    rows = []
+    for (item_id, path), content, result in zip(items, contents, results):
+        size = len(content) if isinstance(content, bytes) else 0
+        row = batch_result(ocr, os.path.basename(path), content, result)
+        rows.append({"id": item_id, "path": path, "bytes": size, **row})
+    if ocr.search is not None:
+        # Pool processes exit without running atexit hooks, so the chunk is
+        # only checkpointed once its results are searchable
+        ocr.search.flush()
+    return rows
+
+
+def run(args) -> dict:
+    """Process every input not yet checkpointed; returns the run's counters."""
+    checkpoint = Checkpoint(args.checkpoint or f"{args.output}.ckpt")
+    done, offset = checkpoint.load()
+    with open(args.output, "ab") as out:
+        # Results written after the last checkpoint entry are redone
+        out.truncate(offset)
+
+    config = Config.to_dict()
+    stats = {"images": 0, "succeeded": 0, "failed": 0, "skipped": 0, "bytes": 0}
+
+    def todo():
+        for item_id, path in iter_inputs(args.inputs, config["ALLOWED_EXTENSIONS"]):
+            if item_id in done:
+                stats["skipped"] += 1
+            else:
+                # Also guards against the same ID twice in one run
+                done.add(item_id)
+                yield (item_id, path), path
+
+    chunks = (
+        [item for item, _ in chunk]
+        for chunk in pack_stream(
+            todo(),
+            int(args.batch_size or config["VISION_BATCH_MAX_IMAGES"]),
+            int(config["VISION_BATCH_MAX_BYTES"]),
+            size=file_size,
+        )
+    )
+    global _shared
+    _shared = None  # thread mode: this process is the worker
+    pool_class = ProcessPoolExecutor if args.mode == "process" else ThreadPoolExecutor
+    pool = pool_class(
+        max_workers=args.workers, initializer=init_worker, initargs=({}, args.level, args.mosaic)
+    )
+    start = time.perf_counter()
+    last_report = start
+    in_flight = set()
+    checkpoint.open()
+    try:
+        with open(args.output, "a", encoding="utf-8") as out:
+            while True:
+                for chunk in chunks:
+                    in_flight.add(pool.submit(ocr_chunk, chunk))
+                    if len(in_flight) >= 2 * args.workers:
+                        break
+                if not in_flight:
+                    break
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    rows = future.result()
+                    for row in rows:
+                        out.write(json.dumps(row, ensure_ascii=False) + "\n")
+                        stats["images"] += 1
+                        stats["succeeded" if row["success"] else "failed"] += 1
+                        stats["bytes"] += row["bytes"]
+                    out.flush()
+                    checkpoint.record([row["id"] for row in rows], out.tell())
+                if args.progress and time.perf_counter() - last_report >= args.progress:
+                    last_report = time.perf_counter()
+                    print(progress_line(stats, last_report - start), file=sys.stderr)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        checkpoint.close()
+        stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+def progress_line(stats: dict, seconds: float) -> str:
+    rate = stats["images"] / seconds if seconds else 0.0
+    return (
+        f"{stats['images']} images ({stats['succeeded']} ok, {stats['failed']} failed, "
+        f"{stats['skipped']} already done) in {seconds:.1f} s: {rate:.1f} images/s, "
+        f"{stats['bytes'] / seconds / 2**20 if seconds else 0:.2f} MB/s"
+    )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("inputs", nargs="+", help="directories, glob patterns or .jsonl manifests")
+    parser.add_argument("--output", "-o", required=True, help="JSONL file results are appended to")
+    parser.add_argument("--checkpoint", help="default: <output>.ckpt")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--mode",
+        choices=("process", "thread"),
+        default="process",
+        help="processes spread image decoding over CPUs; threads do when Vision latency dominates",
+    )
+    parser.add_argument("--batch-size", type=int, help="images per chunk (VISION_BATCH_MAX_IMAGES)")
+    parser.add_argument("--level", choices=LEVELS, default="text")
+    parser.add_argument("--mosaic", action="store_true", help="tile small images onto canvases")
+    parser.add_argument("--progress", type=float, default=10, help="seconds between progress lines")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    try:
+        Config.validate_credentials()
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    try:
+        stats = run(args)
+    except KeyboardInterrupt:
+        print("Interrupted; rerun the same command to resume", file=sys.stderr)
+        return 130
+    print(progress_line(stats, stats["seconds"]), file=sys.stderr)
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
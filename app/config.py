@@ -1,5 +1,5 @@
 import os
-import json
+import tempfile
 from dotenv import load_dotenv, find_dotenv
 
 load_dotenv(find_dotenv())
@@ -7,15 +7,211 @@ load_dotenv(find_dotenv())
 
 class Config:
     PORT = os.getenv("PORT", 5000)
-    MAX_CONTENT_LENGTH = 10 * 1024 * 1024  # 10 MB
+    MAX_CONTENT_LENGTH = int(os.getenv("MAX_CONTENT_LENGTH", 10 * 1024 * 1024))  # 10 MB
     # ALLOWED_EXTENSIONS = {"jpg", "jpeg"}
-    ALLOWED_EXTENSIONS = {"jpg", "jpeg", "png", "gif", "webp"}
+    ALLOWED_EXTENSIONS = {"jpg", "jpeg", "png", "gif", "webp", "tif", "tiff"}
+    # Request bodies above the threshold are spooled to a temp file (in
+    # UPLOAD_SPOOL_DIR, default the system temp dir) and mmap'd, not copied.
+    # Each worker processes at most UPLOAD_BYTE_BUDGET upload bytes at once;
+    # further requests wait up to UPLOAD_BUDGET_TIMEOUT_SECONDS, then get 503.
+    UPLOAD_SPOOL_THRESHOLD = int(os.getenv("UPLOAD_SPOOL_THRESHOLD", 1024 * 1024))
+    UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR", "")
+    UPLOAD_BYTE_BUDGET = int(os.getenv("UPLOAD_BYTE_BUDGET", 256 * 1024 * 1024))
+    UPLOAD_BUDGET_TIMEOUT_SECONDS = float(os.getenv("UPLOAD_BUDGET_TIMEOUT_SECONDS", 10))
+
+    # Animated GIF/WebP and multi-page TIFF: at most this many frames are OCR'd
+    FRAMES_MAX = int(os.getenv("FRAMES_MAX", 100))
 
     GOOGLE_CREDENTIALS = os.getenv("GOOGLE_APPLICATION_CREDENTIALS", "service.json")
 
+    # Flask-Limiter (RATELIMIT_ENABLED=false e.g. for load tests)
+    RATELIMIT_ENABLED = os.getenv("RATELIMIT_ENABLED", "true").lower() == "true"
+    RATELIMIT_DEFAULT = os.getenv("RATELIMIT_DEFAULT", "5 per minute")
+    # memory:// is per worker; sqlite:///dev/shm/ocr_ratelimit.sqlite3 is shared
+    # by every worker on the node (gunicorn.conf.py defaults to that)
+    RATELIMIT_STORAGE_URI = os.getenv("RATELIMIT_STORAGE_URI", "memory://")
+
+    # Per-API-key (X-API-Key, else client IP) token buckets weighted by images and bytes
+    QUOTA_ENABLED = os.getenv("QUOTA_ENABLED", "true").lower() == "true"
+    QUOTA_IMAGES_PER_MINUTE = float(os.getenv("QUOTA_IMAGES_PER_MINUTE", 120))
+    QUOTA_BYTES_PER_MINUTE = float(
+        os.getenv("QUOTA_BYTES_PER_MINUTE", 200 * 1024 * 1024)
+    )
+    # Empty keeps the buckets in this process only; set a file to share them
+    QUOTA_DB_PATH = os.getenv("QUOTA_DB_PATH", "")
+
+    # OCR result cache (keyed by SHA-256 of the image bytes)
+    OCR_CACHE_ENABLED = os.getenv("OCR_CACHE_ENABLED", "true").lower() == "true"
+    OCR_CACHE_MAX_ENTRIES = int(os.getenv("OCR_CACHE_MAX_ENTRIES", 1024))
+    OCR_CACHE_TTL_SECONDS = int(os.getenv("OCR_CACHE_TTL_SECONDS", 86400))
+    # Optional SQLite tier shared by all workers, e.g. /tmp/ocr_cache.sqlite3
+    OCR_CACHE_DB_PATH = os.getenv("OCR_CACHE_DB_PATH", "")
+    OCR_CACHE_DB_MAX_ENTRIES = int(os.getenv("OCR_CACHE_DB_MAX_ENTRIES", 100000))
+    # Near-duplicate reuse: a cache miss whose 256-bit dHash is within
+    # PHASH_MAX_DISTANCE bits of an indexed image returns that image's result.
+    # PHASH_DB_PATH persists the index (loaded by each worker at startup).
+    PHASH_ENABLED = os.getenv("PHASH_ENABLED", "false").lower() == "true"
+    PHASH_MAX_DISTANCE = int(os.getenv("PHASH_MAX_DISTANCE", 15))
+    PHASH_MAX_ENTRIES = int(os.getenv("PHASH_MAX_ENTRIES", 100000))
+    PHASH_DB_PATH = os.getenv("PHASH_DB_PATH", "")
+
+    # Full-text index of OCR results (SQLite FTS5) behind /api/search. Results
+    # are queued and written by a background thread in batches of
+    # SEARCH_BATCH_SIZE, or after SEARCH_FLUSH_SECONDS; beyond SEARCH_QUEUE_SIZE
+    # waiting results new ones are dropped (and counted) instead of blocking.
+    SEARCH_ENABLED = os.getenv("SEARCH_ENABLED", "false").lower() == "true"
+    SEARCH_DB_PATH = os.getenv(
+        "SEARCH_DB_PATH", os.path.join(tempfile.gettempdir(), "ocr_search.sqlite3")
+    )
+    SEARCH_BATCH_SIZE = int(os.getenv("SEARCH_BATCH_SIZE", 256))
+    SEARCH_FLUSH_SECONDS = float(os.getenv("SEARCH_FLUSH_SECONDS", 1.0))
+    SEARCH_QUEUE_SIZE = int(os.getenv("SEARCH_QUEUE_SIZE", 10000))
+    # Ranking cost grows with the number of matches: a query matching more
+    # documents than this ranks only the most recently indexed ones
+    SEARCH_MAX_CANDIDATES = int(os.getenv("SEARCH_MAX_CANDIDATES", 10000))
+
+    # Pre-flight checks before any Vision call: the format is sniffed from the
+    # magic bytes and only the header is parsed, so non-images and corrupt
+    # files get 400. An image whose grayscale thumbnail (PREFLIGHT_SAMPLE_SIZE
+    # px) has a standard deviation below PREFLIGHT_BLANK_MAX_STDDEV and fewer
+    # edge pixels than PREFLIGHT_BLANK_MAX_EDGE_RATIO is blank: empty text, no call.
+    PREFLIGHT_ENABLED = os.getenv("PREFLIGHT_ENABLED", "true").lower() == "true"
+    PREFLIGHT_SAMPLE_SIZE = int(os.getenv("PREFLIGHT_SAMPLE_SIZE", 256))
+    PREFLIGHT_BLANK_MAX_STDDEV = float(os.getenv("PREFLIGHT_BLANK_MAX_STDDEV", 6.0))
+    PREFLIGHT_BLANK_MAX_EDGE_RATIO = float(os.getenv("PREFLIGHT_BLANK_MAX_EDGE_RATIO", 0.001))
+
+    # Pre-upload image optimization (downscale / re-encode before Vision)
+    PREPROCESS_ENABLED = os.getenv("PREPROCESS_ENABLED", "true").lower() == "true"
+    PREPROCESS_MAX_DIMENSION = int(os.getenv("PREPROCESS_MAX_DIMENSION", 2048))
+    PREPROCESS_GRAYSCALE = os.getenv("PREPROCESS_GRAYSCALE", "false").lower() == "true"
+    PREPROCESS_JPEG_QUALITY = int(os.getenv("PREPROCESS_JPEG_QUALITY", 90))
+    PREPROCESS_FIX_ORIENTATION = (
+        os.getenv("PREPROCESS_FIX_ORIENTATION", "true").lower() == "true"
+    )
+
+    # Asynchronous OCR jobs (/api/jobs); state is shared by all workers via SQLite
+    JOBS_DB_PATH = os.getenv(
+        "JOBS_DB_PATH", os.path.join(tempfile.gettempdir(), "ocr_jobs.sqlite3")
+    )
+    JOBS_SPOOL_DIR = os.getenv(
+        "JOBS_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "ocr_jobs")
+    )
+    JOBS_MAX_WORKERS = int(os.getenv("JOBS_MAX_WORKERS", 2))
+    JOBS_MAX_QUEUED = int(os.getenv("JOBS_MAX_QUEUED", 100))
+    # Comma-separated hosts callback_url may name. Empty allows any host that
+    # resolves only to public addresses (no private, loopback or link-local).
+    JOBS_CALLBACK_ALLOWED_HOSTS = os.getenv("JOBS_CALLBACK_ALLOWED_HOSTS", "")
+
+    # Process-wide Vision client pool (one gRPC channel per client)
+    VISION_POOL_SIZE = int(os.getenv("VISION_POOL_SIZE", 2))
+    VISION_KEEPALIVE_MS = int(os.getenv("VISION_KEEPALIVE_MS", 30000))
+    VISION_MAX_MESSAGE_BYTES = int(os.getenv("VISION_MAX_MESSAGE_BYTES", 40 * 1024 * 1024))
+    # Batch endpoint packing: Vision accepts at most 16 images per batch request
+    VISION_BATCH_MAX_IMAGES = min(int(os.getenv("VISION_BATCH_MAX_IMAGES", 16)), 16)
+    VISION_BATCH_MAX_BYTES = int(os.getenv("VISION_BATCH_MAX_BYTES", 8 * 1024 * 1024))
+    VISION_BATCH_PARALLEL_CHUNKS = int(os.getenv("VISION_BATCH_PARALLEL_CHUNKS", 4))
+    # Batch ?mosaic=true: images up to MOSAIC_MAX_TILE_DIMENSION px are tiled,
+    # MOSAIC_PADDING px apart, onto canvases of at most MOSAIC_CANVAS_DIMENSION
+    MOSAIC_CANVAS_DIMENSION = int(os.getenv("MOSAIC_CANVAS_DIMENSION", 2048))
+    MOSAIC_MAX_TILE_DIMENSION = int(os.getenv("MOSAIC_MAX_TILE_DIMENSION", 640))
+    MOSAIC_PADDING = int(os.getenv("MOSAIC_PADDING", 48))
+    MOSAIC_MAX_TILES = int(os.getenv("MOSAIC_MAX_TILES", 64))
+    # Admission control: one bounded executor per worker for all Vision calls.
+    # The limit adapts (AIMD) between MIN and MAX based on latency and errors.
+    VISION_CONCURRENCY_LIMIT = int(os.getenv("VISION_CONCURRENCY_LIMIT", 16))
+    VISION_CONCURRENCY_MIN = int(os.getenv("VISION_CONCURRENCY_MIN", 2))
+    VISION_CONCURRENCY_MAX = int(os.getenv("VISION_CONCURRENCY_MAX", 64))
+    VISION_ADAPTIVE_CONCURRENCY = (
+        os.getenv("VISION_ADAPTIVE_CONCURRENCY", "true").lower() == "true"
+    )
+    VISION_LATENCY_TARGET_SECONDS = float(
+        os.getenv("VISION_LATENCY_TARGET_SECONDS", 2.0)
+    )
+    VISION_QUEUE_SIZE = int(os.getenv("VISION_QUEUE_SIZE", 64))
+    VISION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("VISION_QUEUE_TIMEOUT_SECONDS", 10))
+    # Waiting calls run by priority class (interactive: single uploads, batch:
+    # batch uploads, backfill: jobs and the bulk CLI; X-Priority may lower a
+    # request's class), then fairly across API keys weighted by
+    # VISION_CLIENT_WEIGHTS ("key=4,other=0.5"; 1 otherwise). A full queue
+    # sheds the newest call of a lower class to admit a higher one. The batch
+    # class waits at most VISION_QUEUE_TIMEOUT_SECONDS, the others:
+    VISION_QUEUE_TIMEOUT_INTERACTIVE_SECONDS = float(
+        os.getenv("VISION_QUEUE_TIMEOUT_INTERACTIVE_SECONDS", 5)
+    )
+    VISION_QUEUE_TIMEOUT_BACKFILL_SECONDS = float(
+        os.getenv("VISION_QUEUE_TIMEOUT_BACKFILL_SECONDS", 60)
+    )
+    VISION_CLIENT_WEIGHTS = os.getenv("VISION_CLIENT_WEIGHTS", "")
+    # ASGI entry point (asgi.py): Vision RPCs are awaited, not run on threads,
+    # so the cap on calls in flight per worker can be far higher. Pillow,
+    # SQLite and the Flask request helpers run on ASYNC_THREADS threads.
+    VISION_ASYNC_CONCURRENCY = int(os.getenv("VISION_ASYNC_CONCURRENCY", 256))
+    ASYNC_THREADS = int(os.getenv("ASYNC_THREADS", 8))
+
+    # Deadlines and retries: each request gets REQUEST_DEADLINE_SECONDS in total
+    # (keep it under gunicorn's 30 s timeout; clients may lower it with an
+    # X-Request-Timeout header) and each Vision attempt at most
+    # VISION_ATTEMPT_TIMEOUT_SECONDS. Transient errors are retried with
+    # exponential backoff and full jitter while the budget allows.
+    REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", 25))
+    VISION_ATTEMPT_TIMEOUT_SECONDS = float(os.getenv("VISION_ATTEMPT_TIMEOUT_SECONDS", 10))
+    VISION_RETRY_MAX_ATTEMPTS = int(os.getenv("VISION_RETRY_MAX_ATTEMPTS", 3))
+    VISION_RETRY_INITIAL_BACKOFF_SECONDS = float(
+        os.getenv("VISION_RETRY_INITIAL_BACKOFF_SECONDS", 0.2)
+    )
+    VISION_RETRY_MAX_BACKOFF_SECONDS = float(
+        os.getenv("VISION_RETRY_MAX_BACKOFF_SECONDS", 2.0)
+    )
+    # Hedging: a single-image call still running after the p95 latency gets a
+    # second copy; the first answer wins
+    VISION_HEDGE_ENABLED = os.getenv("VISION_HEDGE_ENABLED", "false").lower() == "true"
+    VISION_HEDGE_PERCENTILE = float(os.getenv("VISION_HEDGE_PERCENTILE", 95))
+    VISION_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("VISION_HEDGE_MIN_DELAY_SECONDS", 0.05))
+    VISION_HEDGE_MIN_SAMPLES = int(os.getenv("VISION_HEDGE_MIN_SAMPLES", 20))
+
+    # Opt-in request profiling: a request whose X-Profile-Token header equals
+    # PROFILE_TOKEN, or a random PROFILE_SAMPLE_RATE share of requests, is
+    # stack-sampled every PROFILE_INTERVAL_MS. Profiles are kept per request ID
+    # in PROFILE_DIR; the oldest are deleted beyond PROFILE_MAX_BYTES.
+    # /api/profiles lists them (and needs the token, if one is set).
+    PROFILE_ENABLED = os.getenv("PROFILE_ENABLED", "false").lower() == "true"
+    PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+    PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+    PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 5))
+    PROFILE_DIR = os.getenv(
+        "PROFILE_DIR", os.path.join(tempfile.gettempdir(), "ocr_profiles")
+    )
+    PROFILE_MAX_BYTES = int(os.getenv("PROFILE_MAX_BYTES", 64 * 1024 * 1024))
+
+    # host:port of a local Vision stand-in (python -m benchmarks.fake_vision)
+    VISION_EMULATOR_HOST = os.getenv("VISION_EMULATOR_HOST", "")
+    # Warm-up imports the Vision library and builds the client pool in a
+    # background thread; /api/health/ready answers 503 until it has finished.
+    # With gunicorn --preload (gunicorn.conf.py) the master only imports and
+    # each worker starts its own warm-up after fork.
+    VISION_WARMUP = os.getenv("VISION_WARMUP", "true").lower() == "true"
+    VISION_WARMUP_AFTER_FORK = os.getenv("VISION_WARMUP_AFTER_FORK", "false").lower() == "true"
+    # > 0 also waits (up to N seconds per channel) for the connections to open
+    VISION_WARMUP_TIMEOUT_SECONDS = float(os.getenv("VISION_WARMUP_TIMEOUT_SECONDS", 0))
+
+    @classmethod
+    def to_dict(cls, **overrides) -> dict:
+        """The settings as a plain mapping, as app.config.from_object() reads them."""
+        config = {name: getattr(cls, name) for name in dir(cls) if name.isupper()}
+        config.update(overrides)
+        return config
+
     @classmethod
     def validate_credentials(cls):
-        """Ensure Google credentials are available either from env vars or file."""
+        """Ensure Google credentials are available either from a file or env vars.
+
+        Nothing is written to disk: with env vars the Vision client is built
+        from credentials_info() in memory, when it is first needed.
+        """
+
+        # The local Vision emulator speaks plaintext gRPC and needs no credentials
+        if cls.VISION_EMULATOR_HOST:
+            return
 
         # Case 1: full service.json path is provided (works like before)
         creds_path = cls.GOOGLE_CREDENTIALS
@@ -23,41 +219,40 @@ class Config:
             os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = creds_path
             return
 
-        # Case 2: build JSON from env vars if file is missing
-        required_vars = [
-            "GOOGLE_TYPE",
-            "GOOGLE_PROJECT_ID",
-            "GOOGLE_PRIVATE_KEY_ID",
-            "GOOGLE_PRIVATE_KEY",
-            "GOOGLE_CLIENT_EMAIL",
-            "GOOGLE_CLIENT_ID",
-            "GOOGLE_CLIENT_X509_CERT_URL",
-        ]
-        missing = [v for v in required_vars if not os.getenv(v)]
+        # Case 2: the service account is given in env vars
+        missing = [v for v in CREDENTIAL_VARS if not os.getenv(v)]
         if missing:
             raise RuntimeError(
                 f"❌ Missing Google credential env vars: {', '.join(missing)} "
                 f"and no service.json found at {creds_path}"
             )
 
-        creds_dict = {
-            "type": os.getenv("GOOGLE_TYPE"),
-            "project_id": os.getenv("GOOGLE_PROJECT_ID"),
-            "private_key_id": os.getenv("GOOGLE_PRIVATE_KEY_ID"),
-            "private_key": os.getenv("GOOGLE_PRIVATE_KEY").replace("\\n", "\n"),
-            "client_email": os.getenv("GOOGLE_CLIENT_EMAIL"),
-            "client_id": os.getenv("GOOGLE_CLIENT_ID"),
-            "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-            "token_uri": "https://oauth2.googleapis.com/token",
-            "auth_provider_x509_cert_url": "https://www.googleapis.com/oauth2/v1/certs",
-            "client_x509_cert_url": os.getenv("GOOGLE_CLIENT_X509_CERT_URL"),
-            "universe_domain": "googleapis.com",
-        }
-
-        # 👉 Trick: write it once as if it were the real service.json
-        creds_file_path = "service.json"
-        with open(creds_file_path, "w", encoding="utf-8") as f:
-            json.dump(creds_dict, f, indent=2, ensure_ascii=False)
-
-        os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = creds_file_path
-        cls.GOOGLE_CREDENTIALS = creds_file_path
+
+CREDENTIAL_VARS = [
+    "GOOGLE_TYPE",
+    "GOOGLE_PROJECT_ID",
+    "GOOGLE_PRIVATE_KEY_ID",
+    "GOOGLE_PRIVATE_KEY",
+    "GOOGLE_CLIENT_EMAIL",
+    "GOOGLE_CLIENT_ID",
+    "GOOGLE_CLIENT_X509_CERT_URL",
+]
+
+
+def credentials_info() -> dict:
+    """Service-account info built from the GOOGLE_* env vars (None if any is missing)."""
+    if any(not os.getenv(v) for v in CREDENTIAL_VARS):
+        return None
+    return {
+        "type": os.getenv("GOOGLE_TYPE"),
+        "project_id": os.getenv("GOOGLE_PROJECT_ID"),
+        "private_key_id": os.getenv("GOOGLE_PRIVATE_KEY_ID"),
+        "private_key": os.getenv("GOOGLE_PRIVATE_KEY").replace("\\n", "\n"),
+        "client_email": os.getenv("GOOGLE_CLIENT_EMAIL"),
+        "client_id": os.getenv("GOOGLE_CLIENT_ID"),
+        "auth_uri": "https://accounts.google.com/o/oauth2/auth",
+        "token_uri": "https://oauth2.googleapis.com/token",
+        "auth_provider_x509_cert_url": "https://www.googleapis.com/oauth2/v1/certs",
+        "client_x509_cert_url": os.getenv("GOOGLE_CLIENT_X509_CERT_URL"),
+        "universe_domain": "googleapis.com",
+    }
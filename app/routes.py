@@ -1,10 +1,25 @@
-from flask import request, current_app
-from flask_restx import Namespace, Resource, reqparse
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from .services.ocr_service import OCRService
+import time
+from flask import Response, g, request, current_app, send_file, stream_with_context
+from flask_restx import Namespace, Resource, inputs, reqparse
+from .services.ocr_service import OCRService, batch_result
+from .services.jobs import JobQueueFull, JobRunner
+from .services.webhooks import allowed_hosts, check_callback_url
+from .services.admission import PRIORITIES, Overloaded
+from .services.ratelimit import QuotaExceeded, client_key
+from .services.resilience import Deadline, RequestTimeout
+from .services.layout import LEVELS
+from .services import vision_client
+from .services.uploads import get_byte_budget, read_upload, upload_size
 from .utils.file_utils import allowed_file, get_secure_filename
+from .utils import metrics, profiling
 from .schemas.input import register_input_schemas
-from .schemas.response import register_output_schemas, success_response, error_response
+from .schemas.response import (
+    register_output_schemas,
+    success_response,
+    error_response,
+    ndjson_response,
+    overloaded_response,
+)
 
 # Create namespace
 ns = Namespace("OCR", description="OCR operations")
@@ -24,6 +39,14 @@ upload_parser.add_argument(
     help="JPEG image file to extract text from",
 )
 
+upload_parser.add_argument(
+    "level",
+    location="args",
+    choices=LEVELS,
+    default="text",
+    help="Output detail: text, or blocks/paragraphs/words with bounding boxes",
+)
+
 batch_upload_parser = reqparse.RequestParser()
 batch_upload_parser.add_argument(
     "image",
@@ -31,37 +54,133 @@ batch_upload_parser.add_argument(
     type="FileStorage",
     required=True,
     action="append",  # ✅ allows multiple files in Swagger UI
-    help="JPEG, PNG, GIF, or WEBP image files to extract text from",
+    help="JPEG, PNG, GIF, WEBP or TIFF image files to extract text from",
+)
+batch_upload_parser.add_argument(
+    "level", location="args", choices=LEVELS, default="text", help="Output detail"
+)
+batch_upload_parser.add_argument(
+    "mosaic",
+    location="args",
+    type=inputs.boolean,
+    default=False,
+    help="Tile small images onto shared canvases: fewer billed Vision images",
 )
 
 
-@ns.route("/extract-text")
-class ExtractText(Resource):
-    @ns.expect(upload_parser)
-    @ns.response(200, "Success", OCROutputSchema)
-    @ns.response(400, "Bad Request")
-    @ns.response(415, "Unsupported Media Type")
-    @ns.response(500, "Internal Server Error")
-    def post(self):
-        """Extract text from uploaded JPG image"""
-        if (
-            not request.content_type
-            or "multipart/form-data" not in request.content_type
-        ):
-            return error_response(
-                "Invalid request type. Must be multipart/form-data", 415
-            )
+def get_job_runner():
+    """The job runner is created on first use so forked workers each get their own threads."""
+    runner = current_app.extensions.get("ocr_jobs")
+    if runner is None:
+        runner = current_app.extensions["ocr_jobs"] = JobRunner.from_config(
+            current_app._get_current_object()
+        )
+    return runner
 
-        if "image" not in request.files:
-            return error_response("No image file provided in the request", 400)
 
-        file = request.files["image"]
+def request_deadline() -> Deadline:
+    """Budget for this request, counted from its arrival.
 
-        if file.filename == "":
-            return error_response("No file selected", 400)
+    A caller with a tighter deadline of its own can pass it down in seconds
+    with X-Request-Timeout; it never raises the configured budget.
+    """
+    budget = float(current_app.config["REQUEST_DEADLINE_SECONDS"])
+    try:
+        budget = min(budget, float(request.headers.get("X-Request-Timeout", budget)))
+    except ValueError:
+        pass
+    return Deadline(budget, start=g.get("request_start"))
 
-        ALLOWED_EXTENSIONS = current_app.config["ALLOWED_EXTENSIONS"]
 
+def request_priority(default: str) -> str:
+    """The route's Vision priority class, or a lower one asked for with X-Priority.
+
+    A client can mark its own uploads as background work; it can never
+    jump ahead of the route's class.
+    """
+    asked = request.headers.get("X-Priority", "").strip().lower()
+    if asked in PRIORITIES and PRIORITIES.index(asked) > PRIORITIES.index(default):
+        return asked
+    return default
+
+
+def charge_quota(images: int):
+    """Debit the caller's image/byte buckets; returns a 429 response if over quota."""
+    quota = current_app.extensions.get("ocr_quota")
+    if quota is None:
+        return None
+    try:
+        with metrics.stage("quota"):
+            quota.consume(client_key(), images, request.content_length or 0)
+    except QuotaExceeded as e:
+        metrics.QUOTA_REJECTIONS.inc()
+        return error_response(str(e), 429, {"Retry-After": str(e.retry_after)})
+    return None
+
+
+def reserve_upload_bytes(files: list):
+    """Hold this request's upload bytes against the worker's budget until teardown."""
+    budget = get_byte_budget(current_app.config)
+    with metrics.stage("upload_budget"):
+        g.upload_bytes = g.get("upload_bytes", 0) + budget.acquire(
+            sum(upload_size(file) for file in files)
+        )
+
+
+def read_batch_file(file, allowed_extensions):
+    """Validate one batch upload; returns (content, None) or (None, error result)."""
+    with metrics.stage("validation"):
+        valid = allowed_file(file.filename, allowed_extensions)
+    if not valid:
+        return None, {
+            "filename": file.filename,
+            "success": False,
+            "error": "Invalid file type.",
+        }
+
+    with metrics.stage("file_read"):
+        content = read_upload(file)
+    if not content:
+        return None, {
+            "filename": file.filename,
+            "success": False,
+            "error": "Empty or unreadable file.",
+        }
+    return content, None
+
+
+def admit_single_upload():
+    """Parse, charge and validate a single upload.
+
+    Returns (content, filename), or the error response to send instead.
+    """
+    if (
+        not request.content_type
+        or "multipart/form-data" not in request.content_type
+    ):
+        return error_response(
+            "Invalid request type. Must be multipart/form-data", 415
+        )
+
+    # First access to request.files parses the whole multipart body
+    with metrics.stage("multipart_parse"):
+        files = request.files
+
+    if "image" not in files:
+        return error_response("No image file provided in the request", 400)
+
+    file = files["image"]
+
+    if file.filename == "":
+        return error_response("No file selected", 400)
+
+    refused = charge_quota(1)
+    if refused is not None:
+        return refused
+
+    ALLOWED_EXTENSIONS = current_app.config["ALLOWED_EXTENSIONS"]
+
+    with metrics.stage("validation"):
         if not allowed_file(file.filename, ALLOWED_EXTENSIONS):
             return error_response(
                 "Invalid file type. Only JPG/JPEG files are allowed.", 400
@@ -73,84 +192,408 @@ class ExtractText(Resource):
             "image/png",
             "image/gif",
             "image/webp",
+            "image/tiff",
         ]:
             return error_response(
-                f"Invalid MIME type: {file.mimetype}. Only JPEG, PNG, and GIF images are allowed.",
+                f"Invalid MIME type: {file.mimetype}. Only JPEG, PNG, GIF, WEBP and TIFF images are allowed.",
                 400,
             )
 
-        content = file.read()
-        if not content or len(content) == 0:
-            return error_response("Uploaded file is empty or unreadable.", 400)
+    try:
+        reserve_upload_bytes([file])
+    except Overloaded as oe:
+        return overloaded_response(oe)
+
+    with metrics.stage("file_read"):
+        content = read_upload(file)
+    if not content or len(content) == 0:
+        return error_response("Uploaded file is empty or unreadable.", 400)
+
+    return content, get_secure_filename(file.filename)
+
+
+def admit_batch_upload():
+    """Parse, charge and validate a batch upload.
+
+    Returns (results, pending), or the error response to send instead.
+    `results` holds the error entry of each file rejected at validation
+    (None for the rest); only `pending` (position, filename, content) go
+    to Vision.
+    """
+    with metrics.stage("multipart_parse"):
+        files = request.files.getlist("image")
+    if not files:
+        return error_response("No image files provided", 400)
+
+    refused = charge_quota(len(files))
+    if refused is not None:
+        return refused
+
+    try:
+        reserve_upload_bytes(files)
+    except Overloaded as e:
+        return overloaded_response(e)
+    results = [None] * len(files)
+
+    ALLOWED_EXTENSIONS = current_app.config["ALLOWED_EXTENSIONS"]
+
+    # Validate and read every file up front; only good ones go to Vision
+    pending = []
+    for position, file in enumerate(files):
+        content, error = read_batch_file(file, ALLOWED_EXTENSIONS)
+        if error is not None:
+            results[position] = error
+        else:
+            pending.append((position, file.filename, content))
+    return results, pending
 
-        filename = get_secure_filename(file.filename)
+
+def ocr_error_response(e: Exception) -> Response:
+    """The response for an OCR call that raised `e`."""
+    if isinstance(e, Overloaded):
+        return overloaded_response(e)
+    if isinstance(e, RequestTimeout):
+        return error_response(str(e), 504)
+    if isinstance(e, ValueError):
+        return error_response(str(e), 400)
+    if isinstance(e, RuntimeError):
+        return error_response(str(e), 500)
+    return error_response(f"Unexpected error: {str(e)}", 500)
+
+
+@ns.route("/extract-text")
+class ExtractText(Resource):
+    @ns.expect(upload_parser)
+    @ns.response(200, "Success", OCROutputSchema)
+    @ns.response(400, "Bad Request")
+    @ns.response(415, "Unsupported Media Type")
+    @ns.response(429, "Rate limit or quota exceeded")
+    @ns.response(504, "Request deadline exceeded")
+    @ns.response(500, "Internal Server Error")
+    def post(self):
+        """Extract text from uploaded JPG image"""
+        upload = admit_single_upload()
+        if isinstance(upload, Response):
+            return upload
+        content, filename = upload
 
         try:
-            ocr = OCRService()
+            ocr = OCRService(
+                request_deadline(),
+                request.values.get("level", "text"),
+                priority=request_priority("interactive"),
+                client_key=client_key(),
+            )
             result = ocr.extract_text(content)
             metadata = ocr.extract_metadata(content)
             result["metadata"] = metadata
+            ocr.index_result(content, filename, result)
             return success_response(result)
-        except ValueError as ve:
-            return error_response(str(ve), 400)
-        except RuntimeError as re:
-            return error_response(str(re), 500)
         except Exception as e:
-            return error_response(f"Unexpected error: {str(e)}", 500)
+            return ocr_error_response(e)
+
+
+def wants_ndjson() -> bool:
+    """Streaming is opt-in: ?stream=true or an Accept header asking for NDJSON."""
+    if request.args.get("stream", "").lower() in ("1", "true", "yes"):
+        return True
+    accept = request.accept_mimetypes
+    return accept.best == "application/x-ndjson" or (
+        accept["application/x-ndjson"] > accept["application/json"]
+    )
+
+
+def wants_mosaic() -> bool:
+    return request.args.get("mosaic", "").lower() in ("1", "true", "yes")
+
+
+def stream_batch_results(ocr, results: list, pending: list, mosaic: bool = False):
+    """Yield one result per image as soon as it is ready, then a summary.
+
+    `results` holds the entries already rejected at validation; each line
+    carries its upload `index` because OCR results arrive in completion order.
+    """
+    start_time = time.perf_counter()
+    succeeded = failed = 0
+
+    for position, result in enumerate(results):
+        if result is not None:
+            failed += 1
+            yield {"index": position, **result}
+
+    contents = [content for _, _, content in pending]
+    done = set()
+    try:
+        for index, result in ocr.iter_extract_text_batch(contents, mosaic):
+            position, filename, _ = pending[index]
+            item = batch_result(ocr, filename, contents[index], result)
+            # Drop our reference so memory is released as the stream progresses
+            contents[index] = None
+            done.add(index)
+            if item["success"]:
+                succeeded += 1
+            else:
+                failed += 1
+            yield {"index": position, **item}
+    except Overloaded as e:
+        # Headers are already sent, so shed images are reported line by line
+        for index, (position, filename, _) in enumerate(pending):
+            if index not in done:
+                failed += 1
+                yield {
+                    "index": position,
+                    "filename": filename,
+                    "success": False,
+                    "error": str(e),
+                    "retry_after": e.retry_after,
+                }
+
+    yield {
+        "summary": True,
+        "total": len(results),
+        "succeeded": succeeded,
+        "failed": failed,
+        "processing_time_ms": int((time.perf_counter() - start_time) * 1000),
+    }
 
 
 @ns.route("/extract-text-batch")
 class ExtractTextBatch(Resource):
     @ns.expect(batch_upload_parser)
     def post(self):
-        """Extract text from multiple uploaded images concurrently (max 10 threads)"""
+        """Extract text from multiple uploaded images with batched Vision requests"""
+        try:
+            ocr = OCRService(
+                request_deadline(),
+                request.values.get("level", "text"),
+                priority=request_priority("batch"),
+                client_key=client_key(),
+            )
+        except ValueError as e:
+            return error_response(str(e), 400)
+        admitted = admit_batch_upload()
+        if isinstance(admitted, Response):
+            return admitted
+        results, pending = admitted
+
+        if wants_ndjson():
+            return ndjson_response(
+                stream_with_context(stream_batch_results(ocr, results, pending, wants_mosaic()))
+            )
+
+        # Images are packed into batch_annotate_images calls; errors stay per image
+        try:
+            ocr_results = ocr.extract_text_batch(
+                [content for _, _, content in pending], wants_mosaic()
+            )
+        except Overloaded as e:
+            return overloaded_response(e)
+        for (position, filename, content), result in zip(pending, ocr_results):
+            results[position] = batch_result(ocr, filename, content, result)
+
+        return success_response({"results": results})
+
+
+job_upload_parser = batch_upload_parser.copy()
+job_upload_parser.remove_argument("level")
+job_upload_parser.remove_argument("mosaic")
+job_upload_parser.add_argument(
+    "callback_url",
+    location="form",
+    required=False,
+    help="Optional http(s) URL that receives a POST when the job finishes",
+)
+
+results_parser = reqparse.RequestParser()
+results_parser.add_argument("offset", type=int, default=0, location="args")
+results_parser.add_argument("limit", type=int, default=100, location="args")
+
+
+@ns.route("/jobs")
+class Jobs(Resource):
+    @ns.expect(job_upload_parser)
+    @ns.response(202, "Accepted")
+    @ns.response(400, "Bad Request")
+    @ns.response(503, "Job queue full")
+    def post(self):
+        """Submit images for asynchronous OCR; returns a job ID immediately"""
         if not request.files or not request.files.getlist("image"):
             return error_response("No image files provided", 400)
 
-        files = request.files.getlist("image")
-        results = []
-        ocr = OCRService()
+        callback_url = request.form.get("callback_url") or None
+        if callback_url:
+            allowed = allowed_hosts(current_app.config["JOBS_CALLBACK_ALLOWED_HOSTS"])
+            try:
+                check_callback_url(callback_url, allowed)
+            except ValueError as e:
+                return error_response(str(e), 400)
+
+        refused = charge_quota(len(request.files.getlist("image")))
+        if refused is not None:
+            return refused
+
+        try:
+            reserve_upload_bytes(request.files.getlist("image"))
+        except Overloaded as e:
+            return overloaded_response(e)
 
         ALLOWED_EXTENSIONS = current_app.config["ALLOWED_EXTENSIONS"]
+        uploads = []
+        for file in request.files.getlist("image"):
+            content, error = read_batch_file(file, ALLOWED_EXTENSIONS)
+            uploads.append((file.filename, content if error is None else error))
 
-        def process_file(file, allowed_extensions=ALLOWED_EXTENSIONS):
-            """Worker function for ThreadPoolExecutor"""
-            if not allowed_file(file.filename, allowed_extensions):
-                return {
-                    "filename": file.filename,
-                    "success": False,
-                    "error": "Invalid file type.",
-                }
+        try:
+            job_id = get_job_runner().submit(uploads, callback_url, client_key())
+        except JobQueueFull as e:
+            return error_response(str(e), 503)
 
-            content = file.read()
-            if not content:
-                return {
-                    "filename": file.filename,
-                    "success": False,
-                    "error": "Empty or unreadable file.",
-                }
+        return success_response(
+            {
+                "job_id": job_id,
+                "status": "queued",
+                "status_url": f"/api/jobs/{job_id}",
+                "results_url": f"/api/jobs/{job_id}/results",
+            },
+            202,
+        )
 
-            try:
-                result = ocr.extract_text(content)
-                metadata = ocr.extract_metadata(content)
-                result["metadata"] = metadata
-                return {"filename": file.filename, "success": True, **result}
-            except Exception as e:
-                return {"filename": file.filename, "success": False, "error": str(e)}
-
-        # Use ThreadPoolExecutor for concurrent processing
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            futures = {
-                executor.submit(process_file, file): file.filename for file in files
+
+@ns.route("/jobs/<string:job_id>")
+class JobStatus(Resource):
+    @ns.response(404, "Job not found")
+    def get(self, job_id):
+        """Job status and progress counters"""
+        job = get_job_runner().store.get_job(job_id)
+        if job is None:
+            return error_response("Job not found", 404)
+        job.pop("callback_url", None)
+        return success_response({"job": job})
+
+
+@ns.route("/jobs/<string:job_id>/results")
+class JobResults(Resource):
+    @ns.expect(results_parser)
+    @ns.response(404, "Job not found")
+    def get(self, job_id):
+        """Finished results so far (paginated, in upload order)"""
+        store = get_job_runner().store
+        job = store.get_job(job_id)
+        if job is None:
+            return error_response("Job not found", 404)
+
+        args = results_parser.parse_args()
+        offset = max(0, args["offset"])
+        limit = min(max(1, args["limit"]), 1000)
+        results = store.get_results(job_id, offset, limit)
+        return success_response(
+            {
+                "job_id": job_id,
+                "status": job["status"],
+                "results": results,
+                "next_offset": offset + len(results),
             }
-            for future in as_completed(futures):
-                results.append(future.result())
+        )
+
+
+@ns.route("/cache/stats")
+class CacheStats(Resource):
+    def get(self):
+        """OCR result cache hit/miss counters for this worker"""
+        cache = current_app.extensions.get("ocr_cache")
+        if cache is None:
+            return success_response({"cache": {"enabled": False}})
+        return success_response({"cache": {"enabled": True, **cache.stats()}})
 
-        return success_response({"results": results})
+
+search_parser = reqparse.RequestParser()
+search_parser.add_argument("q", required=True, location="args", help="words to find")
+search_parser.add_argument("offset", type=int, default=0, location="args")
+search_parser.add_argument("limit", type=int, default=20, location="args")
+
+
+@ns.route("/search")
+class Search(Resource):
+    @ns.expect(search_parser)
+    @ns.response(400, "Query has no searchable words")
+    @ns.response(404, "Search index is disabled")
+    def get(self):
+        """Full-text search over indexed OCR results, best match first (see SEARCH_ENABLED)"""
+        index = current_app.extensions.get("ocr_search")
+        if index is None:
+            return error_response("Search index is disabled", 404)
+
+        args = search_parser.parse_args()
+        offset = max(0, args["offset"])
+        limit = min(max(1, args["limit"]), 100)
+        try:
+            results, more = index.search(args["q"], limit, offset)
+        except ValueError as e:
+            return error_response(str(e), 400)
+        return success_response(
+            {
+                "query": args["q"],
+                "results": results,
+                "next_offset": offset + len(results) if more else None,
+            }
+        )
+
+
+def get_profile_store():
+    """The profile store, or an error response if profiles are off or not allowed."""
+    store = current_app.extensions.get("ocr_profiles")
+    if store is None:
+        return error_response("Profiling is disabled", 404)
+    if current_app.config["PROFILE_TOKEN"] and not profiling.has_token(current_app.config):
+        return error_response("A valid X-Profile-Token header is required", 403)
+    return store
+
+
+@ns.route("/profiles")
+class Profiles(Resource):
+    @ns.response(403, "Missing or wrong X-Profile-Token")
+    @ns.response(404, "Profiling is disabled")
+    def get(self):
+        """Request profiles saved by this node, newest first (see PROFILE_ENABLED)"""
+        store = get_profile_store()
+        if isinstance(store, Response):
+            return store
+        return success_response({"profiles": store.list()})
+
+
+@ns.route("/profiles/<string:profile_id>")
+class ProfileDownload(Resource):
+    @ns.response(403, "Missing or wrong X-Profile-Token")
+    @ns.response(404, "Profile not found")
+    def get(self, profile_id):
+        """One profile as collapsed stacks (flamegraph.pl, speedscope, inferno)"""
+        store = get_profile_store()
+        if isinstance(store, Response):
+            return store
+        path = store.path(profile_id)
+        if path is None:
+            return error_response("Profile not found", 404)
+        return send_file(
+            path, mimetype="text/plain", as_attachment=True, download_name=f"{profile_id}.folded"
+        )
 
 
 @ns.route("/health")
 class Health(Resource):
     def get(self):
-        """Health check endpoint"""
+        """Liveness: the process is up and serving (no dependencies checked)"""
         return {"status": "healthy"}, 200
+
+
+@ns.route("/health/ready")
+class Ready(Resource):
+    @ns.response(503, "Still warming up, or warm-up failed")
+    def get(self):
+        """Readiness: the Vision client is imported and connected (see VISION_WARMUP)"""
+        status, error = vision_client.readiness()
+        if status == "ready":
+            return {"status": status}, 200
+        body = {"status": status}
+        if error:
+            body["error"] = error
+        return body, 503, {"Retry-After": "1"}
@@ -1,9 +1,21 @@
 import json
 from flask import Response
 from flask_restx import fields
+from ..utils import metrics
 
 
 def register_output_schemas(api):
+    LayoutElement = api.model(
+        "LayoutElement",
+        {
+            "page": fields.Integer(),
+            "text": fields.String(),
+            "confidence": fields.Float(),
+            "bounding_box": fields.List(
+                fields.List(fields.Integer), description="[[x, y], ...] vertices"
+            ),
+        },
+    )
     OCROutputSchema = api.model(
         "OCROutput",
         {
@@ -11,6 +23,51 @@ def register_output_schemas(api):
             "text": fields.String(description="Extracted text from image"),
             "confidence": fields.Float(description="Average OCR confidence"),
             "processing_time_ms": fields.Integer(description="Processing time in ms"),
+            "cache": fields.String(
+                description="OCR result cache: hit, near_hit, miss or disabled"
+            ),
+            "near_duplicate_distance": fields.Integer(
+                description="Bits differing from the perceptually matched image (near_hit only)"
+            ),
+            "mosaic": fields.Boolean(
+                description="Read from a shared canvas with other images of the batch"
+            ),
+            "blank": fields.Boolean(
+                description="Pre-flight found nothing to read; Vision was not called"
+            ),
+            "preprocessing": fields.Nested(
+                api.model(
+                    "Preprocessing",
+                    {
+                        "original_bytes": fields.Integer(),
+                        "optimized_bytes": fields.Integer(),
+                        "bytes_saved": fields.Integer(),
+                        "applied": fields.List(fields.String),
+                    },
+                ),
+                description="Bytes saved by the pre-upload optimization stage",
+            ),
+            "blocks": fields.List(fields.Nested(LayoutElement), description="level=blocks"),
+            "paragraphs": fields.List(
+                fields.Nested(LayoutElement), description="level=paragraphs"
+            ),
+            "words": fields.List(fields.Nested(LayoutElement), description="level=words"),
+            "frames": fields.List(
+                fields.Nested(
+                    api.model(
+                        "Frame",
+                        {
+                            "frame": fields.Integer(description="Frame/page index"),
+                            "text": fields.String(),
+                            "confidence": fields.Float(),
+                            "error": fields.String(),
+                        },
+                    )
+                ),
+                description="Per-frame results for animated or multi-page images",
+            ),
+            "frame_count": fields.Integer(description="Frames in the file"),
+            "duplicate_frames": fields.Integer(description="Repeated frames skipped"),
             "metadata": fields.Nested(
                 api.model(
                     "ImageMetadata",
@@ -31,16 +88,32 @@ def register_output_schemas(api):
 
 
 def success_response(data: dict, status: int = 200) -> Response:
+    with metrics.stage("serialize"):
+        body = json.dumps({"success": True, **data}, ensure_ascii=False)
     return Response(
-        json.dumps({"success": True, **data}, ensure_ascii=False),
+        body,
         status=status,
         mimetype="application/json; charset=utf-8",
     )
 
 
-def error_response(message: str, status: int) -> Response:
+def error_response(message: str, status: int, headers: dict = None) -> Response:
     return Response(
         json.dumps({"success": False, "error": message}, ensure_ascii=False),
         status=status,
+        headers=headers,
         mimetype="application/json; charset=utf-8",
     )
+
+
+def overloaded_response(error) -> Response:
+    """503 with Retry-After for work shed by admission control."""
+    return error_response(str(error), 503, {"Retry-After": str(error.retry_after)})
+
+
+def ndjson_response(items, status: int = 200) -> Response:
+    """Stream an iterable of dicts as newline-delimited JSON."""
+    lines = (json.dumps(item, ensure_ascii=False) + "\n" for item in items)
+    return Response(
+        lines, status=status, mimetype="application/x-ndjson; charset=utf-8"
+    )
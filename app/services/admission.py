@@ -0,0 +1,378 @@
+import heapq, itertools, math, os, threading, time
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+from typing import NamedTuple
+from ..utils import metrics
+
+# Highest first: single uploads, batch uploads, then jobs and the bulk CLI
+PRIORITIES = ("interactive", "batch", "backfill")
+
+
+class Overloaded(Exception):
+    """Raised when Vision work is shed instead of queued."""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Ticket(NamedTuple):
+    """Who a Vision call is for: its priority class, client (API key) and cost in images."""
+
+    priority: str = "batch"
+    client: str = ""
+    cost: float = 1.0
+
+
+def parse_weights(spec: str) -> dict:
+    """VISION_CLIENT_WEIGHTS ("key=4,other=0.5") as {client: weight}."""
+    weights = {}
+    for entry in spec.split(","):
+        client, _, weight = entry.strip().rpartition("=")
+        if client:
+            weights[client] = max(float(weight), 0.01)
+    return weights
+
+
+def max_waits(config) -> dict:
+    """Longest time a call of each priority class may wait for a Vision slot."""
+    batch = float(config.get("VISION_QUEUE_TIMEOUT_SECONDS", 10))
+    return {
+        "interactive": float(config.get("VISION_QUEUE_TIMEOUT_INTERACTIVE_SECONDS", batch)),
+        "batch": batch,
+        "backfill": float(config.get("VISION_QUEUE_TIMEOUT_BACKFILL_SECONDS", batch)),
+    }
+
+
+class FairQueue:
+    """Waiting Vision calls: strict priority between classes, fair between clients within one.
+
+    Weighted fair queuing: each call gets a virtual finish tag, cost / weight
+    after its client's previous call or the class's virtual clock, whichever
+    is later, and the smallest tag runs first. A client with 50 images queued
+    is then interleaved with one sending single images instead of served
+    first. Not thread safe; the owner holds its own lock.
+    """
+
+    def __init__(self, weights: dict = None):
+        self.weights = weights or {}
+        self._heaps = {priority: [] for priority in PRIORITIES}
+        self._clock = dict.fromkeys(PRIORITIES, 0.0)
+        self._finish = {priority: {} for priority in PRIORITIES}
+        self._order = itertools.count()
+
+    def __len__(self) -> int:
+        return sum(len(heap) for heap in self._heaps.values())
+
+    def counts(self) -> dict:
+        return {priority: len(heap) for priority, heap in self._heaps.items()}
+
+    def push(self, ticket: Ticket, item):
+        if ticket.priority not in self._heaps:
+            raise ValueError(f"Unknown priority: {ticket.priority}")
+        finish = self._finish[ticket.priority]
+        start = max(self._clock[ticket.priority], finish.get(ticket.client, 0.0))
+        finish[ticket.client] = start + ticket.cost / self.weights.get(ticket.client, 1.0)
+        entry = (finish[ticket.client], next(self._order), start, item)
+        heapq.heappush(self._heaps[ticket.priority], entry)
+
+    def pop(self) -> tuple:
+        """(priority, item) of the call to run next."""
+        for priority in PRIORITIES:
+            heap = self._heaps[priority]
+            if heap:
+                _, _, start, item = heapq.heappop(heap)
+                self._clock[priority] = start
+                self._settle(priority)
+                return priority, item
+        raise IndexError("pop from an empty FairQueue")
+
+    def remove(self, priority: str, item) -> bool:
+        """Drop `item` if it is still waiting; False once it has been popped."""
+        heap = self._heaps[priority]
+        for n, entry in enumerate(heap):
+            if entry[3] is item:
+                del heap[n]
+                heapq.heapify(heap)
+                self._settle(priority)
+                return True
+        return False
+
+    def _settle(self, priority: str):
+        if not self._heaps[priority]:
+            # An idle class starts over, so tags don't grow without bound
+            self._clock[priority] = 0.0
+            self._finish[priority].clear()
+
+    def evict(self, priority: str):
+        """Remove and return the last-scheduled call of the lowest class below `priority`."""
+        for lower in reversed(PRIORITIES[PRIORITIES.index(priority) + 1 :]):
+            heap = self._heaps[lower]
+            if heap:
+                entry = max(heap)
+                heap.remove(entry)
+                heapq.heapify(heap)
+                self._settle(lower)
+                return entry[3]
+        return None
+
+
+class AIMDLimit:
+    """Adaptive concurrency limit (additive increase, multiplicative decrease).
+
+    Each call that succeeds under `latency_target` raises the limit by
+    1/limit (about +1 per limit's worth of calls); an error or a slow call
+    multiplies it by `backoff`, at most once per `cooldown` seconds so one
+    burst of failures doesn't collapse it to the floor.
+    """
+
+    def __init__(
+        self,
+        initial: int = 16,
+        min_limit: int = 2,
+        max_limit: int = 64,
+        latency_target: float = 2.0,
+        backoff: float = 0.5,
+        adaptive: bool = True,
+    ):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.adaptive = adaptive
+        self.cooldown = latency_target
+        self._limit = float(min(max(initial, min_limit), max_limit))
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def on_success(self, latency: float):
+        if latency > self.latency_target:
+            self.on_error()
+            return
+        if not self.adaptive:
+            return
+        with self._lock:
+            self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+
+    def on_error(self):
+        if not self.adaptive:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_decrease < self.cooldown:
+                return
+            self._last_decrease = now
+            self._limit = max(self.min_limit, self._limit * self.backoff)
+
+
+class VisionExecutor:
+    """Process-wide bounded executor for Vision calls.
+
+    At most `limit.limit` tasks run at once; up to `max_queue` more wait in a
+    FairQueue. When it is full a call sheds the newest one of a lower class,
+    or is itself refused; a call still queued after its class's `max_wait`
+    (default `queue_timeout`) is dropped from the queue by a reaper thread.
+    All three raise Overloaded instead of piling up threads.
+    """
+
+    def __init__(
+        self,
+        limit: AIMDLimit,
+        max_queue: int = 64,
+        queue_timeout: float = 10.0,
+        max_wait: dict = None,
+        weights: dict = None,
+    ):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = dict.fromkeys(PRIORITIES, queue_timeout)
+        self.max_wait.update(max_wait or {})
+        self._pool = ThreadPoolExecutor(
+            max_workers=limit.max_limit, thread_name_prefix="vision"
+        )
+        self._queue = FairQueue(weights)
+        self._inflight = 0
+        self._lock = threading.Lock()
+        self._expiries = []  # (expiry, order, priority, item) of queued calls
+        self._order = itertools.count()
+        self._reaper = None
+        self._wakeup = threading.Condition(self._lock)
+        self._latency = limit.latency_target / 4  # EWMA seed for Retry-After
+        metrics.VISION_CONCURRENCY_LIMIT.set(limit.limit)
+
+    @classmethod
+    def from_config(cls, config):
+        limit = AIMDLimit(
+            int(config.get("VISION_CONCURRENCY_LIMIT", 16)),
+            int(config.get("VISION_CONCURRENCY_MIN", 2)),
+            int(config.get("VISION_CONCURRENCY_MAX", 64)),
+            float(config.get("VISION_LATENCY_TARGET_SECONDS", 2.0)),
+            adaptive=bool(config.get("VISION_ADAPTIVE_CONCURRENCY", True)),
+        )
+        return cls(
+            limit,
+            int(config.get("VISION_QUEUE_SIZE", 64)),
+            max_wait=max_waits(config),
+            weights=parse_weights(config.get("VISION_CLIENT_WEIGHTS", "")),
+        )
+
+    def retry_after(self) -> int:
+        """Rough seconds until the current queue drains."""
+        waves = (len(self._queue) + 1) / max(1, self.limit.limit)
+        return max(1, math.ceil(waves * self._latency))
+
+    def submit(self, fn, *args, ticket: Ticket = Ticket()) -> Future:
+        future = Future()
+        item = (future, fn, args, time.monotonic())
+        shed = None
+        with self._lock:
+            if self._inflight < self.limit.limit:
+                self._inflight += 1
+            else:
+                if len(self._queue) >= self.max_queue:
+                    shed = self._queue.evict(ticket.priority)
+                    if shed is None:
+                        metrics.VISION_SHED.labels("queue_full").inc()
+                        raise Overloaded(
+                            "Vision capacity exhausted, retry later", self.retry_after()
+                        )
+                    metrics.VISION_SHED.labels("preempted").inc()
+                else:
+                    metrics.VISION_QUEUE_DEPTH.inc()
+                self._queue.push(ticket, item)
+                self._watch(ticket.priority, item)
+                retry_after = self.retry_after()
+                item = None
+        if shed is not None:
+            # Outside the lock: the future's callbacks may submit again
+            _fail(shed, Overloaded("Vision capacity taken by higher-priority work", retry_after))
+        if item is not None:
+            metrics.VISION_QUEUE_WAIT.labels(ticket.priority).observe(0)
+            self._pool.submit(self._run, item)
+        return future
+
+    def _watch(self, priority: str, item):
+        """Schedule `item`'s expiry; called with the lock held."""
+        expiry = item[3] + self.max_wait[priority]
+        heapq.heappush(self._expiries, (expiry, next(self._order), priority, item))
+        if self._reaper is None:
+            self._reaper = threading.Thread(
+                target=self._reap, name="vision-queue-reaper", daemon=True
+            )
+            self._reaper.start()
+        elif self._expiries[0][3] is item:
+            self._wakeup.notify()
+
+    def _reap(self):
+        """Fail queued calls once they have waited their class's max_wait."""
+        while True:
+            expired = []
+            with self._wakeup:
+                while not expired:
+                    now = time.monotonic()
+                    while self._expiries and self._expiries[0][0] <= now:
+                        _, _, priority, item = heapq.heappop(self._expiries)
+                        # Calls already started (or shed) are no longer queued
+                        if self._queue.remove(priority, item):
+                            metrics.VISION_QUEUE_DEPTH.dec()
+                            metrics.VISION_SHED.labels("queue_timeout").inc()
+                            expired.append(item)
+                    if not expired:
+                        timeout = self._expiries[0][0] - now if self._expiries else None
+                        self._wakeup.wait(timeout)
+                retry_after = self.retry_after()
+            for item in expired:
+                _fail(item, Overloaded("Timed out waiting for Vision capacity", retry_after))
+
+    def _run(self, item):
+        future, fn, args, _ = item
+        if future.set_running_or_notify_cancel():
+            start = time.monotonic()
+            try:
+                result = fn(*args)
+            except BaseException as e:
+                self.limit.on_error()
+                future.set_exception(e)
+            else:
+                latency = time.monotonic() - start
+                self._latency = 0.8 * self._latency + 0.2 * latency
+                self.limit.on_success(latency)
+                future.set_result(result)
+        self._release()
+
+    def _release(self):
+        """Free a slot and start as many queued tasks as the limit now allows."""
+        to_start, expired = [], []
+        with self._lock:
+            self._inflight -= 1
+            now = time.monotonic()
+            while self._queue and self._inflight < self.limit.limit:
+                priority, item = self._queue.pop()
+                metrics.VISION_QUEUE_DEPTH.dec()
+                if item[0].cancelled():
+                    continue  # its caller ran out of time
+                waited = now - item[3]
+                if waited > self.max_wait[priority]:
+                    metrics.VISION_SHED.labels("queue_timeout").inc()
+                    expired.append(item)
+                    continue
+                metrics.VISION_QUEUE_WAIT.labels(priority).observe(waited)
+                self._inflight += 1
+                to_start.append(item)
+            metrics.VISION_CONCURRENCY_LIMIT.set(self.limit.limit)
+            retry_after = self.retry_after()
+        for item in expired:
+            _fail(item, Overloaded("Timed out waiting for Vision capacity", retry_after))
+        for item in to_start:
+            self._pool.submit(self._run, item)
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit.limit,
+            "inflight": self._inflight,
+            "queued": len(self._queue),
+            "queued_by_priority": self._queue.counts(),
+            "max_queue": self.max_queue,
+        }
+
+
+def _fail(item, error: Overloaded):
+    # Its caller may have cancelled it (deadline) after it left the queue
+    try:
+        item[0].set_exception(error)
+    except InvalidStateError:
+        pass
+
+
+# One executor per process; dropped in forked children like the client pool
+_lock = threading.Lock()
+_executor = None
+
+
+def get_executor(config) -> VisionExecutor:
+    global _executor
+    executor = _executor
+    if executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = VisionExecutor.from_config(config)
+            executor = _executor
+    return executor
+
+
+def reset():
+    global _executor
+    _executor = None
+
+
+def _after_fork_in_child():
+    global _lock
+    _lock = threading.Lock()
+    reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
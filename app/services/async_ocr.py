@@ -0,0 +1,376 @@
+"""OCRService for the asyncio entry point (asgi.py).
+
+Vision RPCs are awaited on ImageAnnotatorAsyncClient, so a call in flight
+holds no thread: a worker can have VISION_ASYNC_CONCURRENCY of them at once.
+Everything that touches Pillow or SQLite (hashing, cache lookups,
+preprocessing, mosaics, parsing) runs on a small thread pool instead of the
+event loop. Multi-frame images go through the sync pipeline on that pool.
+"""
+import asyncio, contextvars, functools, os, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from .admission import FairQueue, Overloaded, Ticket, max_waits, parse_weights
+from .ocr_service import OCRService, document_text_feature, vision_error
+from .resilience import RequestTimeout
+from ..utils import metrics, profiling
+from . import vision_client
+
+
+class FairSlots:
+    """Up to `limit` Vision RPCs at once; waiters are let in FairQueue order.
+
+    The event loop's counterpart of VisionExecutor's queue (same priority
+    classes and per-client weights), without a size bound: a waiter costs
+    a future, not a thread.
+    """
+
+    def __init__(self, limit: int, weights: dict = None):
+        self.limit = limit
+        self._held = 0
+        self._queue = FairQueue(weights)
+
+    def locked(self) -> bool:
+        """True if acquire() would have to wait."""
+        return self._held >= self.limit or bool(self._queue)
+
+    async def acquire(self, ticket: Ticket, timeout: float):
+        """Take a slot, or raise asyncio.TimeoutError after `timeout` seconds."""
+        if not self.locked():
+            self._held += 1
+            metrics.VISION_QUEUE_WAIT.labels(ticket.priority).observe(0)
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._queue.push(ticket, (waiter, time.monotonic()))
+        metrics.VISION_QUEUE_DEPTH.inc()
+        # A waiter that times out stays queued, cancelled, and is skipped by release()
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # handed the slot just as it gave up
+            raise
+
+    def release(self):
+        """Hand the slot to the next live waiter, or free it."""
+        while self._queue:
+            priority, (waiter, queued_at) = self._queue.pop()
+            metrics.VISION_QUEUE_DEPTH.dec()
+            if not waiter.done():
+                metrics.VISION_QUEUE_WAIT.labels(priority).observe(time.monotonic() - queued_at)
+                waiter.set_result(None)
+                return
+        self._held -= 1
+
+
+class AsyncRuntime:
+    """Per-event-loop state: the async client pool, the RPC slots and background tasks."""
+
+    def __init__(self, config):
+        self.loop = asyncio.get_running_loop()
+        self.clients = vision_client.create_async_pool(config)
+        self.slots = FairSlots(
+            max(1, int(config.get("VISION_ASYNC_CONCURRENCY", 256))),
+            parse_weights(config.get("VISION_CLIENT_WEIGHTS", "")),
+        )
+        self.max_wait = max_waits(config)
+        self._tasks = set()
+
+    def spawn(self, coro) -> asyncio.Task:
+        """Start a task that outlives its caller (the loop keeps only weak references)."""
+        task = self.loop.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+
+# One runtime per event loop and one thread pool per process
+_lock = threading.Lock()
+_runtime = None
+_threads = None
+
+
+def get_runtime(config) -> AsyncRuntime:
+    """The running loop's runtime, created on first use (e.g. at ASGI startup)."""
+    global _runtime
+    runtime = _runtime
+    if runtime is None or runtime.loop is not asyncio.get_running_loop():
+        runtime = _runtime = AsyncRuntime(config)
+    return runtime
+
+
+def get_thread_pool(config) -> ThreadPoolExecutor:
+    global _threads
+    with _lock:
+        if _threads is None:
+            _threads = ThreadPoolExecutor(
+                max_workers=max(1, int(config.get("ASYNC_THREADS", 8))),
+                thread_name_prefix="ocr-async",
+            )
+        return _threads
+
+
+async def offload(pool: ThreadPoolExecutor, fn, *args):
+    """Run fn(*args) on `pool` in a copy of the caller's context.
+
+    The copy carries Flask's request and app contexts, so route helpers that
+    use `request`, `g` or `current_app` work unchanged on the pool, and the
+    thread is sampled for the request's profile while it runs fn.
+    """
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(
+        pool, functools.partial(context.run, profiling.traced, fn, *args)
+    )
+
+
+class AsyncOCRService(OCRService):
+    """OCRService whose extract_text and extract_text_batch are coroutines."""
+
+    def __init__(self, deadline=None, level: str = "text", priority="batch", client_key=""):
+        super().__init__(deadline, level, priority=priority, client_key=client_key)
+        self.runtime = get_runtime(self.config)
+        self.threads = get_thread_pool(self.config)
+
+    async def _offload(self, fn, *args):
+        return await offload(self.threads, fn, *args)
+
+    async def _acquire(self, cost: int = 1):
+        """Take a Vision slot, shedding after the class's queue timeout like the sync executor."""
+        ticket = Ticket(self.priority, self.client_key, cost)
+        wait = min(self.runtime.max_wait[self.priority], self.deadline.remaining())
+        try:
+            await self.runtime.slots.acquire(ticket, wait)
+        except asyncio.TimeoutError:
+            if self.deadline.expired:
+                raise RequestTimeout("Request deadline exceeded waiting for Vision")
+            metrics.VISION_SHED.labels("queue_timeout").inc()
+            raise Overloaded("Timed out waiting for Vision capacity")
+
+    async def _call(self, fn, *args, cost: int = 1):
+        """await fn(*args) in a Vision slot, retrying transient errors while the budget allows.
+
+        The slot is released during backoff sleeps, as with submit_with_retries.
+        """
+        attempt = 0
+        while True:
+            await self._acquire(cost)
+            try:
+                return await fn(*args)
+            except Exception as e:
+                error = e
+            finally:
+                self.runtime.slots.release()
+            delay = self.retry.backoff(attempt)
+            if not self.retry.should_retry(error, attempt) or delay >= self.deadline.remaining():
+                raise error
+            metrics.VISION_RETRIES.labels(type(error).__name__).inc()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _detect(self, payload):
+        """Single-image Vision RPC (the async client has no document_text_detection helper)."""
+        from google.cloud import vision
+
+        request = vision.AnnotateImageRequest(
+            image=vision.Image(content=bytes(payload)), features=[document_text_feature()]
+        )
+        timeout = self.deadline.timeout(self.attempt_timeout)
+        start = time.perf_counter()
+        with metrics.vision_call("document_text_detection"):
+            response = await self.runtime.clients.get().batch_annotate_images(
+                requests=[request], retry=None, timeout=timeout
+            )
+        self.latency.record(time.perf_counter() - start)
+        return response.responses[0]
+
+    async def _annotate(self, payloads: list):
+        """batch_annotate_images for already prepared payloads."""
+        from google.cloud import vision
+
+        requests = [
+            vision.AnnotateImageRequest(
+                image=vision.Image(content=bytes(payload)), features=[document_text_feature()]
+            )
+            for payload in payloads
+        ]
+        timeout = self.deadline.timeout(self.attempt_timeout)
+        with metrics.vision_call("batch_annotate_images", len(requests)):
+            return await self.runtime.clients.get().batch_annotate_images(
+                requests=requests, retry=None, timeout=timeout
+            )
+
+    async def _hedged(self, payload):
+        """_detect, racing a second copy if the first is still running after the hedge delay."""
+        delay = self.hedge.delay() if self.hedge is not None else None
+        primary = asyncio.ensure_future(self._call(self._detect, payload))
+        if delay is None:
+            return await primary
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+        if self.runtime.slots.locked():
+            # No spare capacity: a hedge must never add load that gets shed
+            metrics.VISION_HEDGES.labels("skipped").inc()
+            return await primary
+        metrics.VISION_HEDGES.labels("sent").inc()
+        backup = asyncio.ensure_future(self._call(self._detect, payload))
+
+        done, pending = await asyncio.wait({primary, backup}, return_when=asyncio.FIRST_COMPLETED)
+        winner = done.pop()
+        if winner.exception() is not None and pending:
+            # The first answer was an error; the other copy may still succeed
+            other = pending.pop()
+            await asyncio.wait({other})
+            if other.exception() is None:
+                winner = other
+        for task in (primary, backup):
+            if task is not winner:
+                task.cancel()
+        if winner is backup and winner.exception() is None:
+            metrics.VISION_HEDGES.labels("won").inc()
+        return winner.result()
+
+    def _prepare_single(self, content):
+        """(payload, stats) for Vision, or None for a multi-frame image."""
+        if self._frames(content) > 1:
+            return None
+        return self._prepare(content)
+
+    async def _extract_uncached(self, content, key, start_time: float) -> dict:
+        blank = await self._offload(self._blank_result, content, key, start_time)
+        if blank is not None:
+            return blank
+        prepared = await self._offload(self._prepare_single, content)
+        if prepared is None:
+            return await self._offload(self._extract_frames, content, key, start_time)
+        payload, preprocessing = prepared
+
+        try:
+            response = await self._hedged(payload)
+        except Exception as e:
+            raise vision_error(e)
+
+        processing_time_ms = int((time.perf_counter() - start_time) * 1000)
+        result = await self._offload(self._parse_response, response, key, processing_time_ms)
+        if preprocessing is not None:
+            result["preprocessing"] = preprocessing
+        return result
+
+    async def extract_text(self, content) -> dict:
+        """OCRService.extract_text, awaiting Vision instead of blocking on it."""
+        start_time = time.perf_counter()
+
+        if not content or len(content) == 0:
+            raise ValueError("Uploaded file is empty or unreadable.")
+
+        self._headers.clear()
+        key, cached = await self._offload(self._lookup, content, start_time)
+        if cached is not None:
+            return cached
+
+        # Shares the sync path's table, so both stacks coalesce with each other
+        flight_key = key or await self._offload(self._key, content)
+        while True:
+            future, leader = self.flights.begin(flight_key)
+            if leader:
+                self.runtime.spawn(
+                    self.flights.arun(
+                        flight_key,
+                        future,
+                        lambda: self._extract_uncached(content, key, start_time),
+                    )
+                )
+            try:
+                result = await asyncio.wait_for(
+                    asyncio.shield(asyncio.wrap_future(future)), self.deadline.wait_timeout()
+                )
+                break
+            except asyncio.TimeoutError:
+                raise RequestTimeout("Request deadline exceeded waiting for Vision")
+            except RequestTimeout:
+                # The leader ran out of its own budget; a waiter with time left tries itself
+                if leader or self.deadline.expired:
+                    raise
+
+        if leader:
+            return result
+        result = dict(result)
+        result["processing_time_ms"] = int((time.perf_counter() - start_time) * 1000)
+        return result
+
+    def _prepare_chunk(self, items: list, contents: list) -> list:
+        return [self._prepare(self._payload(item, contents)) for item in items]
+
+    async def iter_extract_text_batch(self, contents: list, mosaic: bool = False):
+        """Async generator of (index, result) as each batch RPC completes.
+
+        Same packing, mosaics and per-image errors as the sync version; at
+        most VISION_BATCH_PARALLEL_CHUNKS chunks of one request are in flight.
+        """
+        start_time = time.perf_counter()
+        self._headers.clear()
+        ready, batches, multi_frame, duplicates = await self._offload(
+            self._plan_batch, contents, mosaic, start_time
+        )
+        for index, result in ready:
+            yield index, result
+
+        parallel = asyncio.Semaphore(max(1, int(self.config.get("VISION_BATCH_PARALLEL_CHUNKS", 4))))
+
+        async def chunk(batch):
+            items, keys = [item for item, _ in batch], [key for _, key in batch]
+            async with parallel:
+                try:
+                    prepared = await self._offload(self._prepare_chunk, items, contents)
+                    payloads = [payload for payload, _ in prepared]
+                    response = await self._call(self._annotate, payloads, cost=len(payloads))
+                except Exception as e:
+                    return items, [vision_error(e)] * len(items)
+            results = await self._offload(
+                self._parse_chunk, response, [stats for _, stats in prepared], keys, start_time
+            )
+            return items, results
+
+        async def document(index, key):
+            try:
+                return [index], [
+                    await self._offload(self._extract_frames, contents[index], key, start_time)
+                ]
+            except Exception as e:
+                return [index], [e]
+
+        tasks = [asyncio.ensure_future(chunk(batch)) for batch in batches]
+        tasks += [asyncio.ensure_future(document(index, key)) for index, key in multi_frame]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                items, results = await finished
+                for item, result in zip(items, results):
+                    for index, value in self._unpack(item, result, duplicates):
+                        yield index, value
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def extract_text_batch(self, contents: list, mosaic: bool = False) -> list:
+        """Results in input order; raises Overloaded if every image was shed."""
+        results = [None] * len(contents)
+        async for index, result in self.iter_extract_text_batch(contents, mosaic):
+            results[index] = result
+        if results and all(isinstance(r, Overloaded) for r in results):
+            raise results[0]
+        return results
+
+
+def reset():
+    global _runtime
+    _runtime = None
+
+
+def _after_fork_in_child():
+    global _lock, _threads
+    _lock = threading.Lock()
+    # The pool's threads did not survive the fork
+    _threads = None
+    reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
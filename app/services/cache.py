@@ -0,0 +1,187 @@
+import hashlib, json, os, sqlite3, threading, time
+from collections import OrderedDict
+from ..utils.metrics import CACHE_LOOKUPS
+
+
+def content_key(content: bytes) -> str:
+    """Cache key for an upload: SHA-256 of the raw image bytes."""
+    return hashlib.sha256(content).hexdigest()
+
+
+class MemoryCache:
+    """Bounded in-process LRU tier with a per-entry TTL."""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: int = 86400):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: dict):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """On-disk tier shared by every gunicorn worker on the node; survives restarts."""
+
+    # Expired/over-capacity rows are pruned every N writes rather than on each one
+    PRUNE_EVERY = 100
+
+    def __init__(self, path: str, max_entries: int = 100000, ttl_seconds: int = 86400):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._writes = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS ocr_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ocr_cache_accessed ON ocr_cache (accessed_at)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 connections must not cross threads (or forks), so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: str):
+        now = time.time()
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value FROM ocr_cache WHERE key = ? AND expires_at > ?",
+                (key, now),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE ocr_cache SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            return json.loads(row[0])
+        except sqlite3.Error:
+            # The disk tier is best effort: a locked or corrupt file is just a miss
+            return None
+
+    def set(self, key: str, value: dict):
+        now = time.time()
+        try:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO ocr_cache (key, value, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now + self.ttl_seconds, now),
+            )
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                self.prune()
+        except sqlite3.Error:
+            pass
+
+    def prune(self):
+        conn = self._connect()
+        conn.execute("DELETE FROM ocr_cache WHERE expires_at <= ?", (time.time(),))
+        conn.execute(
+            "DELETE FROM ocr_cache WHERE key IN ("
+            "SELECT key FROM ocr_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+
+class OCRCache:
+    """Content-addressed OCR result cache: memory LRU in front of an optional disk tier."""
+
+    METRIC_LABELS = {"memory_hits": "memory_hit", "disk_hits": "disk_hit", "misses": "miss"}
+
+    def __init__(self, memory: MemoryCache, disk: SQLiteCache = None):
+        self.memory = memory
+        self.disk = disk
+        self._lock = threading.Lock()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    @classmethod
+    def from_config(cls, config):
+        if not config.get("OCR_CACHE_ENABLED", True):
+            return None
+        ttl = int(config.get("OCR_CACHE_TTL_SECONDS", 86400))
+        memory = MemoryCache(int(config.get("OCR_CACHE_MAX_ENTRIES", 1024)), ttl)
+        disk = None
+        if config.get("OCR_CACHE_DB_PATH"):
+            disk = SQLiteCache(
+                config["OCR_CACHE_DB_PATH"],
+                int(config.get("OCR_CACHE_DB_MAX_ENTRIES", 100000)),
+                ttl,
+            )
+        return cls(memory, disk)
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+        CACHE_LOOKUPS.labels(self.METRIC_LABELS[name]).inc()
+
+    def get(self, key: str):
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return dict(value)
+
+        if self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+                self._count("disk_hits")
+                return dict(value)
+
+        self._count("misses")
+        return None
+
+    def set(self, key: str, value: dict):
+        value = dict(value)
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+        hits = counters["memory_hits"] + counters["disk_hits"]
+        lookups = hits + counters["misses"]
+        return {
+            **counters,
+            "hits": hits,
+            "lookups": lookups,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "disk_enabled": self.disk is not None,
+            "pid": os.getpid(),
+        }
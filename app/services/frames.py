@@ -0,0 +1,54 @@
+import hashlib
+from io import BytesIO
+from PIL import Image
+from .preprocess import flatten
+from ..utils.file_utils import as_stream
+
+# Formats that can hold several frames/pages Vision would only read one of
+MULTI_FRAME_FORMATS = {"GIF", "TIFF", "WEBP", "PNG", "MPO"}
+
+
+def frame_count(content: bytes) -> int:
+    """Number of frames/pages in an image (1 if it can't be read here)."""
+    try:
+        with Image.open(as_stream(content)) as img:
+            if img.format not in MULTI_FRAME_FORMATS:
+                return 1
+            return getattr(img, "n_frames", 1)
+    except Exception:
+        return 1
+
+
+def iter_frames(
+    content: bytes,
+    max_frames: int,
+    max_dimension: int = 2048,
+    quality: int = 90,
+    stats: dict = None,
+):
+    """Yield (frame index, JPEG bytes) for each distinct frame, one at a time.
+
+    Pillow decodes a frame only when it is seeked to, so a long TIFF is never
+    held in memory as a whole; only the current frame and its encoded copy
+    are alive. Frames whose pixels repeat an earlier frame (common in
+    animated GIFs) are skipped and counted in stats["duplicates"].
+    """
+    stats = stats if stats is not None else {}
+    stats.setdefault("duplicates", 0)
+    seen = set()
+    with Image.open(as_stream(content)) as img:
+        for index in range(min(getattr(img, "n_frames", 1), max_frames)):
+            img.seek(index)
+            frame = flatten(img)
+            digest = hashlib.blake2b(frame.tobytes(), digest_size=16).digest()
+            if digest in seen:
+                stats["duplicates"] += 1
+                continue
+            seen.add(digest)
+
+            if max(frame.size) > max_dimension:
+                frame.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+            out = BytesIO()
+            frame.save(out, format="JPEG", quality=quality)
+            del frame
+            yield index, out.getvalue()
@@ -0,0 +1,245 @@
+import json, logging, os, shutil, sqlite3, threading, time, uuid
+from concurrent.futures import ThreadPoolExecutor
+from .ocr_service import OCRService, batch_result
+from .admission import Overloaded
+from .webhooks import allowed_hosts, post_json
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobStore:
+    """SQLite-backed job state, readable from every gunicorn worker on the node."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, total INTEGER NOT NULL, "
+            "completed INTEGER NOT NULL DEFAULT 0, failed INTEGER NOT NULL DEFAULT 0, "
+            "callback_url TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_items ("
+            "job_id TEXT NOT NULL, position INTEGER NOT NULL, filename TEXT, "
+            "status TEXT NOT NULL, result TEXT, PRIMARY KEY (job_id, position))"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def create_job(self, job_id: str, filenames: list, callback_url: str = None):
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN")
+            conn.execute(
+                "INSERT INTO jobs (id, status, total, callback_url, created_at, updated_at) "
+                "VALUES (?, 'queued', ?, ?, ?, ?)",
+                (job_id, len(filenames), callback_url, now, now),
+            )
+            conn.executemany(
+                "INSERT INTO job_items (job_id, position, filename, status) "
+                "VALUES (?, ?, ?, 'pending')",
+                [(job_id, i, name) for i, name in enumerate(filenames)],
+            )
+
+    def set_status(self, job_id: str, status: str):
+        self._connect().execute(
+            "UPDATE jobs SET status = ?, updated_at = ? WHERE id = ?",
+            (status, time.time(), job_id),
+        )
+
+    def record_result(self, job_id: str, position: int, result: dict):
+        status = "done" if result.get("success") else "failed"
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN")
+            conn.execute(
+                "UPDATE job_items SET status = ?, result = ? "
+                "WHERE job_id = ? AND position = ?",
+                (status, json.dumps(result, ensure_ascii=False), job_id, position),
+            )
+            column = "completed" if status == "done" else "failed"
+            conn.execute(
+                f"UPDATE jobs SET {column} = {column} + 1, updated_at = ? WHERE id = ?",
+                (time.time(), job_id),
+            )
+
+    def get_job(self, job_id: str):
+        row = self._connect().execute(
+            "SELECT id, status, total, completed, failed, callback_url, created_at, updated_at "
+            "FROM jobs WHERE id = ?",
+            (job_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        keys = ("job_id", "status", "total", "completed", "failed",
+                "callback_url", "created_at", "updated_at")
+        return dict(zip(keys, row))
+
+    def get_results(self, job_id: str, offset: int = 0, limit: int = 100) -> list:
+        """Finished items only, in upload order, so callers can page partial results."""
+        rows = self._connect().execute(
+            "SELECT result FROM job_items WHERE job_id = ? AND result IS NOT NULL "
+            "ORDER BY position LIMIT ? OFFSET ?",
+            (job_id, limit, offset),
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+
+class JobRunner:
+    """Bounded background pool that works through submitted OCR jobs.
+
+    Uploads are spooled to disk on submission so the HTTP request can return
+    immediately; job state lives in a JobStore.
+    """
+
+    # Rounds of waiting for Vision capacity before shed images are marked failed
+    MAX_SHED_RETRIES = 20
+
+    def __init__(
+        self,
+        app,
+        store: JobStore,
+        spool_dir: str,
+        max_workers: int = 2,
+        max_queued: int = 100,
+    ):
+        self.app = app
+        self.store = store
+        self.spool_dir = spool_dir
+        self.max_queued = max_queued
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="ocr-job"
+        )
+        self._lock = threading.Lock()
+        self._queued = 0
+
+    @classmethod
+    def from_config(cls, app):
+        config = app.config
+        return cls(
+            app,
+            JobStore(config["JOBS_DB_PATH"]),
+            config["JOBS_SPOOL_DIR"],
+            int(config.get("JOBS_MAX_WORKERS", 2)),
+            int(config.get("JOBS_MAX_QUEUED", 100)),
+        )
+
+    def submit(self, uploads: list, callback_url: str = None, client_key: str = "") -> str:
+        """Spool `uploads` [(filename, content or error result)] and queue the job.
+
+        Its Vision calls are backfill priority, queued fairly under `client_key`.
+        """
+        with self._lock:
+            if self._queued >= self.max_queued:
+                raise JobQueueFull("Too many OCR jobs queued, retry later")
+            self._queued += 1
+
+        try:
+            job_id = uuid.uuid4().hex
+            job_dir = os.path.join(self.spool_dir, job_id)
+            os.makedirs(job_dir)
+            for position, (_, content) in enumerate(uploads):
+                if not isinstance(content, dict):
+                    with open(os.path.join(job_dir, str(position)), "wb") as f:
+                        f.write(content)
+
+            filenames = [name for name, _ in uploads]
+            self.store.create_job(job_id, filenames, callback_url)
+            # Uploads rejected at intake are recorded straight away
+            for position, (_, content) in enumerate(uploads):
+                if isinstance(content, dict):
+                    self.store.record_result(job_id, position, content)
+        except Exception:
+            with self._lock:
+                self._queued -= 1
+            raise
+
+        # Only names and positions are queued; the image bytes stay on disk
+        positions = [i for i, (_, c) in enumerate(uploads) if not isinstance(c, dict)]
+        self._executor.submit(self._run, job_id, job_dir, filenames, positions, client_key)
+        return job_id
+
+    def _run(self, job_id: str, job_dir: str, filenames: list, positions: list, client_key: str):
+        try:
+            self.store.set_status(job_id, "running")
+            contents = []
+            for position in positions:
+                with open(os.path.join(job_dir, str(position)), "rb") as f:
+                    contents.append(f.read())
+
+            with self.app.app_context():
+                ocr = OCRService(priority="backfill", client_key=client_key)
+                remaining = list(range(len(contents)))
+                for attempt in range(self.MAX_SHED_RETRIES + 1):
+                    remaining, retry_after = self._process(
+                        ocr,
+                        job_id,
+                        filenames,
+                        positions,
+                        contents,
+                        remaining,
+                        record_shed=attempt == self.MAX_SHED_RETRIES,
+                    )
+                    if not remaining:
+                        break
+                    # Background work waits for capacity instead of failing
+                    time.sleep(retry_after)
+            self.store.set_status(job_id, "completed")
+        except Exception:
+            logger.exception("OCR job %s failed", job_id)
+            self.store.set_status(job_id, "failed")
+        finally:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            with self._lock:
+                self._queued -= 1
+            self._notify(job_id)
+
+    def _process(self, ocr, job_id, filenames, positions, contents, indices, record_shed):
+        """OCR `indices`; returns (indices shed by admission control, retry delay)."""
+        subset = [contents[i] for i in indices]
+        recorded, retry_after = set(), 1
+        try:
+            for n, result in ocr.iter_extract_text_batch(subset):
+                index = indices[n]
+                if isinstance(result, Overloaded) and not record_shed:
+                    retry_after = result.retry_after
+                    continue
+                position = positions[index]
+                item = batch_result(ocr, filenames[position], contents[index], result)
+                self.store.record_result(job_id, position, item)
+                recorded.add(index)
+        except Overloaded as e:
+            if record_shed:
+                raise
+            retry_after = e.retry_after
+        return [i for i in indices if i not in recorded], retry_after
+
+    def _notify(self, job_id: str):
+        job = self.store.get_job(job_id)
+        if not job or not job["callback_url"]:
+            return
+        payload = {k: v for k, v in job.items() if k != "callback_url"}
+        allowed = allowed_hosts(self.app.config.get("JOBS_CALLBACK_ALLOWED_HOSTS", ""))
+        try:
+            post_json(job["callback_url"], payload, allowed)
+        except Exception as e:
+            logger.warning("Webhook for job %s failed: %s", job_id, e)
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
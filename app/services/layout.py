@@ -0,0 +1,91 @@
+# Output granularity: "text" is the flattened text only; the others add a flat
+# list of that element with text, confidence and bounding box
+LEVELS = ("text", "blocks", "paragraphs", "words")
+
+# vision.TextAnnotation.DetectedBreak.BreakType values, as the raw protobuf
+# returns them; spelled out so importing this module doesn't load google.cloud
+SPACE, SURE_SPACE, EOL_SURE_SPACE, HYPHEN, LINE_BREAK = 1, 2, 3, 4, 5
+LINE_BREAKS = {EOL_SURE_SPACE, LINE_BREAK}
+SPACE_BREAKS = {SPACE, SURE_SPACE}
+
+
+def raw(message):
+    """The protobuf behind a proto-plus message (no copy).
+
+    Attribute access on proto-plus wrappers allocates a wrapper per field,
+    which dominates the cost of walking a dense annotation; the raw message
+    is read straight from the C implementation.
+    """
+    return type(message).pb(message)
+
+
+def box(bounding_poly) -> list:
+    return [[v.x, v.y] for v in bounding_poly.vertices]
+
+
+def word_text(word) -> str:
+    return "".join(symbol.text for symbol in word.symbols)
+
+
+def join_words(words) -> str:
+    """Rebuild text from words, honouring Vision's detected spaces and line breaks."""
+    parts = []
+    for word in words:
+        for symbol in word.symbols:
+            parts.append(symbol.text)
+            kind = symbol.property.detected_break.type_
+            if kind in LINE_BREAKS:
+                parts.append("\n")
+            elif kind in SPACE_BREAKS:
+                parts.append(" ")
+    return "".join(parts).strip()
+
+
+def project(annotation, level: str = "text"):
+    """Single pass over a TextAnnotation: (mean word confidence, items for `level`).
+
+    Only the requested level is materialized; for "text" no per-element
+    objects are built at all and `items` is None.
+    """
+    pb = raw(annotation)
+    total, count = 0.0, 0
+    items = None if level == "text" else []
+
+    for page_index, page in enumerate(pb.pages):
+        for block in page.blocks:
+            if level == "blocks":
+                words = [w for p in block.paragraphs for w in p.words]
+                items.append(
+                    {
+                        "page": page_index,
+                        "text": join_words(words),
+                        "confidence": round(block.confidence, 4),
+                        "bounding_box": box(block.bounding_box),
+                    }
+                )
+            for paragraph in block.paragraphs:
+                if level == "paragraphs":
+                    items.append(
+                        {
+                            "page": page_index,
+                            "text": join_words(paragraph.words),
+                            "confidence": round(paragraph.confidence, 4),
+                            "bounding_box": box(paragraph.bounding_box),
+                        }
+                    )
+                for word in paragraph.words:
+                    confidence = word.confidence
+                    if confidence:
+                        total += confidence
+                        count += 1
+                    if level == "words":
+                        items.append(
+                            {
+                                "page": page_index,
+                                "text": word_text(word),
+                                "confidence": round(confidence, 4),
+                                "bounding_box": box(word.bounding_box),
+                            }
+                        )
+
+    return (round(total / count, 2) if count else 0.0), items
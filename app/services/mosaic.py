@@ -0,0 +1,179 @@
+from io import BytesIO
+from typing import NamedTuple
+from PIL import Image, ImageOps
+from .layout import box, join_words, raw, word_text
+from .preprocess import EXIF_ORIENTATION, flatten
+from ..utils.file_utils import as_stream
+
+
+class Tile(NamedTuple):
+    """Where one source image sits on a mosaic canvas."""
+
+    item: int  # the caller's index for the image
+    x: int
+    y: int
+    width: int
+    height: int
+
+    def contains(self, x: float, y: float) -> bool:
+        return self.x <= x < self.x + self.width and self.y <= y < self.y + self.height
+
+
+class Canvas(NamedTuple):
+    """One planned mosaic: its tiles, an estimate of its encoded size, and the
+    items compose() could not draw."""
+
+    tiles: list
+    nbytes: int
+    failed: set
+
+
+def tile_size(content, max_tile: int):
+    """(width, height) as the image will be drawn, or None if it can't be tiled.
+
+    Only small single-frame images qualify; reading the header is enough.
+    """
+    try:
+        with Image.open(as_stream(content)) as img:
+            if getattr(img, "n_frames", 1) > 1:
+                return None
+            width, height = img.size
+            # Orientations 5-8 swap the axes once EXIF rotation is applied
+            if img.getexif().get(EXIF_ORIENTATION, 1) in (5, 6, 7, 8):
+                width, height = height, width
+    except Exception:
+        return None
+    if max(width, height) > max_tile:
+        return None
+    return width, height
+
+
+def plan(sizes: list, canvas: int, padding: int, max_tiles: int) -> list:
+    """Shelf-pack [(item, (width, height))] onto canvases of at most `canvas` px.
+
+    Images are placed tallest first in rows, with `padding` px of white
+    around each, so text from neighbouring tiles never touches. Returns one
+    list of Tiles per canvas.
+    """
+    canvases, tiles = [], []
+    x = y = padding
+    shelf = 0
+    for item, (width, height) in sorted(sizes, key=lambda s: -s[1][1]):
+        if x + width + padding > canvas:
+            x, y, shelf = padding, y + shelf + padding, 0
+        if tiles and (y + height + padding > canvas or len(tiles) >= max_tiles):
+            canvases.append(tiles)
+            tiles, x, y, shelf = [], padding, padding, 0
+        tiles.append(Tile(item, x, y, width, height))
+        x += width + padding
+        shelf = max(shelf, height)
+    if tiles:
+        canvases.append(tiles)
+    return canvases
+
+
+def compose(canvas: Canvas, contents, padding: int, quality: int = 90) -> bytes:
+    """Draw the tiles' images (contents[tile.item]) onto one white JPEG canvas.
+
+    A tile whose image fails to decode is left blank and added to
+    canvas.failed, so only that image reports an error.
+    """
+    tiles = canvas.tiles
+    size = (
+        max(t.x + t.width for t in tiles) + padding,
+        max(t.y + t.height for t in tiles) + padding,
+    )
+    image = Image.new("RGB", size, "white")
+    for tile in tiles:
+        try:
+            with Image.open(as_stream(contents[tile.item])) as img:
+                image.paste(flatten(ImageOps.exif_transpose(img)), (tile.x, tile.y))
+        except Exception:
+            canvas.failed.add(tile.item)
+    out = BytesIO()
+    image.save(out, format="JPEG", quality=quality)
+    return out.getvalue()
+
+
+def _local_box(tile: Tile, vertices) -> list:
+    return [[x - tile.x, y - tile.y] for x, y in vertices]
+
+
+def _union(boxes: list) -> list:
+    xs = [x for b in boxes for x, _ in b]
+    ys = [y for b in boxes for _, y in b]
+    left, top, right, bottom = min(xs), min(ys), max(xs), max(ys)
+    return [[left, top], [right, top], [right, bottom], [left, bottom]]
+
+
+def demux(annotation, tiles: list, level: str = "text") -> list:
+    """Split a mosaic's TextAnnotation back into one (confidence, text, items) per tile.
+
+    Each word goes to the tile containing the centre of its bounding box
+    (words in the padding are dropped), with coordinates made relative to
+    that tile. Blocks and paragraphs that Vision let run across tiles are
+    split per tile, with the union of their words' boxes.
+    """
+    pb = raw(annotation)
+    pieces = [[] for _ in tiles]
+    words_by_tile = [[] for _ in tiles]
+    items = [None if level == "text" else [] for _ in tiles]
+
+    def locate(vertices):
+        cx = sum(x for x, _ in vertices) / len(vertices)
+        cy = sum(y for _, y in vertices) / len(vertices)
+        for index, tile in enumerate(tiles):
+            if tile.contains(cx, cy):
+                return index
+        return None
+
+    for page_index, page in enumerate(pb.pages):
+        for block in page.blocks:
+            block_groups = {}
+            for paragraph in block.paragraphs:
+                groups = {}
+                for word in paragraph.words:
+                    vertices = box(word.bounding_box)
+                    index = locate(vertices) if vertices else None
+                    if index is None:
+                        continue
+                    groups.setdefault(index, []).append(word)
+                    block_groups.setdefault(index, []).append(word)
+                    words_by_tile[index].append(word.confidence)
+                    if level == "words":
+                        items[index].append(
+                            {
+                                "page": page_index,
+                                "text": word_text(word),
+                                "confidence": round(word.confidence, 4),
+                                "bounding_box": _local_box(tiles[index], vertices),
+                            }
+                        )
+                for index, words in groups.items():
+                    text = join_words(words)
+                    pieces[index].append(text)
+                    if level == "paragraphs":
+                        items[index].append(
+                            _group(page_index, tiles[index], text, words, paragraph.confidence)
+                        )
+            if level == "blocks":
+                for index, words in block_groups.items():
+                    items[index].append(
+                        _group(page_index, tiles[index], join_words(words), words, block.confidence)
+                    )
+
+    results = []
+    for index in range(len(tiles)):
+        confidences = [c for c in words_by_tile[index] if c]
+        confidence = round(sum(confidences) / len(confidences), 2) if confidences else 0.0
+        results.append((confidence, "\n".join(pieces[index]), items[index]))
+    return results
+
+
+def _group(page_index: int, tile: Tile, text: str, words: list, confidence: float) -> dict:
+    return {
+        "page": page_index,
+        "text": text,
+        "confidence": round(confidence, 4),
+        "bounding_box": _union([_local_box(tile, box(w.bounding_box)) for w in words]),
+    }
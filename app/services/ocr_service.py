@@ -1,16 +1,153 @@
-import time, re
-from io import BytesIO
-from PIL import Image
+import itertools, time, re
+from functools import lru_cache
+from concurrent.futures import FIRST_COMPLETED, Future, TimeoutError as WaitTimeout, wait
 from flask import current_app
-from google.cloud import vision
-from google.api_core.exceptions import GoogleAPIError
+from .cache import content_key
+from .preprocess import ImagePreprocessor
+from .preflight import Preflight, read_header, sniff
+from .frames import frame_count, iter_frames
+from .mosaic import Canvas, compose, demux, plan, tile_size
+from .phash import dhash
+from .layout import LEVELS, project, raw
+from .admission import PRIORITIES, Overloaded, Ticket, get_executor
+from .resilience import (
+    Deadline,
+    HedgePolicy,
+    RequestTimeout,
+    RetryPolicy,
+    get_latency_tracker,
+    hedged_result,
+    submit_with_retries,
+)
+from .singleflight import get_single_flight
+from ..utils import metrics
+from . import vision_client
+
+
+@lru_cache(maxsize=None)
+def document_text_feature():
+    # google.cloud.vision is imported on first use (or at gunicorn preload), not with the app
+    from google.cloud import vision
+
+    return vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)
+
+
+def pack_batches(sizes: list, max_images: int, max_bytes: int) -> list:
+    """Group image indices into batch_annotate_images requests.
+
+    Each chunk holds at most `max_images` images and `max_bytes` of image data;
+    an image larger than the byte budget travels alone.
+    """
+    chunks, current, current_bytes = [], [], 0
+    for index, size in enumerate(sizes):
+        if current and (
+            len(current) >= max_images or current_bytes + size > max_bytes
+        ):
+            chunks.append(current)
+            current, current_bytes = [], 0
+        current.append(index)
+        current_bytes += size
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def pack_stream(items, max_images: int, max_bytes: int, size=len):
+    """Streaming pack_batches: group (item, payload) pairs into lists as they arrive.
+
+    `size(payload)` is its byte count (e.g. a file's size for a path).
+    """
+    chunk, chunk_bytes = [], 0
+    for item, payload in items:
+        nbytes = size(payload)
+        if chunk and (len(chunk) >= max_images or chunk_bytes + nbytes > max_bytes):
+            yield chunk
+            chunk, chunk_bytes = [], 0
+        chunk.append((item, payload))
+        chunk_bytes += nbytes
+    if chunk:
+        yield chunk
+
+
+def batch_result(ocr, filename: str, content: bytes, result) -> dict:
+    """Shape one batch item: the OCR result plus metadata, or its error."""
+    if isinstance(result, Exception):
+        return {"filename": filename, "success": False, "error": str(result)}
+    result["metadata"] = ocr.extract_metadata(content)
+    ocr.index_result(content, filename, result)
+    return {"filename": filename, "success": True, **result}
+
+
+def vision_error(e: Exception) -> Exception:
+    """Map a failed Vision call to the error surfaced to the client."""
+    from google.api_core.exceptions import DeadlineExceeded, GoogleAPIError
+
+    if isinstance(e, (Overloaded, RequestTimeout)):
+        return e
+    if isinstance(e, DeadlineExceeded):
+        return RequestTimeout(f"Google Vision API timed out: {str(e)}")
+    if isinstance(e, GoogleAPIError):
+        return RuntimeError(f"Google Vision API error: {str(e)}")
+    return RuntimeError(f"OCR failed: {str(e)}")
 
 
 class OCRService:
-    def __init__(self):
-        if "GOOGLE_CREDENTIALS" not in current_app.config:
+    def __init__(
+        self,
+        deadline: Deadline = None,
+        level: str = "text",
+        config=None,
+        cache=None,
+        phash=None,
+        search=None,
+        priority: str = "batch",
+        client_key: str = "",
+    ):
+        """Inside a Flask app, config, cache, phash and search default to the app's.
+
+        Elsewhere (the bulk CLI) pass a config mapping, see Config.to_dict(),
+        and optionally an OCRCache, PerceptualIndex and SearchIndex.
+        `priority` and `client_key` (the API key) place its Vision calls in
+        the executor's queue.
+        """
+        if config is None:
+            config = current_app.config
+            cache = current_app.extensions.get("ocr_cache")
+            phash = current_app.extensions.get("ocr_phash")
+            search = current_app.extensions.get("ocr_search")
+        if "GOOGLE_CREDENTIALS" not in config:
             raise RuntimeError("Google credentials not configured")
-        self.client = vision.ImageAnnotatorClient()
+        if level not in LEVELS:
+            raise ValueError(f"Invalid level: {level}. Use one of: {', '.join(LEVELS)}")
+        if priority not in PRIORITIES:
+            raise ValueError(f"Invalid priority: {priority}. Use one of: {', '.join(PRIORITIES)}")
+        self.level = level
+        self.priority = priority
+        self.client_key = client_key
+        self.config = config
+        self.client = vision_client.get_client(config)
+        self.cache = cache
+        # Only useful on top of the cache it points into
+        self.phash = phash if cache is not None else None
+        self._pending_hashes = {}  # cache key -> dHash, indexed once Vision succeeds
+        self.search = search
+        self.preflight = Preflight.from_config(config)
+        self._headers = {}  # id(upload) -> (upload, read_header()) for the current call
+        self.preprocessor = ImagePreprocessor.from_config(config)
+        self.executor = get_executor(config)
+        # No deadline (e.g. background jobs) still bounds every attempt
+        self.deadline = deadline or Deadline()
+        self.attempt_timeout = float(self.config.get("VISION_ATTEMPT_TIMEOUT_SECONDS", 10))
+        self.retry = RetryPolicy.from_config(self.config)
+        self.latency = get_latency_tracker()
+        self.hedge = HedgePolicy.from_config(self.config, self.latency)
+        self.flights = get_single_flight()
+
+    def index_result(self, content: bytes, filename: str, result: dict):
+        """Queue a new result for /api/search; exact cache hits were indexed already."""
+        if self.search is None or result.get("cache") == "hit":
+            return
+        self.search.add(content_key(content), filename, result)
 
     def clean_text(self, text: str) -> str:
         """Normalize whitespace, remove artifacts."""
@@ -22,59 +159,564 @@ class OCRService:
         return text
 
     def extract_metadata(self, content: bytes) -> dict:
+        """Format, mode and size; reuses the pre-flight parse of the same upload."""
+        with metrics.stage("metadata"):
+            try:
+                header = self._header(content)
+            except ValueError:
+                return {}
+            return {name: header[name] for name in ("format", "mode", "width", "height")}
+
+    def _header(self, content) -> dict:
+        """read_header(content), parsed once per upload of the current call."""
+        seen = self._headers.get(id(content))
+        if seen is not None and seen[0] is content:
+            return seen[1]
+        with metrics.stage("preflight"):
+            header = read_header(content)
+        self._headers[id(content)] = (content, header)
+        return header
+
+    def _frames(self, content) -> int:
+        if self.preflight is None:
+            return frame_count(content)
+        return self._header(content)["frames"]
+
+    def _lookup(self, content, start_time: float):
+        """Pre-flight header check, then _cached_result().
+
+        Raises ValueError for an upload that is not a readable image, before
+        it can cost a Vision call.
+        """
+        if self.preflight is not None:
+            try:
+                self._header(content)
+            except ValueError:
+                reason = "unsupported" if sniff(content) is None else "corrupt"
+                metrics.PREFLIGHT_SKIPPED.labels(reason).inc()
+                raise
+        return self._cached_result(content, start_time)
+
+    def _blank_result(self, content, key, start_time: float):
+        """Empty result for a single-frame image with nothing on it, or None."""
+        if self.preflight is None or self._frames(content) > 1:
+            return None
+        with metrics.stage("preflight"):
+            blank = self.preflight.is_blank(content)
+        if not blank:
+            return None
+        metrics.PREFLIGHT_SKIPPED.labels("blank").inc()
+        value = {"text": "", "confidence": 0.0, "blank": True}
+        if self.level != "text":
+            value[self.level] = []
+        if key is not None:
+            self.cache.set(key, value)
+        return {
+            **value,
+            "processing_time_ms": int((time.perf_counter() - start_time) * 1000),
+            "cache": "miss" if key is not None else "disabled",
+        }
+
+    def perceptual_hash(self, content: bytes):
+        with metrics.stage("phash"):
+            return dhash(content)
+
+    def _key(self, content: bytes) -> str:
+        """Cache/coalescing key: the image hash, plus the level when layout is requested."""
+        digest = content_key(content)
+        return digest if self.level == "text" else f"{digest}:{self.level}"
+
+    def _cached_result(self, content: bytes, start_time: float):
+        """Return (cache key, cached result or None)."""
+        if self.cache is None:
+            return None, None
+        with metrics.stage("cache_lookup"):
+            key = self._key(content)
+            cached = self.cache.get(key)
+        if cached is not None:
+            cached["processing_time_ms"] = int((time.perf_counter() - start_time) * 1000)
+            cached["cache"] = "hit"
+        elif self.phash is not None:
+            cached = self._near_duplicate(content, key)
+            if cached is not None:
+                cached["processing_time_ms"] = int((time.perf_counter() - start_time) * 1000)
+        return key, cached
+
+    def _near_duplicate(self, content: bytes, key: str):
+        """Cached result of a perceptually identical image, or None.
+
+        On a miss the hash is kept so the image is indexed after its own
+        Vision call succeeds.
+        """
+        value = self.perceptual_hash(content)
+        match = self.phash.lookup(value)
+        if match is not None:
+            digest, distance = match
+            cached = self.cache.get(digest if self.level == "text" else f"{digest}:{self.level}")
+            if cached is not None:
+                metrics.PHASH_LOOKUPS.labels("near_hit").inc()
+                cached["cache"] = "near_hit"
+                cached["near_duplicate_distance"] = distance
+                return cached
+            # Indexed, but the result was evicted from the cache (or is another level)
+            metrics.PHASH_LOOKUPS.labels("stale").inc()
+        else:
+            metrics.PHASH_LOOKUPS.labels("miss").inc()
+        self._pending_hashes[key] = value
+        return None
+
+    def _prepare(self, content: bytes):
+        """Run the preprocessing pipeline; returns (bytes for Vision, stats or None)."""
+        if self.preprocessor is None:
+            return content, None
+        with metrics.stage("preprocess"):
+            return self.preprocessor.process(content)
+
+    def _parse_response(self, response, key, processing_time_ms: int) -> dict:
+        """Turn one AnnotateImageResponse into our result dict (and cache it)."""
+        if response.error.message:
+            raise RuntimeError(f"Vision API error: {response.error.message}")
+
+        annotation = response.full_text_annotation
+
+        # Clean up text
+        with metrics.stage("clean_text"):
+            text = self.clean_text(raw(annotation).text)
+
+        # One pass over the raw protobuf for confidence and the requested layout
+        with metrics.stage("confidence"):
+            confidence, items = project(annotation, self.level)
+
+        value = {"text": text, "confidence": confidence}
+        if items is not None:
+            value[self.level] = items
+
+        # Only successful annotations are cached; errors above always retry
+        if key is not None:
+            self.cache.set(key, value)
+            if key in self._pending_hashes:
+                self.phash.add(self._pending_hashes.pop(key), key.partition(":")[0])
+
+        return {
+            **value,
+            "processing_time_ms": processing_time_ms,
+            "cache": "miss" if key is not None else "disabled",
+        }
+
+    def _detect(self, payload: bytes):
+        """Single-image Vision RPC (runs on the Vision executor)."""
+        from google.cloud import vision
+
+        image = vision.Image(content=bytes(payload))
+        # Computed when the call starts, so time spent queued counts against the budget
+        timeout = self.deadline.timeout(self.attempt_timeout)
+        start = time.perf_counter()
+        with metrics.vision_call("document_text_detection"):
+            # retry=None: RetryPolicy is the only retry layer, inside the deadline
+            response = self.client.document_text_detection(
+                image=image, retry=None, timeout=timeout
+            )
+        self.latency.record(time.perf_counter() - start)
+        return response
+
+    def _submit(self, fn, *args, cost: int = 1) -> Future:
+        ticket = Ticket(self.priority, self.client_key, cost)
+        return submit_with_retries(self.executor, fn, args, self.deadline, self.retry, ticket)
+
+    def _extract_frames(self, content: bytes, key, start_time: float) -> dict:
+        """OCR every distinct frame of a GIF/TIFF/WebP and merge them into one document.
+
+        Frames are decoded one at a time (see iter_frames) and packed into
+        batch requests as they come, so only the frames of the chunks in
+        flight are held in memory.
+        """
+        stats = {}
+        frames = iter_frames(
+            content,
+            int(self.config.get("FRAMES_MAX", 100)),
+            int(self.config.get("PREPROCESS_MAX_DIMENSION", 2048)),
+            int(self.config.get("PREPROCESS_JPEG_QUALITY", 90)),
+            stats,
+        )
+        chunks = (
+            ([index for index, _ in chunk], [payload for _, payload in chunk], [None] * len(chunk))
+            for chunk in pack_stream(
+                frames,
+                int(self.config.get("VISION_BATCH_MAX_IMAGES", 16)),
+                int(self.config.get("VISION_BATCH_MAX_BYTES", 8 * 1024 * 1024)),
+            )
+        )
+
+        results = {}
+        with metrics.stage("frames"):
+            for index, result in self._iter_chunks(chunks, start_time):
+                results[index] = result
+
+        per_frame, errors = [], []
+        for index in sorted(results):
+            result = results[index]
+            if isinstance(result, Exception):
+                errors.append(result)
+                per_frame.append({"frame": index, "error": str(result)})
+            else:
+                frame = {"frame": index, "text": result["text"], "confidence": result["confidence"]}
+                if self.level in result:
+                    frame[self.level] = result[self.level]
+                per_frame.append(frame)
+        if errors and len(errors) == len(per_frame):
+            raise errors[0]
+
+        read = [f for f in per_frame if f.get("text")]
+        total_frames = self._frames(content)
+        document = {
+            "text": "\n".join(f["text"] for f in read),
+            "confidence": (
+                round(sum(f["confidence"] for f in read) / len(read), 2) if read else 0.0
+            ),
+            "frames": per_frame,
+            "frame_count": total_frames,
+            "duplicate_frames": stats["duplicates"],
+            "truncated": total_frames > int(self.config.get("FRAMES_MAX", 100)),
+        }
+        # A document with failed frames is not cached, so a retry can complete it
+        if key is not None and not errors:
+            self.cache.set(key, document)
+        return {
+            **document,
+            "processing_time_ms": int((time.perf_counter() - start_time) * 1000),
+            "cache": "miss" if key is not None else "disabled",
+        }
+
+    def _extract_uncached(self, content: bytes, key, start_time: float) -> dict:
+        """Preprocess, call Vision (with retries/hedging) and parse one image."""
+        if self._frames(content) > 1:
+            return self._extract_frames(content, key, start_time)
+        blank = self._blank_result(content, key, start_time)
+        if blank is not None:
+            return blank
+
+        payload, preprocessing = self._prepare(content)
+
+        delay = self.hedge.delay() if self.hedge is not None else None
         try:
-            with Image.open(BytesIO(content)) as img:
-                return {
-                    "format": img.format,
-                    "mode": img.mode,
-                    "width": img.width,
-                    "height": img.height,
-                }
-        except Exception:
-            return {}
+            response = hedged_result(
+                lambda: self._submit(self._detect, payload), delay, self.deadline
+            )
+        except Exception as e:
+            raise vision_error(e)
+
+        processing_time_ms = int((time.perf_counter() - start_time) * 1000)
+        result = self._parse_response(response, key, processing_time_ms)
+        if preprocessing is not None:
+            result["preprocessing"] = preprocessing
+        return result
 
     def extract_text(self, content: bytes) -> dict:
         """Extract text from image bytes with robust error handling."""
-        start_time = time.time()
+        start_time = time.perf_counter()
 
         if not content or len(content) == 0:
             raise ValueError("Uploaded file is empty or unreadable.")
 
+        self._headers.clear()
+        key, cached = self._lookup(content, start_time)
+        if cached is not None:
+            return cached
+
+        # Identical uploads already in flight in this worker share one Vision call
+        flight_key = key or self._key(content)
+        while True:
+            future, leader = self.flights.begin(flight_key)
+            if leader:
+                self.flights.run(
+                    flight_key,
+                    future,
+                    lambda: self._extract_uncached(content, key, start_time),
+                )
+            try:
+                result = future.result(self.deadline.wait_timeout())
+                break
+            except WaitTimeout:
+                raise RequestTimeout("Request deadline exceeded waiting for Vision")
+            except RequestTimeout:
+                # The leader ran out of its own budget; a waiter with time left tries itself
+                if leader or self.deadline.expired:
+                    raise
+
+        if leader:
+            return result
+        result = dict(result)
+        result["processing_time_ms"] = int((time.perf_counter() - start_time) * 1000)
+        return result
+
+    def _annotate_chunk(self, contents: list):
+        """Preprocess and send one batch_annotate_images RPC (runs on the Vision executor)."""
+        from google.cloud import vision
+
+        prepared = [self._prepare(content) for content in contents]
+        requests = [
+            vision.AnnotateImageRequest(
+                image=vision.Image(content=bytes(payload)), features=[document_text_feature()]
+            )
+            for payload, _ in prepared
+        ]
+        timeout = self.deadline.timeout(self.attempt_timeout)
+        with metrics.vision_call("batch_annotate_images", len(requests)):
+            response = self.client.batch_annotate_images(
+                requests=requests, retry=None, timeout=timeout
+            )
+        return response, [stats for _, stats in prepared]
+
+    def _chunk_results(self, future, keys: list, start_time: float) -> list:
+        """Map a finished chunk to a result dict or exception per image."""
         try:
-            image = vision.Image(content=content)
-            response = self.client.document_text_detection(image=image)
-        except GoogleAPIError as e:
-            raise RuntimeError(f"Google Vision API error: {str(e)}")
+            response, preprocessing = future.result()
         except Exception as e:
-            raise RuntimeError(f"OCR failed: {str(e)}")
+            return [vision_error(e)] * len(keys)
+        return self._parse_chunk(response, preprocessing, keys, start_time)
+
+    def _parse_chunk(self, response, preprocessing: list, keys: list, start_time: float) -> list:
+        """Parse one BatchAnnotateImagesResponse; a bad image fails alone."""
+        processing_time_ms = int((time.perf_counter() - start_time) * 1000)
+        results = []
+        for i, key in enumerate(keys):
+            try:
+                if i >= len(response.responses):
+                    raise RuntimeError("Vision API returned no response for image")
+                if isinstance(key, Canvas):
+                    results.append(
+                        self._parse_mosaic(response.responses[i], key, processing_time_ms)
+                    )
+                    continue
+                result = self._parse_response(
+                    response.responses[i], key, processing_time_ms
+                )
+                if preprocessing[i] is not None:
+                    result["preprocessing"] = preprocessing[i]
+                results.append(result)
+            except Exception as e:
+                results.append(e)
+        return results
 
-        processing_time_ms = int((time.time() - start_time) * 1000)
+    def _parse_mosaic(self, response, canvas: Canvas, processing_time_ms: int) -> list:
+        """Demultiplex one mosaic response into a result dict per tile.
 
+        Tile results are not cached: Vision read them next to other images,
+        and a later single upload of the same bytes should get its own call.
+        """
         if response.error.message:
             raise RuntimeError(f"Vision API error: {response.error.message}")
+        results = []
+        tiles = demux(response.full_text_annotation, canvas.tiles, self.level)
+        for tile, (confidence, text, items) in zip(canvas.tiles, tiles):
+            if tile.item in canvas.failed:
+                results.append(ValueError("Uploaded file is empty or unreadable."))
+                continue
+            result = {"text": self.clean_text(text), "confidence": confidence}
+            if items is not None:
+                result[self.level] = items
+            results.append(
+                {**result, "processing_time_ms": processing_time_ms, "cache": "miss", "mosaic": True}
+            )
+        return results
 
-        text = (
-            response.full_text_annotation.text
-            if response.full_text_annotation.text
-            else ""
+    def _plan_mosaics(self, contents: list, candidates: list):
+        """Split (index, key) candidates into mosaic Canvases and the images left over.
+
+        Only images no larger than MOSAIC_MAX_TILE_DIMENSION qualify; a canvas
+        that would hold a single tile is sent as a plain image instead.
+        """
+        padding = int(self.config.get("MOSAIC_PADDING", 48))
+        # The canvas must never be downscaled by preprocessing, or the boxes would move
+        side = min(
+            int(self.config.get("MOSAIC_CANVAS_DIMENSION", 2048)),
+            int(self.config.get("PREPROCESS_MAX_DIMENSION", 2048)),
         )
+        max_tile = min(int(self.config.get("MOSAIC_MAX_TILE_DIMENSION", 640)), side - 2 * padding)
+        sizes, rest = [], []
+        for index, key in candidates:
+            size = tile_size(contents[index], max_tile)
+            if size is None:
+                rest.append((index, key))
+            else:
+                sizes.append((index, size))
+        keys = dict(candidates)
+        canvases = []
+        for tiles in plan(sizes, side, padding, int(self.config.get("MOSAIC_MAX_TILES", 64))):
+            if len(tiles) == 1:
+                rest.append((tiles[0].item, keys[tiles[0].item]))
+            else:
+                canvases.append(Canvas(tiles, sum(len(contents[t.item]) for t in tiles), set()))
+        return canvases, rest
 
-        # Clean up text
-        text = self.clean_text(text)
+    def _iter_chunks(self, chunks, start_time: float):
+        """Run (items, payloads, cache keys) chunks on the Vision executor.
 
-        total_conf, count = 0.0, 0
-        for page in response.full_text_annotation.pages:
-            for block in page.blocks:
-                for paragraph in block.paragraphs:
-                    for word in paragraph.words:
-                        if word.confidence:
-                            total_conf += word.confidence
-                            count += 1
+        Chunks are pulled from the iterable lazily and at most
+        VISION_BATCH_PARALLEL_CHUNKS are in flight, so a streaming source is
+        never materialized. Yields (item, result or exception) per image.
+        Overloaded is raised only if the executor refuses the very first
+        chunk, i.e. before any Vision work was accepted.
+        """
+        chunks = iter(chunks)
+        parallel = max(1, int(self.config.get("VISION_BATCH_PARALLEL_CHUNKS", 4)))
+        futures = {}
+        accepted = exhausted = False
 
-        confidence = round(total_conf / count, 2) if count > 0 else 0.0
+        while not exhausted or futures:
+            while not exhausted and len(futures) < parallel:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    exhausted = True
+                    break
+                items, payloads, keys = chunk
+                try:
+                    future = self._submit(self._annotate_chunk, payloads, cost=len(payloads))
+                    accepted = True
+                except Overloaded as e:
+                    if not accepted:
+                        raise
+                    future = Future()
+                    future.set_exception(e)
+                futures[future] = (items, keys)
+            if not futures:
+                break
 
-        return {
-            "text": text,
-            "confidence": confidence,
-            "processing_time_ms": processing_time_ms,
-        }
+            done, _ = wait(
+                futures, timeout=self.deadline.wait_timeout(), return_when=FIRST_COMPLETED
+            )
+            if not done:
+                # Out of budget: chunks still queued give up their place
+                error = RequestTimeout("Request deadline exceeded waiting for Vision")
+                for future, (items, _) in futures.items():
+                    future.cancel()
+                    for item in items:
+                        yield item, error
+                return
+            for future in done:
+                items, keys = futures.pop(future)
+                for item, result in zip(items, self._chunk_results(future, keys, start_time)):
+                    yield item, result
+
+    def _plan_batch(self, contents: list, mosaic: bool, start_time: float):
+        """Sort a batch into results known now and the Vision work left to do.
+
+        Returns (ready, batches, multi_frame, duplicates): (index, result)
+        pairs for empty, unreadable, blank and cached images, the packed batch
+        requests as lists of (item, cache key) where an item is an image index
+        or a mosaic Canvas, the (index, key) of multi-frame images, and the
+        indices repeating an earlier image of the batch, by that image's index.
+        """
+        ready, pending, multi_frame = [], [], []
+        # Repeats of an image in this batch wait for its first copy's result
+        first_by_digest, duplicates = {}, {}
+        for index, content in enumerate(contents):
+            if not content:
+                ready.append((index, ValueError("Uploaded file is empty or unreadable.")))
+                continue
+            try:
+                key, cached = self._lookup(content, start_time)
+            except ValueError as e:
+                ready.append((index, e))
+                continue
+            if cached is None:
+                cached = self._blank_result(content, key, start_time)
+            if cached is not None:
+                ready.append((index, cached))
+                continue
+            digest = key or self._key(content)
+            if digest in first_by_digest:
+                duplicates.setdefault(first_by_digest[digest], []).append(index)
+                metrics.OCR_COALESCED.labels("batch").inc()
+                continue
+            first_by_digest[digest] = index
+            if self._frames(content) > 1:
+                multi_frame.append((index, key))
+            else:
+                pending.append((index, key))
+
+        canvases = []
+        if mosaic:
+            with metrics.stage("mosaic_plan"):
+                canvases, pending = self._plan_mosaics(contents, pending)
+
+        # Canvases are packed alongside plain images and cost one Vision unit each
+        units = [(index, key, len(contents[index])) for index, key in pending]
+        units += [(canvas, canvas, canvas.nbytes) for canvas in canvases]
+        batches = [
+            [units[i][:2] for i in chunk]
+            for chunk in pack_batches(
+                [nbytes for _, _, nbytes in units],
+                int(self.config.get("VISION_BATCH_MAX_IMAGES", 16)),
+                int(self.config.get("VISION_BATCH_MAX_BYTES", 8 * 1024 * 1024)),
+            )
+        ]
+        return ready, batches, multi_frame, duplicates
+
+    def _payload(self, item, contents: list):
+        """Image bytes for Vision; canvases are drawn only when their chunk is sent."""
+        if not isinstance(item, Canvas):
+            return contents[item]
+        with metrics.stage("mosaic_compose"):
+            return compose(
+                item,
+                contents,
+                int(self.config.get("MOSAIC_PADDING", 48)),
+                int(self.config.get("PREPROCESS_JPEG_QUALITY", 90)),
+            )
+
+    def _unpack(self, item, result, duplicates: dict):
+        """Yield (index, result) for a finished item: each tile of a canvas, then repeats."""
+        if isinstance(item, Canvas):
+            pairs = [
+                (tile.item, result if isinstance(result, Exception) else result[i])
+                for i, tile in enumerate(item.tiles)
+            ]
+        else:
+            pairs = [(item, result)]
+        for index, result in pairs:
+            yield index, result
+            for duplicate in duplicates.get(index, ()):
+                yield duplicate, result if isinstance(result, Exception) else dict(result)
+
+    def iter_extract_text_batch(self, contents: list, mosaic: bool = False):
+        """Yield (index, result) for each image as its batch RPC completes.
+
+        Images are packed into batch_annotate_images requests (see pack_batches)
+        and sent through _iter_chunks. A result is either the usual
+        extract_text dict or the exception that image failed with, so one bad
+        image never fails its neighbours. Multi-frame images are split and
+        OCR'd frame by frame after the packed ones. With `mosaic`, small
+        images are tiled onto shared canvases (see app.services.mosaic) so
+        several of them cost one Vision image.
+        """
+        start_time = time.perf_counter()
+        self._headers.clear()
+        ready, batches, multi_frame, duplicates = self._plan_batch(contents, mosaic, start_time)
+        yield from ready
+
+        chunks = (
+            (
+                [item for item, _ in batch],
+                [self._payload(item, contents) for item, _ in batch],
+                [key for _, key in batch],
+            )
+            for batch in batches
+        )
+
+        def documents():
+            for index, key in multi_frame:
+                try:
+                    yield index, self._extract_frames(contents[index], key, start_time)
+                except Exception as e:
+                    yield index, e
+
+        for item, result in itertools.chain(self._iter_chunks(chunks, start_time), documents()):
+            yield from self._unpack(item, result, duplicates)
+
+    def extract_text_batch(self, contents: list, mosaic: bool = False) -> list:
+        """Batch variant of extract_text; results are returned in input order."""
+        results = [None] * len(contents)
+        for index, result in self.iter_extract_text_batch(contents, mosaic):
+            results[index] = result
+        return results
@@ -0,0 +1,212 @@
+import os, sqlite3, threading, time
+from array import array
+from collections import OrderedDict
+from itertools import combinations
+from PIL import Image
+from .preprocess import flatten
+from ..utils.file_utils import as_stream
+
+HASH_SIDE = 16  # 16x16 gradient bits -> 256-bit hash
+HASH_BITS = HASH_SIDE * HASH_SIDE
+MAX_CHUNKS = 16  # substrings are kept at least 16 bits wide
+
+
+def dhash(content) -> int:
+    """256-bit difference hash of an image (None if Pillow can't read it).
+
+    The image is reduced to 17x16 grayscale and each bit records whether a
+    pixel is brighter than its right neighbour, so the hash survives
+    resizing, recompression and JPEG<->PNG re-saves of the same document.
+    """
+    try:
+        with Image.open(as_stream(content)) as img:
+            if getattr(img, "n_frames", 1) > 1:
+                return None
+            # JPEGs decode straight at 1/8 scale; only the coarse shape matters
+            img.draft("L", (HASH_SIDE * 8, HASH_SIDE * 8))
+            small = flatten(img, "L").resize((HASH_SIDE + 1, HASH_SIDE), Image.BOX)
+    except Exception:
+        return None
+    pixels = small.tobytes()
+    value = 0
+    for row in range(HASH_SIDE):
+        offset = row * (HASH_SIDE + 1)
+        for col in range(HASH_SIDE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def spans(count: int) -> list:
+    """(shift, mask) of `count` near-equal substrings covering the hash."""
+    bounds = [round(i * HASH_BITS / count) for i in range(count + 1)]
+    return [(lo, (1 << (hi - lo)) - 1) for lo, hi in zip(bounds, bounds[1:])]
+
+
+def neighbours(chunk: int, width: int, radius: int):
+    """All `width`-bit values within `radius` bit flips of `chunk`."""
+    for flips in range(radius + 1):
+        for bits in combinations(range(width), flips):
+            yield chunk ^ sum(1 << bit for bit in bits)
+
+
+class PerceptualIndex:
+    """Near-duplicate index of image hashes -> OCR cache digests.
+
+    Lookups use multi-index hashing: the 256-bit hash is split into m
+    substrings, each with its own table. Two hashes within distance r share
+    at least one substring within r // m bits (pigeonhole), so only those
+    table buckets are probed and candidates are verified with popcount,
+    instead of scanning every entry. m is r + 1 (capped at 16), so
+    thresholds below 16 need exact substring matches only. Entries are evicted LRU beyond
+    `max_entries` and, with `path`, persisted to SQLite so they survive
+    restarts (each worker loads the file at startup).
+    """
+
+    # Almost-uniform images (blank pages, solid fills) hash to nearly all 0s
+    # or 1s and would "match" each other; they are never indexed or matched
+    MIN_BITS = 16
+
+    def __init__(self, max_distance: int = 15, max_entries: int = 100000, path: str = ""):
+        self.max_distance = max_distance
+        count = max(1, min(max_distance + 1, MAX_CHUNKS))
+        self.radius = max_distance // count
+        self._spans = spans(count)
+        self.max_entries = max_entries
+        self.path = path
+        self._tables = [{} for _ in self._spans]
+        self._entries = OrderedDict()  # id -> (hash, digest), in LRU order
+        self._ids = {}  # digest -> id
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if path:
+            self._load()
+
+    @classmethod
+    def from_config(cls, config):
+        if not config.get("PHASH_ENABLED", False):
+            return None
+        return cls(
+            int(config.get("PHASH_MAX_DISTANCE", 15)),
+            int(config.get("PHASH_MAX_ENTRIES", 100000)),
+            config.get("PHASH_DB_PATH", ""),
+        )
+
+    @classmethod
+    def indexable(cls, value) -> bool:
+        return value is not None and cls.MIN_BITS <= value.bit_count() <= HASH_BITS - cls.MIN_BITS
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, value: int):
+        """(digest, distance) of the nearest entry within max_distance, or None."""
+        if not self.indexable(value):
+            return None
+        best = None
+        with self._lock:
+            seen = set()
+            for table, (shift, mask) in zip(self._tables, self._spans):
+                for probe in neighbours((value >> shift) & mask, mask.bit_length(), self.radius):
+                    bucket = table.get(probe)
+                    if not bucket:
+                        continue
+                    for entry_id in bucket:
+                        if entry_id in seen:
+                            continue
+                        seen.add(entry_id)
+                        distance = (self._entries[entry_id][0] ^ value).bit_count()
+                        if distance <= self.max_distance and (best is None or distance < best[1]):
+                            best = (entry_id, distance)
+            if best is None:
+                return None
+            entry_id, distance = best
+            self._entries.move_to_end(entry_id)
+            digest = self._entries[entry_id][1]
+        self._persist_touch(digest)
+        return digest, distance
+
+    def add(self, value: int, digest: str):
+        if not self.indexable(value):
+            return
+        with self._lock:
+            self._insert(value, digest)
+            self._evict()
+        self._persist_add(value, digest)
+
+    def _insert(self, value: int, digest: str):
+        if digest in self._ids:
+            self._remove(self._ids[digest])
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = (value, digest)
+        self._ids[digest] = entry_id
+        for table, (shift, mask) in zip(self._tables, self._spans):
+            table.setdefault((value >> shift) & mask, array("I")).append(entry_id)
+
+    def _remove(self, entry_id: int):
+        value, digest = self._entries.pop(entry_id)
+        del self._ids[digest]
+        for table, (shift, mask) in zip(self._tables, self._spans):
+            chunk = (value >> shift) & mask
+            bucket = table[chunk]
+            bucket.remove(entry_id)
+            if not bucket:
+                del table[chunk]
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    # -- persistence (best effort, like the SQLite cache tier) --
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _load(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS phash ("
+            "digest TEXT PRIMARY KEY, hash BLOB NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS phash_accessed ON phash (accessed_at)")
+        # Workers evict independently, so the file is trimmed here, not per eviction
+        conn.execute(
+            "DELETE FROM phash WHERE digest NOT IN ("
+            "SELECT digest FROM phash ORDER BY accessed_at DESC LIMIT ?)",
+            (self.max_entries,),
+        )
+        rows = conn.execute("SELECT hash, digest FROM phash ORDER BY accessed_at")
+        with self._lock:
+            for blob, digest in rows:
+                self._insert(int.from_bytes(blob, "big"), digest)
+
+    def _persist_add(self, value: int, digest: str):
+        if not self.path:
+            return
+        try:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO phash (digest, hash, accessed_at) VALUES (?, ?, ?)",
+                (digest, value.to_bytes(HASH_BITS // 8, "big"), time.time()),
+            )
+        except sqlite3.Error:
+            pass
+
+    def _persist_touch(self, digest: str):
+        if not self.path:
+            return
+        try:
+            self._connect().execute(
+                "UPDATE phash SET accessed_at = ? WHERE digest = ?", (time.time(), digest)
+            )
+        except sqlite3.Error:
+            pass
@@ -0,0 +1,109 @@
+from PIL import Image, ImageFilter, ImageStat
+from .frames import MULTI_FRAME_FORMATS
+from .preprocess import flatten
+from ..utils.file_utils import as_stream
+
+# Leading bytes of the image formats Vision reads; WebP is RIFF....WEBP
+SIGNATURES = (
+    (b"\xff\xd8\xff", "JPEG"),
+    (b"\x89PNG\r\n\x1a\n", "PNG"),
+    (b"GIF87a", "GIF"),
+    (b"GIF89a", "GIF"),
+    (b"II*\x00", "TIFF"),
+    (b"MM\x00*", "TIFF"),
+    (b"BM", "BMP"),
+    (b"\x00\x00\x01\x00", "ICO"),
+)
+# Pillow plugins that may claim each sniffed format (a JPEG can open as MPO)
+PLUGINS = {"JPEG": ["JPEG", "MPO"]}
+
+# A pixel of the edge map brighter than this is part of a stroke, not noise
+EDGE_LEVEL = 32
+
+
+def sniff(content) -> str:
+    """Image format from the magic bytes alone, or None if it isn't one Vision reads."""
+    head = bytes(content[:12])
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "WEBP"
+    for magic, fmt in SIGNATURES:
+        if head.startswith(magic):
+            return fmt
+    return None
+
+
+def read_header(content) -> dict:
+    """Format, mode, size and frame count, parsed from the header without decoding pixels.
+
+    Raises ValueError for content that is not a supported image, whatever
+    its filename says, and for files whose header is corrupt or truncated.
+    """
+    fmt = sniff(content)
+    if fmt is None:
+        raise ValueError(
+            "Uploaded file is not a supported image (JPEG, PNG, GIF, WebP, TIFF, BMP)."
+        )
+    try:
+        with Image.open(as_stream(content), formats=PLUGINS.get(fmt, [fmt])) as img:
+            header = {
+                "format": img.format,
+                "mode": img.mode,
+                "width": img.width,
+                "height": img.height,
+                "frames": 1,
+            }
+            if img.format in MULTI_FRAME_FORMATS:
+                header["frames"] = getattr(img, "n_frames", 1)
+            return header
+    except Exception:
+        raise ValueError(f"Uploaded {fmt} image is corrupt or truncated.")
+
+
+class Preflight:
+    """Cheap checks that spare Vision calls which cannot return any text.
+
+    The header check (read_header) rejects non-images and corrupt files.
+    is_blank() decodes only a small grayscale thumbnail (JPEGs straight at
+    reduced scale via draft mode) and calls the image blank when its pixel
+    standard deviation and its share of edge pixels are both below the
+    thresholds: an empty scan or a solid fill has neither, while even one
+    short line of text leaves strokes in the edge map.
+    """
+
+    def __init__(
+        self, sample_size: int = 256, max_stddev: float = 6.0, max_edge_ratio: float = 0.001
+    ):
+        self.sample_size = sample_size
+        self.max_stddev = max_stddev
+        self.max_edge_ratio = max_edge_ratio
+
+    @classmethod
+    def from_config(cls, config):
+        if not config.get("PREFLIGHT_ENABLED", True):
+            return None
+        return cls(
+            int(config.get("PREFLIGHT_SAMPLE_SIZE", 256)),
+            float(config.get("PREFLIGHT_BLANK_MAX_STDDEV", 6.0)),
+            float(config.get("PREFLIGHT_BLANK_MAX_EDGE_RATIO", 0.001)),
+        )
+
+    def scores(self, content) -> tuple:
+        """(standard deviation, share of edge pixels) of the downsampled grayscale image."""
+        with Image.open(as_stream(content)) as img:
+            img.draft("L", (self.sample_size, self.sample_size))
+            img.thumbnail((self.sample_size, self.sample_size))
+            gray = flatten(img, "L")
+        stddev = ImageStat.Stat(gray).stddev[0]
+        # The filter copies the border through unchanged; only the inside is an edge map
+        inside = gray.filter(ImageFilter.FIND_EDGES).crop((1, 1, gray.width - 1, gray.height - 1))
+        histogram = inside.histogram()
+        edges = sum(histogram[EDGE_LEVEL:]) / max(1, inside.width * inside.height)
+        return stddev, edges
+
+    def is_blank(self, content) -> bool:
+        try:
+            stddev, edges = self.scores(content)
+        except Exception:
+            # Unreadable pixels are for Vision to judge, not a reason to skip it
+            return False
+        return stddev < self.max_stddev and edges < self.max_edge_ratio
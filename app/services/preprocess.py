@@ -0,0 +1,111 @@
+from io import BytesIO
+from PIL import Image, ImageOps
+from ..utils.file_utils import as_stream
+
+EXIF_ORIENTATION = 0x0112
+
+
+def flatten(img: Image.Image, mode: str = "RGB") -> Image.Image:
+    """Convert to `mode`, compositing any transparency onto white first."""
+    if img.mode in ("RGBA", "LA", "P"):
+        # Flatten transparency onto white so dark text stays legible
+        rgba = img.convert("RGBA")
+        background = Image.new("RGBA", rgba.size, (255, 255, 255, 255))
+        img = Image.alpha_composite(background, rgba)
+    return img.convert(mode)
+
+
+class ImagePreprocessor:
+    """Shrink uploads before they are sent to Vision.
+
+    Large images are downscaled to `max_dimension` (JPEGs are decoded straight
+    at reduced scale via draft mode), EXIF rotation is applied to the pixels,
+    and the result is re-encoded as JPEG. Images that need none of this are
+    passed through untouched, and so is any output that would be larger than
+    the original.
+    """
+
+    def __init__(
+        self,
+        max_dimension: int = 2048,
+        grayscale: bool = False,
+        quality: int = 90,
+        fix_orientation: bool = True,
+    ):
+        self.max_dimension = max_dimension
+        self.grayscale = grayscale
+        self.quality = quality
+        self.fix_orientation = fix_orientation
+
+    @classmethod
+    def from_config(cls, config):
+        if not config.get("PREPROCESS_ENABLED", True):
+            return None
+        return cls(
+            int(config.get("PREPROCESS_MAX_DIMENSION", 2048)),
+            bool(config.get("PREPROCESS_GRAYSCALE", False)),
+            int(config.get("PREPROCESS_JPEG_QUALITY", 90)),
+            bool(config.get("PREPROCESS_FIX_ORIENTATION", True)),
+        )
+
+    def process(self, content: bytes):
+        """Return (bytes to send to Vision, stats dict)."""
+        stats = {
+            "original_bytes": len(content),
+            "optimized_bytes": len(content),
+            "bytes_saved": 0,
+            "applied": [],
+        }
+        try:
+            with Image.open(as_stream(content)) as img:
+                optimized = self._optimize(img, stats["applied"])
+        except Exception:
+            # Unreadable here doesn't mean unreadable for Vision; send as-is
+            return content, stats
+
+        if optimized is None or len(optimized) >= len(content):
+            stats["applied"] = []
+            return content, stats
+
+        stats["optimized_bytes"] = len(optimized)
+        stats["bytes_saved"] = len(content) - len(optimized)
+        return optimized, stats
+
+    def _optimize(self, img: Image.Image, applied: list):
+        # Animated/multi-page images would lose frames when re-encoded
+        if getattr(img, "n_frames", 1) > 1:
+            return None
+
+        orientation = img.getexif().get(EXIF_ORIENTATION, 1)
+        rotate = self.fix_orientation and orientation not in (1, None)
+        resize = max(img.size) > self.max_dimension
+        gray = self.grayscale and img.mode not in ("L", "1")
+        if not (rotate or resize or gray):
+            return None
+
+        target_mode = "L" if self.grayscale else "RGB"
+        if resize:
+            scale = self.max_dimension / max(img.size)
+            target = (int(img.width * scale), int(img.height * scale))
+            if img.format == "JPEG":
+                # Let libjpeg decode at 1/2, 1/4 or 1/8 scale instead of full size
+                img.draft(target_mode, target)
+                applied.append("draft")
+
+        if rotate:
+            img = ImageOps.exif_transpose(img)
+            applied.append("orientation")
+
+        img = flatten(img, target_mode)
+        if gray:
+            applied.append("grayscale")
+
+        if max(img.size) > self.max_dimension:
+            img.thumbnail((self.max_dimension, self.max_dimension), Image.LANCZOS)
+        if resize:
+            applied.append("downscale")
+
+        out = BytesIO()
+        img.save(out, format="JPEG", quality=self.quality)
+        applied.append("jpeg")
+        return out.getvalue()
@@ -0,0 +1,203 @@
+import hashlib, os, sqlite3, tempfile, threading, time, urllib.parse, uuid
+from flask import request
+from flask_limiter.util import get_remote_address
+from limits.storage import Storage
+
+
+def client_key() -> str:
+    """Rate-limit identity: the X-API-Key header, else the client address."""
+    api_key = request.headers.get("X-API-Key")
+    return f"key:{TokenBucketQuota.bucket_key(api_key)}" if api_key else get_remote_address()
+
+
+def default_shared_path(name: str) -> str:
+    """Prefer tmpfs (/dev/shm) so the shared file never touches a real disk."""
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, name)
+
+
+class _SQLiteConnections:
+    """One sqlite3 connection per thread (and per forked process)."""
+
+    def __init__(self, database: str, uri: bool = False):
+        self.database = database
+        self.uri = uri
+        self._local = threading.local()
+
+    def get(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(
+                self.database, timeout=5, isolation_level=None, uri=self.uri
+            )
+            if not self.uri:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+
+class SQLiteStorage(Storage):
+    """Flask-Limiter / `limits` storage in a local SQLite file.
+
+    Every gunicorn worker on the node opens the same file, so a limit of
+    "5 per minute" means 5 per instance rather than 5 per worker. Registered
+    for ``sqlite:///path/to/file.sqlite3`` storage URIs (fixed-window strategy).
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri: str = None, wrap_exceptions: bool = False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        path = urllib.parse.urlparse(uri).path if uri else ""
+        self.path = path or default_shared_path("ocr_ratelimit.sqlite3")
+        self._connections = _SQLiteConnections(self.path)
+        self._connections.get().execute(
+            "CREATE TABLE IF NOT EXISTS counters ("
+            "key TEXT PRIMARY KEY, value INTEGER NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        now = time.time()
+        conn = self._connections.get()
+        # Upsert that restarts the window once the previous one has expired
+        row = conn.execute(
+            "INSERT INTO counters (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET "
+            "value = CASE WHEN expires_at <= ? THEN excluded.value ELSE value + excluded.value END, "
+            "expires_at = CASE WHEN expires_at <= ? THEN excluded.expires_at ELSE expires_at END "
+            "RETURNING value",
+            (key, amount, now + expiry, now, now),
+        ).fetchone()
+        return row[0]
+
+    def get(self, key: str) -> int:
+        row = self._connections.get().execute(
+            "SELECT value FROM counters WHERE key = ? AND expires_at > ?",
+            (key, time.time()),
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key: str) -> float:
+        row = self._connections.get().execute(
+            "SELECT expires_at FROM counters WHERE key = ? AND expires_at > ?",
+            (key, time.time()),
+        ).fetchone()
+        return row[0] if row else time.time()
+
+    def check(self) -> bool:
+        try:
+            self._connections.get().execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> int:
+        return self._connections.get().execute("DELETE FROM counters").rowcount
+
+    def clear(self, key: str) -> None:
+        self._connections.get().execute("DELETE FROM counters WHERE key = ?", (key,))
+
+
+class QuotaExceeded(Exception):
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucketQuota:
+    """Per-API-key token buckets for images and bytes, shared through SQLite.
+
+    Each key has two buckets that refill continuously: `images_per_minute`
+    and `bytes_per_minute`, with bursts up to one minute's worth. A request
+    costs (image count, upload bytes) and is admitted only if both buckets
+    can pay; the check and the debit happen in one transaction, so workers
+    racing on the same key can't overspend.
+    """
+
+    def __init__(self, path: str, images_per_minute: float, bytes_per_minute: float):
+        if path:
+            self._connections = _SQLiteConnections(path)
+        else:
+            # Private in-memory database shared by this process's threads
+            name = f"file:ocr-quota-{uuid.uuid4().hex}?mode=memory&cache=shared"
+            self._connections = _SQLiteConnections(name, uri=True)
+            self._keepalive = self._connections.get()
+        self.capacity = {"images": float(images_per_minute), "bytes": float(bytes_per_minute)}
+        # Threads of this process take turns (a shared-cache memory database
+        # fails with "table is locked" rather than waiting); other workers
+        # wait on SQLite's own lock
+        self._lock = threading.Lock()
+        self._connections.get().execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            "key TEXT NOT NULL, kind TEXT NOT NULL, tokens REAL NOT NULL, "
+            "updated_at REAL NOT NULL, PRIMARY KEY (key, kind))"
+        )
+
+    @classmethod
+    def from_config(cls, config):
+        if not config.get("QUOTA_ENABLED", True):
+            return None
+        return cls(
+            config.get("QUOTA_DB_PATH", ""),
+            float(config.get("QUOTA_IMAGES_PER_MINUTE", 120)),
+            float(config.get("QUOTA_BYTES_PER_MINUTE", 200 * 1024 * 1024)),
+        )
+
+    @staticmethod
+    def bucket_key(api_key: str) -> str:
+        # API keys are secrets; only their digest is written to the shared file
+        return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:32]
+
+    def consume(self, api_key: str, images: int, nbytes: int) -> dict:
+        """Debit both buckets or raise QuotaExceeded; returns remaining tokens."""
+        key = self.bucket_key(api_key)
+        # A request larger than a whole bucket is charged (and judged) as a full bucket
+        cost = {
+            "images": min(float(images), self.capacity["images"]),
+            "bytes": min(float(nbytes), self.capacity["bytes"]),
+        }
+        with self._lock:
+            now = time.time()
+            conn = self._connections.get()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = {
+                    kind: (tokens, updated_at)
+                    for kind, tokens, updated_at in conn.execute(
+                        "SELECT kind, tokens, updated_at FROM buckets WHERE key = ?", (key,)
+                    )
+                }
+                available, wait = {}, 0.0
+                for kind, capacity in self.capacity.items():
+                    tokens, updated_at = rows.get(kind, (capacity, now))
+                    rate = capacity / 60.0
+                    tokens = min(capacity, tokens + (now - updated_at) * rate)
+                    available[kind] = tokens
+                    if tokens < cost[kind]:
+                        wait = max(wait, (cost[kind] - tokens) / rate)
+
+                if wait > 0:
+                    conn.execute("ROLLBACK")
+                    raise QuotaExceeded(
+                        "Quota exceeded for this API key, retry later", max(1, int(wait + 0.999))
+                    )
+
+                conn.executemany(
+                    "INSERT OR REPLACE INTO buckets (key, kind, tokens, updated_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    [
+                        (key, kind, available[kind] - cost[kind], now)
+                        for kind in self.capacity
+                    ],
+                )
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                conn.execute("ROLLBACK")
+                raise
+        return {kind: available[kind] - cost[kind] for kind in self.capacity}
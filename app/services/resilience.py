@@ -0,0 +1,279 @@
+import math, os, random, threading, time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, InvalidStateError, wait
+from concurrent.futures import TimeoutError as WaitTimeout
+from functools import lru_cache
+from .admission import Overloaded
+from ..utils import metrics
+
+
+@lru_cache(maxsize=None)
+def retryable_errors() -> tuple:
+    """Worth another attempt: the backend was busy or the call timed out in flight.
+
+    Resolved on first use; google.api_core (and grpc with it) is slow to import.
+    """
+    from google.api_core import exceptions
+
+    return (
+        exceptions.ServiceUnavailable,
+        exceptions.InternalServerError,
+        exceptions.TooManyRequests,
+        exceptions.DeadlineExceeded,
+        exceptions.Aborted,
+    )
+
+
+class RequestTimeout(RuntimeError):
+    """The request's deadline passed before Vision answered."""
+
+
+class Deadline:
+    """Time budget for one request (perf_counter clock, like g.request_start).
+
+    `seconds=None` means no overall budget; each attempt is then bounded only
+    by the per-attempt cap passed to timeout().
+    """
+
+    def __init__(self, seconds: float = None, start: float = None):
+        start = time.perf_counter() if start is None else start
+        self.expires_at = math.inf if seconds is None else start + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.perf_counter())
+
+    def wait_timeout(self):
+        """Remaining seconds for Future.result(), or None without a budget."""
+        return None if self.expires_at == math.inf else self.remaining()
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout(self, cap: float = None) -> float:
+        """Seconds the next Vision RPC may take; raises RequestTimeout when none are left."""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise RequestTimeout("Request deadline exceeded before Vision answered")
+        return remaining if cap is None else min(cap, remaining)
+
+
+class RetryPolicy:
+    """Bounded retries with exponential backoff and full jitter."""
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        initial_backoff: float = 0.2,
+        max_backoff: float = 2.0,
+        multiplier: float = 2.0,
+        rng: random.Random = None,
+    ):
+        self.max_attempts = max(1, max_attempts)
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.multiplier = multiplier
+        self._rng = rng or random.Random()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            int(config.get("VISION_RETRY_MAX_ATTEMPTS", 3)),
+            float(config.get("VISION_RETRY_INITIAL_BACKOFF_SECONDS", 0.2)),
+            float(config.get("VISION_RETRY_MAX_BACKOFF_SECONDS", 2.0)),
+        )
+
+    def backoff(self, attempt: int) -> float:
+        """Sleep before retry number `attempt` (0-based): uniform in [0, cap]."""
+        cap = min(self.max_backoff, self.initial_backoff * self.multiplier ** attempt)
+        return self._rng.uniform(0, cap)
+
+    def should_retry(self, error: BaseException, attempt: int) -> bool:
+        return isinstance(error, retryable_errors()) and attempt + 1 < self.max_attempts
+
+
+class LatencyTracker:
+    """Sliding window of recent successful Vision RPC latencies."""
+
+    def __init__(self, window: int = 512):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float, min_samples: int = 1):
+        """The pct-th percentile, or None until `min_samples` were recorded."""
+        with self._lock:
+            if len(self._samples) < max(1, min_samples):
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+
+class HedgePolicy:
+    """When to send a duplicate Vision request for a slow single-image call.
+
+    The delay is the `percentile` of recent latencies (never below
+    `min_delay`), so only roughly the slowest (100 - percentile)% of calls
+    are hedged. No hedging happens until `min_samples` latencies are known.
+    """
+
+    def __init__(
+        self,
+        tracker: LatencyTracker,
+        percentile: float = 95,
+        min_delay: float = 0.05,
+        min_samples: int = 20,
+    ):
+        self.tracker = tracker
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+
+    @classmethod
+    def from_config(cls, config, tracker: LatencyTracker):
+        if not config.get("VISION_HEDGE_ENABLED", False):
+            return None
+        return cls(
+            tracker,
+            float(config.get("VISION_HEDGE_PERCENTILE", 95)),
+            float(config.get("VISION_HEDGE_MIN_DELAY_SECONDS", 0.05)),
+            int(config.get("VISION_HEDGE_MIN_SAMPLES", 20)),
+        )
+
+    def delay(self):
+        latency = self.tracker.percentile(self.percentile, self.min_samples)
+        return None if latency is None else max(self.min_delay, latency)
+
+
+def submit_with_retries(
+    executor, fn, args: tuple, deadline: Deadline, policy: RetryPolicy, ticket=None
+) -> Future:
+    """Run fn(*args) on the Vision executor (queued as `ticket`), retrying transient errors.
+
+    Backoff sleeps happen on a timer, not on an executor thread, so a waiting
+    retry never holds a concurrency slot. A retry that would not fit in the
+    deadline is not attempted. Overloaded from the first submission is raised
+    here; a retry refused by admission control fails the returned future.
+    Cancelling the returned future cancels the attempt still queued, so it
+    never takes an executor slot.
+    """
+    outer = Future()
+    options = {} if ticket is None else {"ticket": ticket}
+    current = []
+
+    def attempt(n: int):
+        if outer.cancelled():
+            return
+        try:
+            inner = executor.submit(fn, *args, **options)
+        except Overloaded as e:
+            settle(outer.set_exception, e)
+            return
+        current[:] = [inner]
+        inner.add_done_callback(lambda f: finished(f, n))
+
+    def finished(inner: Future, n: int):
+        if inner.cancelled():
+            return  # cancelled with the outer future
+        error = inner.exception()
+        if error is None:
+            settle(outer.set_result, inner.result())
+            return
+        delay = policy.backoff(n)
+        if outer.cancelled() or not policy.should_retry(error, n) or delay >= deadline.remaining():
+            settle(outer.set_exception, error)
+            return
+        metrics.VISION_RETRIES.labels(type(error).__name__).inc()
+        timer = threading.Timer(delay, attempt, (n + 1,))
+        timer.daemon = True
+        timer.start()
+
+    def cancelled(f: Future):
+        if f.cancelled() and current:
+            current[0].cancel()
+
+    inner = executor.submit(fn, *args, **options)
+    current.append(inner)
+    inner.add_done_callback(lambda f: finished(f, 0))
+    outer.add_done_callback(cancelled)
+    return outer
+
+
+def settle(setter, value):
+    # The caller may have cancelled a losing hedge while it was still running
+    try:
+        setter(value)
+    except InvalidStateError:
+        pass
+
+
+def bounded_result(future: Future, deadline: Deadline = None):
+    """future.result() within the request deadline; on expiry the call is cancelled.
+
+    A call still queued for an executor slot is dropped from the queue, so
+    the deadline also bounds the wait for capacity.
+    """
+    try:
+        return future.result(None if deadline is None else deadline.wait_timeout())
+    except WaitTimeout:
+        future.cancel()
+        raise RequestTimeout("Request deadline exceeded waiting for Vision")
+
+
+def hedged_result(submit, delay: float = None, deadline: Deadline = None):
+    """Result of submit()'s future, racing a second copy if it is still pending after `delay`."""
+    primary = submit()
+    if delay is None:
+        return bounded_result(primary, deadline)
+    done, _ = wait([primary], timeout=delay)
+    if done:
+        return primary.result()
+
+    try:
+        backup = submit()
+    except Overloaded:
+        # No spare capacity: a hedge must never add load that gets shed
+        metrics.VISION_HEDGES.labels("skipped").inc()
+        return bounded_result(primary, deadline)
+    metrics.VISION_HEDGES.labels("sent").inc()
+
+    timeout = None if deadline is None else deadline.wait_timeout()
+    done, pending = wait([primary, backup], timeout=timeout, return_when=FIRST_COMPLETED)
+    if not done:
+        primary.cancel()
+        backup.cancel()
+        raise RequestTimeout("Request deadline exceeded waiting for Vision")
+    winner = next(iter(done))
+    if winner.exception() is not None and pending:
+        # The first answer was an error; the other copy may still succeed
+        other = next(iter(pending))
+        wait([other], timeout=None if deadline is None else deadline.wait_timeout())
+        if other.done() and other.exception() is None:
+            winner = other
+    for future in (primary, backup):
+        if future is not winner:
+            future.cancel()
+    if winner is backup and winner.exception() is None:
+        metrics.VISION_HEDGES.labels("won").inc()
+    return winner.result()
+
+
+# Latencies of this worker's Vision RPCs, used for the hedge delay
+_tracker = LatencyTracker()
+
+
+def get_latency_tracker() -> LatencyTracker:
+    return _tracker
+
+
+def _after_fork_in_child():
+    global _tracker
+    _tracker = LatencyTracker()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
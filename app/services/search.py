@@ -0,0 +1,229 @@
+"""Full-text index of OCR results (SQLite FTS5), searched by /api/search.
+
+Request threads only put finished results on a bounded queue; one writer
+thread per process drains it in batches of SEARCH_BATCH_SIZE (or every
+SEARCH_FLUSH_SECONDS) inside a single transaction. When the queue is full
+the result is dropped and counted rather than blocking the request. Every
+worker on the node writes the same WAL-mode file, and an image is stored
+once per content hash.
+"""
+import atexit, json, os, queue, sqlite3, threading, time
+from ..utils import metrics
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    hash TEXT NOT NULL UNIQUE,
+    filename TEXT,
+    text TEXT NOT NULL,
+    confidence REAL,
+    metadata TEXT,
+    indexed_at REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    text, filename, content='documents', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS documents_ai AFTER INSERT ON documents BEGIN
+    INSERT INTO documents_fts(rowid, text, filename) VALUES (new.id, new.text, new.filename);
+END;
+"""
+
+
+def match_expression(query: str) -> str:
+    """An FTS5 MATCH expression for free text: every word must appear.
+
+    Words are quoted, so punctuation and FTS5 operators in user input are
+    plain text; a trailing * keeps prefix matching ("recei*").
+    """
+    terms = []
+    for word in query.split():
+        prefix = word.endswith("*")
+        word = word.rstrip("*").replace('"', '""')
+        if word:
+            terms.append(f'"{word}"*' if prefix else f'"{word}"')
+    return " ".join(terms)
+
+
+class SearchIndex:
+    """The FTS5 index file plus this process's write queue and writer thread."""
+
+    def __init__(
+        self,
+        path: str,
+        batch_size: int = 256,
+        flush_seconds: float = 1.0,
+        queue_size: int = 10000,
+        max_candidates: int = 10000,
+    ):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.queue_size = queue_size
+        self.max_candidates = max_candidates
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connect().executescript(SCHEMA)
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        if not config.get("SEARCH_ENABLED", False):
+            return None
+        return cls(
+            config["SEARCH_DB_PATH"],
+            int(config.get("SEARCH_BATCH_SIZE", 256)),
+            float(config.get("SEARCH_FLUSH_SECONDS", 1.0)),
+            int(config.get("SEARCH_QUEUE_SIZE", 10000)),
+            int(config.get("SEARCH_MAX_CANDIDATES", 10000)),
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _ensure_writer(self):
+        # Started on first use, and again in a forked worker (threads don't survive fork)
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(self.queue_size)
+                self._writer = threading.Thread(
+                    target=self._drain, name="ocr-search-writer", daemon=True
+                )
+                self._writer.start()
+                self._pid = os.getpid()
+                atexit.register(self.flush)
+
+    def add(self, digest: str, filename: str, result: dict):
+        """Queue one result for indexing; never blocks."""
+        self._ensure_writer()
+        row = (
+            digest,
+            filename,
+            result.get("text", ""),
+            result.get("confidence"),
+            json.dumps(result.get("metadata") or {}),
+            time.time(),
+        )
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            metrics.SEARCH_DOCUMENTS.labels("dropped").inc()
+
+    def flush(self, timeout: float = 30):
+        """Wait until everything queued so far is written (e.g. at the end of a bulk chunk)."""
+        if self._pid != os.getpid():
+            return
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return
+        done.wait(timeout)
+
+    def _drain(self):
+        while True:
+            batch, waiters = [], []
+            item = self._queue.get()
+            deadline = time.monotonic() + self.flush_seconds
+            while True:
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    # A flush() writes what is queued now instead of waiting for a full batch
+                    deadline = 0
+                else:
+                    batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            if batch:
+                self.write(batch)
+            for waiter in waiters:
+                waiter.set()
+
+    def write(self, rows: list):
+        """Insert rows in one transaction; a content hash already indexed is skipped."""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                (last,) = conn.execute("SELECT coalesce(max(id), 0) FROM documents").fetchone()
+                conn.executemany(
+                    "INSERT OR IGNORE INTO documents (hash, filename, text, confidence, "
+                    "metadata, indexed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                # total_changes also counts FTS5's own writes
+                (indexed,) = conn.execute(
+                    "SELECT count(*) FROM documents WHERE id > ?", (last,)
+                ).fetchone()
+        except sqlite3.Error:
+            metrics.SEARCH_DOCUMENTS.labels("failed").inc(len(rows))
+            return
+        metrics.SEARCH_DOCUMENTS.labels("indexed").inc(indexed)
+        metrics.SEARCH_DOCUMENTS.labels("duplicate").inc(len(rows) - indexed)
+
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> tuple:
+        """(hits, more) for free text, best match (BM25) first.
+
+        BM25 scores every match, so a word found in most documents would cost
+        a pass over the whole index; only the newest max_candidates matches
+        are ranked. snippet() is built for the returned page alone.
+        """
+        expression = match_expression(query)
+        if not expression:
+            raise ValueError("Query has no searchable words")
+        conn = self._connect()
+        # FTS5 walks matches in rowid order without scoring them
+        floor = conn.execute(
+            "SELECT rowid FROM documents_fts WHERE documents_fts MATCH ? "
+            "ORDER BY rowid DESC LIMIT 1 OFFSET ?",
+            (expression, self.max_candidates - 1),
+        ).fetchone()
+        ranked = conn.execute(
+            "SELECT rowid, bm25(documents_fts, 1.0, 0.5) AS score FROM documents_fts "
+            "WHERE documents_fts MATCH ? AND rowid >= ? ORDER BY score LIMIT ? OFFSET ?",
+            (expression, floor[0] if floor else 0, limit + 1, offset),
+        ).fetchall()
+        page = ranked[:limit]
+        if not page:
+            return [], False
+        rows = conn.execute(
+            "SELECT d.id, d.hash, d.filename, d.confidence, d.metadata, d.indexed_at, "
+            "snippet(documents_fts, 0, '[', ']', '…', 16) "
+            "FROM documents_fts JOIN documents d ON d.id = documents_fts.rowid "
+            f"WHERE documents_fts MATCH ? AND documents_fts.rowid IN ({','.join('?' * len(page))})",
+            (expression, *(rowid for rowid, _ in page)),
+        ).fetchall()
+        documents = {row[0]: row[1:] for row in rows}
+        hits = []
+        for rowid, score in page:
+            digest, filename, confidence, metadata, indexed_at, snippet = documents[rowid]
+            hits.append(
+                {
+                    "hash": digest,
+                    "filename": filename,
+                    "confidence": confidence,
+                    "metadata": json.loads(metadata or "{}"),
+                    "indexed_at": indexed_at,
+                    "snippet": snippet,
+                    # bm25() is lower for better matches
+                    "score": round(-score, 4),
+                }
+            )
+        return hits, len(ranked) > limit
+
+    def count(self) -> int:
+        return self._connect().execute("SELECT count(*) FROM documents").fetchone()[0]
@@ -0,0 +1,74 @@
+import os, threading
+from concurrent.futures import Future
+from ..utils import metrics
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one execution.
+
+    The first caller for a key (the leader) runs the call; callers arriving
+    while it is in flight get the leader's Future and share its result or
+    exception. The key is released as soon as the call finishes, so this
+    only deduplicates concurrent work; caching finished results is the
+    OCR cache's job.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def begin(self, key: str):
+        """Return (future, is_leader); a leader must call run() with the future."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                metrics.OCR_COALESCED.labels("request").inc()
+                return future, False
+            future = self._calls[key] = Future()
+            return future, True
+
+    def run(self, key: str, future: Future, fn):
+        """Run fn() as the leader for `key` and publish its outcome to every waiter."""
+        try:
+            result = fn()
+        except BaseException as e:
+            self._publish(key, future, future.set_exception, e)
+        else:
+            self._publish(key, future, future.set_result, result)
+
+    async def arun(self, key: str, future: Future, fn):
+        """run() for a coroutine function, awaited on the event loop (see async_ocr)."""
+        try:
+            result = await fn()
+        except BaseException as e:
+            self._publish(key, future, future.set_exception, e)
+        else:
+            self._publish(key, future, future.set_result, result)
+
+    def _publish(self, key: str, future: Future, setter, value):
+        # The key goes first: a waiter that retries after a failure must
+        # start a new call, not get this finished future back from begin()
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        setter(value)
+
+    def __len__(self):
+        return len(self._calls)
+
+
+# One table per process; a forked worker starts with nothing in flight
+_flights = SingleFlight()
+
+
+def get_single_flight() -> SingleFlight:
+    return _flights
+
+
+def _after_fork_in_child():
+    global _flights
+    _flights = SingleFlight()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,124 @@
+import io, mmap, os, tempfile, threading
+from flask import Request, current_app
+from .admission import Overloaded
+from ..utils import metrics
+
+
+class UploadRequest(Request):
+    """Request class that spools multipart uploads straight to disk above a threshold.
+
+    Bodies up to UPLOAD_SPOOL_THRESHOLD are parsed into memory; larger ones
+    (or ones of unknown length) go to an unnamed temporary file in
+    UPLOAD_SPOOL_DIR, which read_upload() then maps instead of copying.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        threshold = int(current_app.config.get("UPLOAD_SPOOL_THRESHOLD", 1024 * 1024))
+        if total_content_length is not None and total_content_length <= threshold:
+            return io.BytesIO()
+        directory = current_app.config.get("UPLOAD_SPOOL_DIR") or None
+        return tempfile.TemporaryFile("w+b", dir=directory)
+
+
+def upload_size(file) -> int:
+    """Size of a parsed upload without reading it."""
+    stream = file.stream
+    position = stream.tell()
+    size = stream.seek(0, io.SEEK_END)
+    stream.seek(position)
+    return size
+
+
+def read_upload(file):
+    """The upload's bytes without a copy where possible.
+
+    In-memory uploads are returned as the parser's own bytes buffer; spooled
+    ones as a read-only memoryview over an mmap of the temporary file, so
+    hashing, validation and metadata all read the same pages. Convert with
+    bytes() only where an API insists on bytes (the Vision request).
+    """
+    stream = file.stream
+    if isinstance(stream, io.BytesIO):
+        return stream.getvalue()
+    try:
+        fileno = stream.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        stream.seek(0)
+        return stream.read()
+    stream.flush()
+    if os.fstat(fileno).st_size == 0:
+        return b""
+    return memoryview(mmap.mmap(fileno, 0, access=mmap.ACCESS_READ))
+
+
+class ByteBudget:
+    """Per-worker cap on the upload bytes being processed at once.
+
+    A request reserves its whole upload size in one step (clamped to the
+    budget, so an oversized request can still run alone), which avoids two
+    batches each holding half the budget while waiting for the rest. Waiting
+    longer than `timeout` raises Overloaded.
+    """
+
+    def __init__(self, limit: int, timeout: float = 10.0):
+        self.limit = limit
+        self.timeout = timeout
+        self.used = 0
+        self._cond = threading.Condition()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            int(config.get("UPLOAD_BYTE_BUDGET", 256 * 1024 * 1024)),
+            float(config.get("UPLOAD_BUDGET_TIMEOUT_SECONDS", 10)),
+        )
+
+    def acquire(self, nbytes: int) -> int:
+        """Reserve `nbytes`; returns the amount to pass back to release()."""
+        nbytes = min(nbytes, self.limit)
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.used + nbytes <= self.limit, self.timeout):
+                metrics.VISION_SHED.labels("upload_budget").inc()
+                raise Overloaded("Upload memory budget exhausted, retry later")
+            self.used += nbytes
+        metrics.UPLOAD_BYTES_INFLIGHT.inc(nbytes)
+        return nbytes
+
+    def release(self, nbytes: int):
+        if not nbytes:
+            return
+        with self._cond:
+            self.used -= nbytes
+            self._cond.notify_all()
+        metrics.UPLOAD_BYTES_INFLIGHT.dec(nbytes)
+
+
+# One budget per process, like the Vision executor
+_lock = threading.Lock()
+_budget = None
+
+
+def get_byte_budget(config) -> ByteBudget:
+    global _budget
+    budget = _budget
+    if budget is None:
+        with _lock:
+            if _budget is None:
+                _budget = ByteBudget.from_config(config)
+            budget = _budget
+    return budget
+
+
+def reset():
+    global _budget
+    _budget = None
+
+
+def _after_fork_in_child():
+    global _lock
+    _lock = threading.Lock()
+    reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
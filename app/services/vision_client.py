@@ -0,0 +1,238 @@
+import itertools, logging, os, threading
+from ..config import credentials_info
+
+logger = logging.getLogger(__name__)
+
+# One pool per process. gRPC channels are not fork-safe, so a pool inherited
+# from a preloading gunicorn master is dropped in the child (see reset()).
+_lock = threading.Lock()
+_pool = None
+_factory = None
+_async_factory = None
+# Warm-up state for readiness: the config to warm up with, and its outcome
+_warmup_config = None
+_warmup_done = threading.Event()
+_warmup_error = None
+
+
+class VisionClientPool:
+    """Fixed set of Vision clients (one gRPC channel each) handed out round-robin."""
+
+    def __init__(self, clients: list):
+        if not clients:
+            raise ValueError("Vision client pool needs at least one client")
+        self.clients = clients
+        self._cycle = itertools.cycle(clients)
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            return next(self._cycle)
+
+    def __len__(self):
+        return len(self.clients)
+
+
+def channel_options(config) -> list:
+    max_message = int(config.get("VISION_MAX_MESSAGE_BYTES", 40 * 1024 * 1024))
+    return [
+        ("grpc.keepalive_time_ms", int(config.get("VISION_KEEPALIVE_MS", 30000))),
+        ("grpc.keepalive_timeout_ms", 10000),
+        ("grpc.keepalive_permit_without_calls", 1),
+        ("grpc.max_send_message_length", max_message),
+        ("grpc.max_receive_message_length", max_message),
+    ]
+
+
+def import_modules():
+    """Import the Vision client library (about a quarter of a second of CPU).
+
+    Done lazily, by the warm-up thread or the first request, so create_app()
+    stays fast; gunicorn.conf.py calls it in the preloading master so every
+    worker inherits the modules already loaded.
+    """
+    import grpc
+    from google.cloud import vision
+    from google.cloud.vision_v1.services.image_annotator.transports import (
+        ImageAnnotatorGrpcTransport,
+    )
+
+    return grpc, vision, ImageAnnotatorGrpcTransport
+
+
+def load_credentials(config):
+    """Service-account credentials from env vars, or None to use the default file/ADC."""
+    if os.path.isfile(config.get("GOOGLE_CREDENTIALS", "")):
+        return None
+    info = credentials_info()
+    if info is None:
+        return None
+    from google.oauth2 import service_account
+
+    return service_account.Credentials.from_service_account_info(info)
+
+
+def build_client(config):
+    """Create a Vision client on its own gRPC channel with our channel options."""
+    grpc, vision, ImageAnnotatorGrpcTransport = import_modules()
+    emulator = config.get("VISION_EMULATOR_HOST")
+    if emulator:
+        # Local stand-in server (benchmarks/fake_vision.py): plaintext, no credentials
+        channel = grpc.insecure_channel(emulator, options=channel_options(config))
+    else:
+        channel = ImageAnnotatorGrpcTransport.create_channel(
+            credentials=load_credentials(config), options=channel_options(config)
+        )
+    return vision.ImageAnnotatorClient(
+        transport=ImageAnnotatorGrpcTransport(channel=channel)
+    )
+
+
+def build_async_client(config):
+    """build_client() for asyncio: an ImageAnnotatorAsyncClient on a grpc.aio channel.
+
+    grpc.aio channels belong to the event loop they are first used on, so
+    call this from the loop that will use the client.
+    """
+    grpc, vision, _ = import_modules()
+    from grpc import aio
+    from google.cloud.vision_v1.services.image_annotator.transports import (
+        ImageAnnotatorGrpcAsyncIOTransport,
+    )
+
+    emulator = config.get("VISION_EMULATOR_HOST")
+    if emulator:
+        channel = aio.insecure_channel(emulator, options=channel_options(config))
+    else:
+        channel = ImageAnnotatorGrpcAsyncIOTransport.create_channel(
+            credentials=load_credentials(config), options=channel_options(config)
+        )
+    return vision.ImageAnnotatorAsyncClient(
+        transport=ImageAnnotatorGrpcAsyncIOTransport(channel=channel)
+    )
+
+
+def create_async_pool(config) -> VisionClientPool:
+    """VISION_POOL_SIZE async clients for the running event loop (see async_ocr.get_runtime)."""
+    factory = _async_factory or (lambda: build_async_client(config))
+    size = max(1, int(config.get("VISION_POOL_SIZE", 2)))
+    return VisionClientPool([factory() for _ in range(size)])
+
+
+def _create_pool(config) -> VisionClientPool:
+    factory = _factory or (lambda: build_client(config))
+    size = max(1, int(config.get("VISION_POOL_SIZE", 2)))
+    return VisionClientPool([factory() for _ in range(size)])
+
+
+def get_client(config):
+    """Return a pooled Vision client, creating the pool on first use."""
+    global _pool
+    pool = _pool
+    if pool is None:
+        with _lock:
+            if _pool is None:
+                _pool = _create_pool(config)
+            pool = _pool
+    return pool.get()
+
+
+def warm_up(config):
+    """Build the pool now (credentials, channels) instead of on the first request."""
+    get_client(config)
+    timeout = float(config.get("VISION_WARMUP_TIMEOUT_SECONDS", 0))
+    if timeout <= 0:
+        return
+
+    # Optionally open the connections too, so TLS setup is off the hot path
+    grpc = import_modules()[0]
+    for client in _pool.clients:
+        channel = getattr(getattr(client, "transport", None), "grpc_channel", None)
+        if channel is None:
+            continue
+        try:
+            grpc.channel_ready_future(channel).result(timeout=timeout)
+        except grpc.FutureTimeoutError:
+            logger.warning("Vision channel not ready after %ss; continuing", timeout)
+
+
+def defer_warm_up(config):
+    """Remember the config for a later start_warm_up() (e.g. after a gunicorn fork)."""
+    global _warmup_config
+    _warmup_config = config
+
+
+def start_warm_up(config=None):
+    """Run warm_up() on a daemon thread; readiness() reports its progress.
+
+    Never call this in a process that will fork afterwards (a preloading
+    gunicorn master): the thread would not survive the fork.
+    """
+    global _warmup_config, _warmup_error
+    config = config if config is not None else _warmup_config
+    if config is None:
+        return
+    _warmup_config = config
+    _warmup_error = None
+    _warmup_done.clear()
+
+    def run():
+        global _warmup_error
+        try:
+            warm_up(config)
+        except Exception as e:
+            _warmup_error = e
+            logger.exception("Vision warm-up failed")
+        finally:
+            _warmup_done.set()
+
+    threading.Thread(target=run, name="vision-warmup", daemon=True).start()
+
+
+def readiness():
+    """("ready" | "starting" | "failed", error message or None) for /api/health/ready."""
+    if _warmup_config is None:
+        # No warm-up requested: the pool is built by the first request
+        return "ready", None
+    if not _warmup_done.is_set():
+        return "starting", None
+    if _warmup_error is not None:
+        return "failed", str(_warmup_error)
+    return "ready", None
+
+
+def set_client_factory(factory):
+    """Inject a client factory (e.g. a fake for offline tests/benchmarks)."""
+    global _factory
+    with _lock:
+        _factory = factory
+    reset()
+
+
+def set_client(client):
+    """Inject a single shared client instance."""
+    set_client_factory(lambda: client)
+
+
+def set_async_client_factory(factory):
+    """set_client_factory() for the async pool; takes effect on the next event loop."""
+    global _async_factory
+    _async_factory = factory
+
+
+def reset():
+    """Drop the pool; the next get_client() rebuilds it."""
+    global _pool
+    _pool = None
+
+
+def _after_fork_in_child():
+    global _lock, _warmup_done
+    _lock = threading.Lock()
+    # Not ready until this process has warmed up its own channels
+    _warmup_done = threading.Event()
+    reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
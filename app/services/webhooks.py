@@ -0,0 +1,92 @@
+import http.client, ipaddress, json, socket, urllib.parse, urllib.request
+
+
+def allowed_hosts(value: str) -> frozenset:
+    """JOBS_CALLBACK_ALLOWED_HOSTS ("hooks.example.com, 10.0.0.5") as a set of host names."""
+    return frozenset(h.strip().lower() for h in (value or "").split(",") if h.strip())
+
+
+def public_address(address: str) -> bool:
+    """False for private, loopback, link-local, reserved and multicast addresses."""
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def check_callback_url(url: str, allowed: frozenset = frozenset()):
+    """Raise ValueError unless jobs may POST to `url`.
+
+    With an allowlist only its hosts are accepted (internal ones included).
+    Without one the host must resolve to public addresses only, so a
+    callback cannot reach the metadata server or other internal services.
+    """
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError("callback_url must be an http(s) URL")
+    host = parts.hostname.lower()
+    if allowed:
+        if host not in allowed:
+            raise ValueError(f"callback_url host {host} is not allowed")
+        return
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        infos = socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)
+    except (OSError, ValueError):
+        raise ValueError(f"callback_url host {host} does not resolve")
+    if not all(public_address(info[4][0]) for info in infos):
+        raise ValueError("callback_url must not point to a private or local address")
+
+
+class _PublicPeer:
+    # Checked again after connecting: DNS may answer differently by now
+    def connect(self):
+        super().connect()
+        peer = self.sock.getpeername()[0]
+        if not public_address(peer):
+            self.sock.close()
+            raise OSError(f"refusing to POST to private address {peer}")
+
+
+class _PublicHTTPConnection(_PublicPeer, http.client.HTTPConnection):
+    pass
+
+
+class _PublicHTTPSConnection(_PublicPeer, http.client.HTTPSConnection):
+    pass
+
+
+class _PublicHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(_PublicHTTPConnection, req)
+
+
+class _PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(_PublicHTTPSConnection, req, context=self._context)
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+def post_json(url: str, payload: dict, allowed: frozenset = frozenset(), timeout: float = 10):
+    """POST `payload` to a callback URL that passes check_callback_url().
+
+    Redirects are not followed and no proxy is used; without an allowlist
+    the connected address itself must be public.
+    """
+    check_callback_url(url, allowed)
+    handlers = [urllib.request.ProxyHandler({}), _NoRedirect()]
+    if not allowed:
+        handlers += [_PublicHTTPHandler(), _PublicHTTPSHandler()]
+    opener = urllib.request.build_opener(*handlers)
+    req = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    with opener.open(req, timeout=timeout):
+        pass
@@ -1,3 +1,4 @@
+import io
 from werkzeug.utils import secure_filename
 
 
@@ -7,3 +8,38 @@ def allowed_file(filename: str, allowed_extensions: set) -> bool:
 
 def get_secure_filename(filename: str) -> str:
     return secure_filename(filename)
+
+
+class BufferReader(io.RawIOBase):
+    """Seekable read-only file over a buffer (e.g. an mmap'd upload) without copying it."""
+
+    def __init__(self, buffer):
+        self._view = memoryview(buffer).cast("B")
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        n = max(0, min(len(b), len(self._view) - self._pos))
+        b[:n] = self._view[self._pos : self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+
+def as_stream(content):
+    """File object over image content; bytes are shared by BytesIO, buffers are not copied."""
+    if isinstance(content, bytes):
+        return io.BytesIO(content)
+    return BufferReader(content)
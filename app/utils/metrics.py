@@ -0,0 +1,136 @@
+import os, time
+from contextlib import contextmanager
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Under gunicorn each worker writes its samples to PROMETHEUS_MULTIPROC_DIR
+# (see gunicorn.conf.py) and /metrics merges them, whichever worker answers.
+
+STAGE_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+STAGE_SECONDS = Histogram(
+    "ocr_stage_seconds",
+    "Time spent in each stage of the OCR request path",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    "ocr_request_seconds",
+    "End-to-end request latency by endpoint",
+    ["endpoint"],
+    buckets=STAGE_BUCKETS,
+)
+REQUESTS = Counter(
+    "ocr_requests_total", "Requests by endpoint and HTTP status", ["endpoint", "status"]
+)
+VISION_RPCS = Counter(
+    "ocr_vision_rpcs_total", "Vision RPCs by method and outcome", ["method", "outcome"]
+)
+VISION_IMAGES = Counter("ocr_vision_images_total", "Images sent to Vision")
+VISION_INFLIGHT = Gauge(
+    "ocr_vision_inflight", "Vision RPCs currently in flight", multiprocess_mode="livesum"
+)
+VISION_QUEUE_DEPTH = Gauge(
+    "ocr_vision_queue_depth",
+    "Vision calls waiting for an executor slot",
+    multiprocess_mode="livesum",
+)
+VISION_CONCURRENCY_LIMIT = Gauge(
+    "ocr_vision_concurrency_limit",
+    "Current (adaptive) Vision concurrency limit per worker",
+    multiprocess_mode="liveall",
+)
+UPLOAD_BYTES_INFLIGHT = Gauge(
+    "ocr_upload_bytes_inflight",
+    "Upload bytes reserved against the per-worker byte budget",
+    multiprocess_mode="livesum",
+)
+VISION_SHED = Counter(
+    "ocr_vision_shed_total", "Vision calls rejected by admission control", ["reason"]
+)
+VISION_QUEUE_WAIT = Histogram(
+    "ocr_vision_queue_wait_seconds",
+    "Time Vision calls waited for a slot, by priority class (0 if one was free)",
+    ["priority"],
+    buckets=STAGE_BUCKETS,
+)
+VISION_RETRIES = Counter(
+    "ocr_vision_retries_total", "Vision calls retried after a transient error", ["error"]
+)
+VISION_HEDGES = Counter(
+    "ocr_vision_hedges_total",
+    "Hedged Vision requests: sent, won (hedge answered first) or skipped",
+    ["outcome"],
+)
+OCR_COALESCED = Counter(
+    "ocr_coalesced_total",
+    "Images that shared another in-flight OCR call instead of making their own",
+    ["scope"],
+)
+PREFLIGHT_SKIPPED = Counter(
+    "ocr_preflight_skipped_total",
+    "Vision calls avoided by the pre-flight checks: unsupported, corrupt or blank images",
+    ["reason"],
+)
+QUOTA_REJECTIONS = Counter(
+    "ocr_quota_rejections_total", "Requests refused by per-key image/byte quotas"
+)
+CACHE_LOOKUPS = Counter(
+    "ocr_cache_lookups_total", "OCR result cache lookups", ["result"]
+)
+PHASH_LOOKUPS = Counter(
+    "ocr_phash_lookups_total",
+    "Perceptual-hash lookups after an exact cache miss",
+    ["result"],
+)
+SEARCH_DOCUMENTS = Counter(
+    "ocr_search_documents_total",
+    "Results sent to the search index: indexed, duplicate, dropped (queue full) or failed",
+    ["outcome"],
+)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block into ocr_stage_seconds{stage=name} (monotonic clock)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(name).observe(time.perf_counter() - start)
+
+
+@contextmanager
+def vision_call(method: str, images: int = 1):
+    """Track one Vision RPC: in-flight gauge, latency and outcome counters."""
+    VISION_INFLIGHT.inc()
+    VISION_IMAGES.inc(images)
+    outcome = "error"
+    try:
+        with stage("vision_rpc"):
+            yield
+        outcome = "ok"
+    finally:
+        VISION_INFLIGHT.dec()
+        VISION_RPCS.labels(method, outcome).inc()
+
+
+def render():
+    """Return (payload, content type) for the /metrics endpoint."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,324 @@
+"""Opt-in sampling profiler for individual requests (PROFILE_ENABLED).
+
+A request is profiled when its X-Profile-Token header matches PROFILE_TOKEN,
+or at random with probability PROFILE_SAMPLE_RATE. While a profiled request
+runs, one background thread reads the stacks of the threads working for it
+every PROFILE_INTERVAL_MS (sys._current_frames, no trace hooks), so other
+requests run at full speed; with none running the thread sleeps. Each
+profile is saved in PROFILE_DIR as <request id>.folded (collapsed stacks for
+flamegraph.pl, speedscope or inferno) next to a .json with its metadata.
+"""
+import functools, hmac, json, os, random, re, sys, threading, time, uuid
+from collections import Counter
+from flask import current_app, g, has_app_context, request
+
+# Accepted X-Request-ID values double as file names
+REQUEST_ID = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{0,63}$")
+
+
+class Profile:
+    """Stack samples of one request, taken from the threads attached to it."""
+
+    def __init__(self, profile_id: str, interval: float):
+        self.id = profile_id
+        self.interval = interval
+        self.started = time.time()
+        self.start = time.perf_counter()
+        self.status = None
+        self.samples = 0
+        self._stacks = Counter()
+        self._threads = Counter()  # thread ident -> attach depth
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def attach(self, ident: int = None):
+        with self._lock:
+            self._threads[ident or threading.get_ident()] += 1
+
+    def detach(self, ident: int = None):
+        ident = ident or threading.get_ident()
+        with self._lock:
+            self._threads[ident] -= 1
+            if self._threads[ident] <= 0:
+                del self._threads[ident]
+
+    def threads(self) -> list:
+        with self._lock:
+            return list(self._threads)
+
+    def add(self, stack: str):
+        with self._lock:
+            if not self._closed:
+                self._stacks[stack] += 1
+                self.samples += 1
+
+    def close(self) -> Counter:
+        """Stop taking samples; returns them."""
+        with self._lock:
+            self._closed = True
+            self._threads.clear()
+            return self._stacks
+
+
+@functools.lru_cache(maxsize=8192)
+def frame_label(code) -> str:
+    path = "/".join(code.co_filename.replace("\\", "/").rsplit("/", 2)[-2:])
+    return f"{code.co_qualname} ({path}:{code.co_firstlineno})"
+
+
+def collapse(frame) -> str:
+    """Root-first 'a;b;c' stack of a frame, as in the collapsed-stack format."""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class Sampler:
+    """One sampling thread per process, awake only while profiles are active.
+
+    The sampler needs the GIL to read stacks, and a busy thread only hands
+    it over every sys.getswitchinterval() (5 ms) or when it blocks, which
+    would bias samples towards I/O and other GIL-releasing calls. While a
+    profile is active the switch interval is lowered to a tenth of the
+    sampling interval, and restored when the last one finishes. Some bias
+    towards blocking calls remains where the sampler shares one CPU.
+    """
+
+    def __init__(self):
+        self._active = set()
+        self._wake = threading.Condition()
+        self._thread = None
+        self._switch_interval = None
+
+    def start(self, profile: Profile):
+        with self._wake:
+            if not self._active:
+                self._switch_interval = sys.getswitchinterval()
+            self._active.add(profile)
+            sys.setswitchinterval(min(self._switch_interval, profile.interval / 10))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="ocr-profiler", daemon=True)
+                self._thread.start()
+            self._wake.notify()
+
+    def stop(self, profile: Profile):
+        with self._wake:
+            self._active.discard(profile)
+            if not self._active:
+                sys.setswitchinterval(self._switch_interval)
+
+    def _run(self):
+        while True:
+            with self._wake:
+                while not self._active:
+                    self._wake.wait()
+                interval = min(profile.interval for profile in self._active)
+            # Sleep first: sampling right on wake-up would always land on the
+            # profiled thread's first GIL release after it started
+            time.sleep(interval)
+            with self._wake:
+                active = list(self._active)
+            frames = sys._current_frames()
+            for profile in active:
+                for ident in profile.threads():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        profile.add(collapse(frame))
+            del frames
+
+
+class ProfileStore:
+    """Profiles on disk, the oldest deleted once they take more than max_bytes."""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        # The directory is shared by every worker, so it is rescanned when
+        # this worker alone may have used up the room left at the last scan,
+        # and at least once a second
+        self._written = self._headroom = 0
+        self._scanned = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config["PROFILE_DIR"], int(config["PROFILE_MAX_BYTES"]))
+
+    def _write(self, name: str, data: bytes):
+        # Written whole, then renamed: a listing never sees half a file
+        path = os.path.join(self.directory, name)
+        temp = f"{path}.{os.getpid()}.tmp"
+        with open(temp, "wb") as f:
+            f.write(data)
+        os.replace(temp, path)
+
+    def save(self, profile_id: str, stacks: Counter, meta: dict):
+        lines = (f"{stack} {count}\n" for stack, count in stacks.most_common())
+        folded = "".join(lines).encode("utf-8")
+        info = json.dumps(meta).encode("utf-8")
+        self._write(f"{profile_id}.folded", folded)
+        self._write(f"{profile_id}.json", info)
+        with self._lock:
+            self._written += len(folded) + len(info)
+            due = self._written > self._headroom or time.monotonic() - self._scanned > 1
+        if due:
+            self.rotate()
+
+    def _entries(self) -> list:
+        """(mtime, bytes, id) per saved profile, oldest first."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".folded"):
+                continue
+            profile_id = name[: -len(".folded")]
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+                size = stat.st_size
+                size += os.path.getsize(os.path.join(self.directory, f"{profile_id}.json"))
+            except FileNotFoundError:
+                continue  # deleted by another worker's rotation
+            entries.append((stat.st_mtime, size, profile_id))
+        return sorted(entries)
+
+    def rotate(self):
+        with self._lock:
+            self._written, self._scanned = 0, time.monotonic()
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        # The newest profile is kept even if it alone is over the cap
+        for _, size, profile_id in entries[:-1]:
+            if total <= self.max_bytes:
+                break
+            for suffix in (".folded", ".json"):
+                try:
+                    os.remove(os.path.join(self.directory, profile_id + suffix))
+                except FileNotFoundError:
+                    pass
+            total -= size
+        with self._lock:
+            self._headroom = max(0, self.max_bytes - total)
+
+    def list(self) -> list:
+        """Metadata of every saved profile, newest first."""
+        profiles = []
+        for _, size, profile_id in reversed(self._entries()):
+            try:
+                with open(os.path.join(self.directory, f"{profile_id}.json"), "rb") as f:
+                    meta = json.load(f)
+            except (FileNotFoundError, ValueError):
+                continue
+            profiles.append({**meta, "bytes": size})
+        return profiles
+
+    def path(self, profile_id: str):
+        """Path of a profile's collapsed stacks, or None."""
+        if not REQUEST_ID.match(profile_id):
+            return None
+        path = os.path.join(self.directory, f"{profile_id}.folded")
+        return path if os.path.isfile(path) else None
+
+
+_sampler = Sampler()
+
+
+def has_token(config) -> bool:
+    token = config["PROFILE_TOKEN"]
+    return bool(token) and hmac.compare_digest(request.headers.get("X-Profile-Token", ""), token)
+
+
+def begin(config):
+    """Decide whether the current request is profiled; returns its Profile or None.
+
+    The decision is stored in g, so it is taken once per request even when
+    the ASGI entry point calls this before the before_request hook runs.
+    """
+    if "profile" in g:
+        return g.profile
+    profile = None
+    if config["PROFILE_ENABLED"]:
+        rate = float(config["PROFILE_SAMPLE_RATE"])
+        if has_token(config) or (rate > 0 and random.random() < rate):
+            request_id = request.headers.get("X-Request-ID", "")
+            profile = Profile(
+                request_id if REQUEST_ID.match(request_id) else uuid.uuid4().hex,
+                float(config["PROFILE_INTERVAL_MS"]) / 1000,
+            )
+            _sampler.start(profile)
+    g.profile = profile
+    return profile
+
+
+def traced(fn, *args):
+    """fn(*args), sampled for the current request's profile (if any) meanwhile."""
+    profile = g.get("profile") if has_app_context() else None
+    if profile is None:
+        return fn(*args)
+    profile.attach()
+    try:
+        return fn(*args)
+    finally:
+        profile.detach()
+
+
+def finish():
+    """Stop the current request's profile, if any, and save it."""
+    profile = g.pop("profile", None)
+    if profile is None:
+        return
+    _sampler.stop(profile)
+    duration = time.perf_counter() - profile.start
+    stacks = profile.close()
+    meta = {
+        "id": profile.id,
+        "method": request.method,
+        "path": request.path,
+        "endpoint": request.endpoint,
+        "status": profile.status,
+        "started": profile.started,
+        "duration_ms": round(duration * 1000, 1),
+        "samples": profile.samples,
+        "interval_ms": profile.interval * 1000,
+        "pid": os.getpid(),
+    }
+    try:
+        current_app.extensions["ocr_profiles"].save(profile.id, stacks, meta)
+    except OSError:
+        current_app.logger.exception("Could not save profile %s", profile.id)
+
+
+def init_app(app):
+    """Register the profiling hooks; with PROFILE_ENABLED off nothing is added."""
+    if not app.config["PROFILE_ENABLED"]:
+        return
+    app.extensions["ocr_profiles"] = ProfileStore.from_config(app.config)
+
+    @app.before_request
+    def start_profile():
+        # Under WSGI one thread serves the whole request
+        if "profile" not in g and begin(app.config) is not None:
+            g.profile.attach()
+
+    @app.after_request
+    def tag_profile(response):
+        profile = g.get("profile")
+        if profile is not None:
+            profile.status = response.status_code
+            response.headers["X-Profile-ID"] = profile.id
+        return response
+
+    @app.teardown_request
+    def save_profile(exc):
+        finish()
+
+
+def reset():
+    global _sampler
+    _sampler = Sampler()
+
+
+if hasattr(os, "register_at_fork"):
+    # The sampling thread does not survive a fork
+    os.register_at_fork(after_in_child=reset)
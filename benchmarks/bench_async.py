@@ -0,0 +1,83 @@
+"""Sync (gunicorn run:app) vs async (uvicorn workers, asgi:app) at rising concurrency.
+
+    python -m benchmarks.bench_async --concurrency 16,64,256 --latency constant:0.25
+
+Both stacks run under gunicorn with the same worker count against the fake
+Vision gRPC server. Every request uploads a different small image, so
+single-flight coalescing can't flatter either stack. By Little's law,
+throughput x Vision latency is the number of OCRs in flight per instance.
+"""
+import argparse, os, signal, statistics
+from types import SimpleNamespace
+from .bench_mosaic import label
+from .fake_vision import FakeVisionClient, FakeVisionServer, parse_latency
+from .load_test import drive, start_server, wait_ready, worker_memory
+
+STACKS = {
+    "sync": "gunicorn --bind 127.0.0.1:{port} --workers={workers} --threads={threads} run:app",
+    "async": "gunicorn --bind 127.0.0.1:{port} --workers={workers} -k uvicorn.workers.UvicornWorker asgi:app",
+}
+
+
+def run(stack: str, concurrency: int, requests: int, images: list, args, emulator: str) -> dict:
+    options = SimpleNamespace(
+        endpoint="single",
+        concurrency=concurrency,
+        requests=requests,
+        batch_size=1,
+        port=args.port,
+        workers=args.workers,
+        threads=1,
+        server_cmd=STACKS[stack],
+    )
+    server = start_server(options, emulator)
+    try:
+        wait_ready(args.port)
+        results = drive(options, images)
+        results["workers"] = worker_memory(server.pid)
+    finally:
+        os.killpg(server.pid, signal.SIGTERM)
+        server.wait(timeout=30)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", default="16,64,256", help="comma-separated levels")
+    parser.add_argument("--rounds", type=int, default=2, help="requests per client at each level")
+    parser.add_argument("--latency", default="constant:0.25", help="fake Vision RPC latency")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--port", type=int, default=8097)
+    parser.add_argument("--stacks", default="sync,async")
+    args = parser.parse_args()
+
+    # Nothing but the serving model should limit throughput
+    os.environ.update(QUOTA_ENABLED="false", PHASH_ENABLED="false")
+    levels = [int(c) for c in args.concurrency.split(",")]
+    images = [(f"{seed}.png", label(seed)) for seed in range(max(levels) * args.rounds)]
+    backend = FakeVisionClient(latency_model=parse_latency(args.latency))
+    fake = FakeVisionServer(backend, max_workers=max(levels) * 2).start()
+    latency = statistics.fmean(parse_latency(args.latency)() for _ in range(1000))
+
+    print(f"{args.workers} workers per stack, fake Vision latency {args.latency}")
+    print(
+        f"{'stack':<7}{'conc':>6}{'req/s':>9}{'in flight':>11}{'p50 ms':>9}{'p99 ms':>9}"
+        f"{'peak MB/worker':>16}  statuses"
+    )
+    try:
+        for stack in args.stacks.split(","):
+            for concurrency in levels:
+                results = run(stack, concurrency, concurrency * args.rounds, images, args, fake.address)
+                peak = max((w["peak_rss_mb"] or 0 for w in results["workers"]), default=0)
+                print(
+                    f"{stack:<7}{concurrency:>6}{results['requests_per_second']:>9.1f}"
+                    f"{results['requests_per_second'] * latency:>11.1f}"
+                    f"{results['latency_ms']['p50']:>9.0f}{results['latency_ms']['p99']:>9.0f}"
+                    f"{peak:>16.1f}  {results['statuses']}"
+                )
+    finally:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Compare per-image RPCs with packed batch_annotate_images for the batch endpoint.
+
+    python -m benchmarks.bench_batch --images 40 --latency 0.08
+"""
+import argparse, os, time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from app.services import vision_client
+from app.services.ocr_service import OCRService
+from .common import bench_app
+from .fake_vision import FakeVisionClient
+
+
+def per_image(ocr: OCRService, contents: list):
+    """The previous /extract-text-batch strategy: one RPC per file, 10 threads."""
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        futures = [executor.submit(ocr.extract_text, c) for c in contents]
+        return [f.result() for f in as_completed(futures)]
+
+
+def packed(ocr: OCRService, contents: list):
+    return ocr.extract_text_batch(contents)
+
+
+def run(strategy, contents: list, latency: float, per_image_latency: float):
+    fake = FakeVisionClient(latency=latency, per_image_latency=per_image_latency)
+    vision_client.set_client(fake)
+    # Random bytes stand in for images here; skip the pre-flight header check
+    with bench_app(PREFLIGHT_ENABLED=False).app_context():
+        ocr = OCRService()
+        start = time.perf_counter()
+        strategy(ocr, contents)
+        elapsed = time.perf_counter() - start
+    return fake.rpc_count, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=40)
+    parser.add_argument("--image-bytes", type=int, default=200 * 1024)
+    parser.add_argument("--latency", type=float, default=0.08, help="seconds per RPC")
+    parser.add_argument(
+        "--per-image-latency", type=float, default=0.01, help="extra seconds per image"
+    )
+    args = parser.parse_args()
+
+    contents = [os.urandom(args.image_bytes) for _ in range(args.images)]
+    print(f"{args.images} images x {args.image_bytes // 1024} KB, "
+          f"{args.latency * 1000:.0f} ms/RPC + {args.per_image_latency * 1000:.0f} ms/image")
+    print(f"{'strategy':<12}{'rpcs':>6}{'wall ms':>10}")
+    for name, strategy in (("per-image", per_image), ("packed", packed)):
+        rpcs, elapsed = run(strategy, contents, args.latency, args.per_image_latency)
+        print(f"{name:<12}{rpcs:>6}{elapsed * 1000:>10.1f}")
+    vision_client.set_client_factory(None)
+
+
+if __name__ == "__main__":
+    main()
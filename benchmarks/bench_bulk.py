@@ -0,0 +1,90 @@
+"""Backfill throughput: sequential HTTP batch uploads vs the bulk CLI (python -m app.bulk).
+
+    python -m benchmarks.bench_bulk --images 320 --workers 4 --latency 0.2
+
+The HTTP baseline posts --http-batch images per /api/extract-text-batch
+request through the Flask test client, one request at a time, as the nightly
+backfill does (no network, so it understates the real cost). The CLI runs
+the same files in thread and process mode. Vision is an in-process fake.
+"""
+import argparse, os, tempfile, time
+from app.config import Config
+from app.services import vision_client
+from .bench_mosaic import label
+from .common import encode_multipart
+from .fake_vision import FakeVisionClient
+
+
+def http_baseline(paths: list, batch: int) -> float:
+    from app import create_app
+
+    client = create_app().test_client()
+    start = time.perf_counter()
+    for first in range(0, len(paths), batch):
+        files = []
+        for path in paths[first : first + batch]:
+            with open(path, "rb") as f:
+                files.append(("image", os.path.basename(path), f.read(), "image/png"))
+        body, content_type = encode_multipart(files)
+        response = client.post("/api/extract-text-batch", data=body, content_type=content_type)
+        assert response.status_code == 200, response.get_data(as_text=True)
+    return time.perf_counter() - start
+
+
+def cli(directory: str, output: str, mode: str, workers: int) -> float:
+    from app import bulk
+
+    args = [directory, "-o", output, "--mode", mode, "--workers", str(workers), "--progress", "0"]
+    start = time.perf_counter()
+    assert bulk.main(args) == 0
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=320)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per fake Vision RPC")
+    parser.add_argument("--http-batch", type=int, default=16)
+    args = parser.parse_args()
+
+    # Every image is new to Vision, and nothing but the transport should throttle
+    for name, value in {
+        "VISION_EMULATOR_HOST": "127.0.0.1:1",
+        "VISION_WARMUP": False,
+        "RATELIMIT_ENABLED": False,
+        "QUOTA_ENABLED": False,
+        "OCR_CACHE_ENABLED": False,
+    }.items():
+        setattr(Config, name, value)
+    fake = FakeVisionClient(latency=args.latency)
+    vision_client.set_client(fake)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        directory = os.path.join(workdir, "images")
+        os.mkdir(directory)
+        paths = []
+        for seed in range(args.images):
+            paths.append(os.path.join(directory, f"{seed:06d}.png"))
+            with open(paths[-1], "wb") as f:
+                f.write(label(seed))
+
+        workers = args.workers
+        threads, processes = (os.path.join(workdir, f"{m}.jsonl") for m in ("thread", "process"))
+        runs = [
+            ("http, sequential batches", lambda: http_baseline(paths, args.http_batch)),
+            (f"cli, {workers} threads", lambda: cli(directory, threads, "thread", workers)),
+            (f"cli, {workers} processes", lambda: cli(directory, processes, "process", workers)),
+            ("cli, rerun (all done)", lambda: cli(directory, threads, "thread", workers)),
+        ]
+
+        print(f"{args.images} images, {args.latency * 1000:.0f} ms per Vision RPC")
+        print(f"{'path':<28}{'seconds':>9}{'images/s':>10}")
+        for name, fn in runs:
+            seconds = fn()
+            print(f"{name:<28}{seconds:>9.2f}{args.images / seconds:>10.1f}")
+    vision_client.set_client_factory(None)
+
+
+if __name__ == "__main__":
+    main()
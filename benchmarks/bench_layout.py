@@ -0,0 +1,92 @@
+"""Per-request CPU of parsing a dense Vision annotation at each projection level.
+
+    python -m benchmarks.bench_layout --blocks 60 --paragraphs 5 --words 20
+"""
+import argparse, time
+from google.cloud import vision
+from app.services.layout import LEVELS, project
+
+BREAK = vision.TextAnnotation.DetectedBreak.BreakType
+
+
+def dense_annotation(blocks: int, paragraphs: int, words: int) -> vision.AnnotateImageResponse:
+    """A page shaped like a dense scan: every element has a box and a confidence."""
+
+    def poly(x, y):
+        return vision.BoundingPoly(
+            vertices=[
+                vision.Vertex(x=x, y=y),
+                vision.Vertex(x=x + 40, y=y),
+                vision.Vertex(x=x + 40, y=y + 12),
+                vision.Vertex(x=x, y=y + 12),
+            ]
+        )
+
+    space = vision.TextAnnotation.TextProperty(
+        detected_break=vision.TextAnnotation.DetectedBreak(type_=BREAK.SPACE)
+    )
+    page_blocks, text = [], []
+    for b in range(blocks):
+        block_paragraphs = []
+        for p in range(paragraphs):
+            block_words = []
+            for w in range(words):
+                token = f"word{b}{p}{w}"
+                symbols = [vision.Symbol(text=ch, confidence=0.9) for ch in token]
+                symbols[-1].property = space
+                block_words.append(
+                    vision.Word(symbols=symbols, confidence=0.9, bounding_box=poly(w * 45, p * 15))
+                )
+                text.append(token)
+            block_paragraphs.append(
+                vision.Paragraph(words=block_words, confidence=0.9, bounding_box=poly(0, p * 15))
+            )
+        page_blocks.append(
+            vision.Block(paragraphs=block_paragraphs, confidence=0.9, bounding_box=poly(0, b * 80))
+        )
+    annotation = vision.TextAnnotation(
+        text=" ".join(text), pages=[vision.Page(blocks=page_blocks)]
+    )
+    return vision.AnnotateImageResponse(full_text_annotation=annotation)
+
+
+def legacy_confidence(response) -> float:
+    """The previous parser: nested loops over the proto-plus wrappers."""
+    total_conf, count = 0.0, 0
+    for page in response.full_text_annotation.pages:
+        for block in page.blocks:
+            for paragraph in block.paragraphs:
+                for word in paragraph.words:
+                    if word.confidence:
+                        total_conf += word.confidence
+                        count += 1
+    return round(total_conf / count, 2) if count > 0 else 0.0
+
+
+def cpu_ms(fn, repeat: int) -> float:
+    start = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return (time.process_time() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--blocks", type=int, default=60)
+    parser.add_argument("--paragraphs", type=int, default=5)
+    parser.add_argument("--words", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    response = dense_annotation(args.blocks, args.paragraphs, args.words)
+    total_words = args.blocks * args.paragraphs * args.words
+    print(f"{total_words} words, {args.repeat} runs each")
+    print(f"{'projection':<22}{'cpu ms/request':>16}")
+    print(f"{'legacy (text)':<22}{cpu_ms(lambda: legacy_confidence(response), args.repeat):>16.2f}")
+    for level in LEVELS:
+        ms = cpu_ms(lambda: project(response.full_text_annotation, level), args.repeat)
+        print(f"{level:<22}{ms:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Throughput, Vision units and fidelity of mosaic packing for small images.
+
+    python -m benchmarks.bench_mosaic --images 96 --latency 0.25 --per-image-latency 0.02
+"""
+import argparse, io, random, time
+from PIL import Image, ImageDraw
+from app.services import vision_client
+from app.services.ocr_service import OCRService
+from .common import bench_app
+from .fake_vision import FakeVisionClient, read_boxes
+
+# Vision DOCUMENT_TEXT_DETECTION list price per 1000 units (after the free tier)
+PRICE_PER_1000 = 1.50
+
+
+def label(seed: int) -> bytes:
+    """A small crop (price tag, serial number...) with 1-3 dark 'words' on their own rows."""
+    rng = random.Random(seed)
+    width, height = rng.choice([(200, 120), (320, 160), (160, 240), (400, 100)])
+    img = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(img)
+    for row in range(max(1, min(3, (height - 20) // 40))):
+        w = rng.randint(3, (width - 40) // 10) * 10
+        x, y = rng.randint(10, width - w - 10), 10 + row * 40
+        draw.rectangle([x, y, x + w - 1, y + 19], fill="black")
+    out = io.BytesIO()
+    img.save(out, format="PNG")
+    return out.getvalue()
+
+
+def run(contents: list, mosaic: bool, latency: float, per_image_latency: float):
+    fake = FakeVisionClient(latency=latency, per_image_latency=per_image_latency, reader=read_boxes)
+    vision_client.set_client(fake)
+    with bench_app().app_context():
+        start = time.perf_counter()
+        results = OCRService().extract_text_batch(contents, mosaic)
+        elapsed = time.perf_counter() - start
+    return results, fake, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=96)
+    parser.add_argument("--latency", type=float, default=0.25, help="seconds per RPC")
+    parser.add_argument(
+        "--per-image-latency", type=float, default=0.02, help="extra seconds per image"
+    )
+    args = parser.parse_args()
+
+    contents = [label(seed) for seed in range(args.images)]
+    print(
+        f"{args.images} small images, {args.latency * 1000:.0f} ms/RPC "
+        f"+ {args.per_image_latency * 1000:.0f} ms/image"
+    )
+    print(f"{'strategy':<10}{'rpcs':>6}{'units':>7}{'$/1k imgs':>11}{'wall ms':>10}{'imgs/s':>9}{'same text':>11}")
+    baseline = None
+    for name, mosaic in (("packed", False), ("mosaic", True)):
+        results, fake, elapsed = run(contents, mosaic, args.latency, args.per_image_latency)
+        texts = [r["text"] if isinstance(r, dict) else None for r in results]
+        baseline = baseline or texts
+        same = sum(a == b and a is not None for a, b in zip(baseline, texts))
+        cost = fake.image_count / args.images * PRICE_PER_1000
+        print(
+            f"{name:<10}{fake.rpc_count:>6}{fake.image_count:>7}{cost:>11.3f}"
+            f"{elapsed * 1000:>10.1f}{args.images / elapsed:>9.1f}{same:>7}/{args.images}"
+        )
+    vision_client.set_client_factory(None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Lookup latency and memory of the perceptual-hash index at 1M entries.
+
+    python -m benchmarks.bench_phash --entries 1000000 --max-distance 15
+"""
+import argparse, random, resource, time
+from app.services.phash import HASH_BITS, PerceptualIndex
+from .common import summarize
+
+
+def flip(value: int, bits: int, rng: random.Random) -> int:
+    for bit in rng.sample(range(HASH_BITS), bits):
+        value ^= 1 << bit
+    return value
+
+
+def timed_lookups(index, queries: list) -> tuple:
+    """(latencies in ms, number of queries that found an entry)."""
+    latencies, found = [], 0
+    for query in queries:
+        start = time.perf_counter()
+        found += index.lookup(query) is not None
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies, found
+
+
+def brute_force(hashes: list, value: int, max_distance: int):
+    """The linear scan the index replaces."""
+    best = None
+    for i, h in enumerate(hashes):
+        distance = (h ^ value).bit_count()
+        if distance <= max_distance and (best is None or distance < best[1]):
+            best = (i, distance)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=1_000_000)
+    parser.add_argument("--max-distance", type=int, default=15)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--brute-queries", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    hashes = [rng.getrandbits(HASH_BITS) for _ in range(args.entries)]
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    index = PerceptualIndex(args.max_distance, args.entries)
+    start = time.perf_counter()
+    for i, value in enumerate(hashes):
+        index.add(value, f"{i:064x}")
+    build_s = time.perf_counter() - start
+    rss_mb = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before) / 1024
+
+    # Near queries: an indexed hash with up to max_distance bits flipped
+    near = [
+        flip(rng.choice(hashes), rng.randint(0, args.max_distance), rng)
+        for _ in range(args.queries)
+    ]
+    miss = [rng.getrandbits(HASH_BITS) for _ in range(args.queries)]
+
+    print(
+        f"{args.entries} entries, max distance {args.max_distance} "
+        f"({len(index._spans)} substrings, probe radius {index.radius}): built in {build_s:.1f}s, ~{rss_mb:.0f} MB"
+    )
+    print(f"{'queries':<14}{'found':>8}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}")
+    for name, queries in (("near", near), ("miss", miss)):
+        latencies, found = timed_lookups(index, queries)
+        stats = summarize(latencies)
+        print(
+            f"{name:<14}{found:>8}{stats['p50']:>10.3f}{stats['p99']:>10.3f}{stats['mean']:>10.3f}"
+        )
+
+    start = time.perf_counter()
+    for query in near[: args.brute_queries]:
+        brute_force(hashes, query, args.max_distance)
+    brute_ms = (time.perf_counter() - start) / args.brute_queries * 1000
+    print(f"{'brute force':<14}{'':>8}{'':>10}{'':>10}{brute_ms:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
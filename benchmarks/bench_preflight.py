@@ -0,0 +1,103 @@
+"""Cost of the pre-flight checks per image, and the Vision calls they save.
+
+    python -m benchmarks.bench_preflight --sizes 1000 2500 4000 --blank-share 0.2
+
+Pages are synthetic scans: paper-white with sensor noise and, unless blank,
+rows of dark "words". For each size and format the header parse (sniff +
+read_header) and the blank check are timed against a full pixel decode,
+which is what the check would cost without draft mode and a thumbnail.
+Then a batch of --documents pages, --blank-share of them blank plus one
+non-image, goes through OCRService with and without pre-flight.
+"""
+import argparse, io, random, time
+from PIL import Image, ImageDraw
+from app.services import vision_client
+from app.services.ocr_service import OCRService
+from app.services.preflight import Preflight, read_header
+from .common import bench_app, summarize
+from .fake_vision import FakeVisionClient
+
+
+def page(size: int, blank: bool, fmt: str, seed: int) -> bytes:
+    rng = random.Random(seed)
+    width, height = size, int(size * 1.414)
+    img = Image.effect_noise((width, height), 3).point(lambda v: 240 + (v - 128) // 16)
+    img = img.convert("RGB")
+    if not blank:
+        draw = ImageDraw.Draw(img)
+        line = max(8, size // 60)
+        for y in range(size // 10, height - size // 10, line * 2):
+            x = size // 10
+            while x < width - size // 5:
+                w = rng.randint(2, 8) * line // 2
+                draw.rectangle([x, y, x + w, y + line], fill=(30, 30, 30))
+                x += w + line
+    out = io.BytesIO()
+    img.save(out, format=fmt, **({"quality": 85} if fmt == "JPEG" else {}))
+    return out.getvalue()
+
+
+def full_decode(content: bytes):
+    with Image.open(io.BytesIO(content)) as img:
+        img.load()
+
+
+def timed(fn, content: bytes, repeat: int) -> float:
+    """Median milliseconds per call."""
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(content)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return summarize(latencies)["p50"]
+
+
+def batch(contents: list, enabled: bool, latency: float, per_image_latency: float) -> tuple:
+    fake = FakeVisionClient(latency=latency, per_image_latency=per_image_latency)
+    vision_client.set_client(fake)
+    app = bench_app(PREFLIGHT_ENABLED=enabled, PREPROCESS_ENABLED=False, OCR_CACHE_ENABLED=False)
+    with app.app_context():
+        start = time.perf_counter()
+        results = OCRService().extract_text_batch(contents)
+        elapsed = time.perf_counter() - start
+    answered = sum(1 for r in results if not isinstance(r, Exception))
+    return fake.image_count, answered, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 2500, 4000])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--documents", type=int, default=50)
+    parser.add_argument("--blank-share", type=float, default=0.2)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per RPC")
+    parser.add_argument("--per-image-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    preflight = Preflight()
+    print(f"{'page':<12}{'format':<7}{'KB':>7}{'header ms':>11}{'blank ms':>10}{'decode ms':>11}")
+    for size in args.sizes:
+        for fmt in ("JPEG", "PNG"):
+            content = page(size, False, fmt, size)
+            print(
+                f"{f'{size}px':<12}{fmt:<7}{len(content) // 1024:>7}"
+                f"{timed(read_header, content, args.repeat):>11.2f}"
+                f"{timed(preflight.is_blank, content, args.repeat):>10.1f}"
+                f"{timed(full_decode, content, args.repeat):>11.1f}"
+            )
+
+    blanks = round(args.documents * args.blank_share)
+    contents = [page(args.sizes[0], n < blanks, "JPEG", n) for n in range(args.documents)]
+    contents.append(b"%PDF-1.7 not an image")
+    print(f"\nbatch of {len(contents)} ({args.blank_share:.0%} blank, 1 non-image)")
+    print(f"{'pre-flight':<12}{'vision images':>15}{'answered':>10}{'wall ms':>10}")
+    for name, enabled in (("off", False), ("on", True)):
+        images, answered, elapsed = batch(
+            contents, enabled, args.latency, args.per_image_latency
+        )
+        print(f"{name:<12}{images:>15}{answered:>10}{elapsed * 1000:>10.0f}")
+    vision_client.set_client_factory(None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Payload size, preprocessing cost and OCR fidelity of the pre-upload stage.
+
+    python -m benchmarks.bench_preprocess                  # offline: size + CPU time
+    python -m benchmarks.bench_preprocess --vision         # also call Google Vision
+
+With --vision each variant is OCR'd for real (credentials required) and its
+text is compared with the text Vision returns for the untouched original.
+"""
+import argparse, difflib, glob, os, time
+from google.cloud import vision
+from app.config import Config
+from app.services import vision_client
+from app.services.preprocess import ImagePreprocessor
+
+VARIANTS = {
+    "original": None,
+    "max2048": ImagePreprocessor(max_dimension=2048),
+    "max1600": ImagePreprocessor(max_dimension=1600, quality=85),
+    "max1024": ImagePreprocessor(max_dimension=1024, quality=85),
+    "max1600-gray": ImagePreprocessor(max_dimension=1600, quality=85, grayscale=True),
+}
+
+
+def ocr(client, payload: bytes):
+    start = time.perf_counter()
+    response = client.document_text_detection(image=vision.Image(content=payload))
+    return response.full_text_annotation.text, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", default="sample_images/*")
+    parser.add_argument("--vision", action="store_true", help="call Google Vision")
+    args = parser.parse_args()
+
+    client = None
+    if args.vision:
+        Config.validate_credentials()
+        client = vision_client.build_client(vars(Config))
+
+    header = f"{'image':<20}{'variant':<14}{'bytes':>10}{'saved':>8}{'prep ms':>9}"
+    if client:
+        header += f"{'ocr ms':>9}{'fidelity':>10}"
+    print(header)
+
+    for path in sorted(glob.glob(args.images)):
+        with open(path, "rb") as f:
+            content = f.read()
+        reference = None
+        for name, preprocessor in VARIANTS.items():
+            start = time.perf_counter()
+            payload = content if preprocessor is None else preprocessor.process(content)[0]
+            prep_ms = (time.perf_counter() - start) * 1000
+            saved = 1 - len(payload) / len(content)
+            line = (
+                f"{os.path.basename(path):<20}{name:<14}{len(payload):>10}"
+                f"{saved:>8.0%}{prep_ms:>9.1f}"
+            )
+            if client:
+                text, ocr_ms = ocr(client, payload)
+                if reference is None:
+                    reference = text
+                fidelity = difflib.SequenceMatcher(None, reference, text).ratio()
+                line += f"{ocr_ms:>9.0f}{fidelity:>10.3f}"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Interactive latency while batch work saturates Vision, with and without priority classes.
+
+    python -m benchmarks.bench_priority --duration 10 --rate 20
+
+--batch-clients threads each send back-to-back batches of --batch-images
+images as backfill work (jobs, the bulk CLI), enough to keep every
+executor slot busy and the queue full. Meanwhile single images arrive
+--rate times a second. "priority" runs them as interactive calls;
+"fifo" puts them in the same class and under the same client key as the
+batches, i.e. one queue served in arrival order.
+"""
+import argparse, itertools, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from app.services import admission, resilience, vision_client
+from app.services.admission import Overloaded
+from app.services.ocr_service import OCRService
+from .common import bench_app, summarize
+from .fake_vision import FakeVisionClient
+
+_names = itertools.count()
+
+
+def unique_image() -> bytes:
+    # Distinct bytes, so neither single-flight nor the cache merges calls
+    return f"image-{next(_names)}".encode()
+
+
+def run(args, prioritized: bool) -> dict:
+    fake = FakeVisionClient(latency=args.latency, per_image_latency=args.per_image_latency)
+    vision_client.set_client(fake)
+    admission.reset()
+    resilience._tracker = resilience.LatencyTracker()
+    app = bench_app(
+        PREPROCESS_ENABLED=False,
+        PREFLIGHT_ENABLED=False,
+        OCR_CACHE_ENABLED=False,
+        VISION_ADAPTIVE_CONCURRENCY=False,
+        VISION_CONCURRENCY_LIMIT=args.slots,
+        VISION_CONCURRENCY_MIN=args.slots,
+        VISION_CONCURRENCY_MAX=args.slots,
+        VISION_QUEUE_SIZE=args.queue,
+        VISION_BATCH_MAX_IMAGES=args.chunk,
+        VISION_RETRY_MAX_ATTEMPTS=1,
+    )
+    interactive = ("interactive", "user") if prioritized else ("backfill", "bulk")
+    stop = threading.Event()
+    batch_images = [0]
+    lock = threading.Lock()
+
+    def batch_client():
+        with app.app_context():
+            while not stop.is_set():
+                ocr = OCRService(resilience.Deadline(60), priority="backfill", client_key="bulk")
+                images = [unique_image() for _ in range(args.batch_images)]
+                try:
+                    done = sum(
+                        1 for r in ocr.extract_text_batch(images) if not isinstance(r, Exception)
+                    )
+                except Overloaded as e:
+                    time.sleep(min(e.retry_after, 0.1))
+                    continue
+                with lock:
+                    batch_images[0] += done
+
+    def one_image():
+        with app.app_context():
+            start = time.perf_counter()
+            ocr = OCRService(
+                resilience.Deadline(args.deadline),
+                priority=interactive[0],
+                client_key=interactive[1],
+            )
+            try:
+                ocr.extract_text(unique_image())
+                ok = True
+            except Exception:
+                ok = False
+            return time.perf_counter() - start, ok
+
+    batches = [
+        threading.Thread(target=batch_client, daemon=True) for _ in range(args.batch_clients)
+    ]
+    for thread in batches:
+        thread.start()
+    time.sleep(args.warmup)  # let the batches fill the queue first
+
+    with ThreadPoolExecutor(max_workers=64) as pool:
+        futures = []
+        start = time.perf_counter()
+        for n in range(int(args.duration * args.rate)):
+            time.sleep(max(0.0, start + n / args.rate - time.perf_counter()))
+            futures.append(pool.submit(one_image))
+        outcomes = [f.result() for f in futures]
+        elapsed = time.perf_counter() - start
+    stop.set()
+    for thread in batches:
+        thread.join()
+
+    latencies = [latency for latency, ok in outcomes if ok]
+    return {
+        **summarize(latencies),
+        "failed": sum(1 for _, ok in outcomes if not ok),
+        "batch_rate": batch_images[0] / (elapsed + args.warmup),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=10, help="seconds of interactive load")
+    parser.add_argument("--rate", type=float, default=20, help="interactive images per second")
+    parser.add_argument("--batch-clients", type=int, default=8)
+    parser.add_argument("--batch-images", type=int, default=64)
+    parser.add_argument("--chunk", type=int, default=8, help="VISION_BATCH_MAX_IMAGES")
+    parser.add_argument("--slots", type=int, default=8, help="Vision calls in flight")
+    parser.add_argument("--queue", type=int, default=64, help="VISION_QUEUE_SIZE")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per RPC")
+    parser.add_argument("--per-image-latency", type=float, default=0.02)
+    parser.add_argument("--deadline", type=float, default=25)
+    parser.add_argument("--warmup", type=float, default=1)
+    args = parser.parse_args()
+
+    print(
+        f"{'scheduling':<12}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+        f"{'failed':>8}{'batch img/s':>13}"
+    )
+    for name, prioritized in (("fifo", False), ("priority", True)):
+        r = run(args, prioritized)
+        print(
+            f"{name:<12}{r['p50'] * 1000:>9.0f}{r['p95'] * 1000:>9.0f}{r['p99'] * 1000:>9.0f}"
+            f"{r['failed']:>8}{r['batch_rate']:>13.0f}"
+        )
+    vision_client.set_client_factory(None)
+
+
+if __name__ == "__main__":
+    main()
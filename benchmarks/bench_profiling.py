@@ -0,0 +1,102 @@
+"""Per-request cost of the profiling hooks: off, on but not sampled, and every request profiled.
+
+    python -m benchmarks.bench_profiling --requests 400 --interval-ms 1
+
+Requests go through the full Flask app (test client) with an instant fake
+Vision backend, so only the request-path CPU work is measured. A request
+this short gets a sample or two, so the hottest leaf frames are summed over
+all saved profiles, as a flamegraph of them would show.
+"""
+import argparse, os, tempfile, time
+from collections import Counter
+from app.config import Config
+from app.services import vision_client
+from .bench_mosaic import label
+from .common import encode_multipart, summarize
+from .fake_vision import FakeVisionClient
+
+MODES = {
+    "off": {"PROFILE_ENABLED": False},
+    "on, unsampled": {"PROFILE_ENABLED": True},
+    "every request": {"PROFILE_ENABLED": True, "PROFILE_SAMPLE_RATE": 1.0},
+}
+
+
+def build(overrides: dict):
+    from app import create_app
+
+    for name, value in overrides.items():
+        setattr(Config, name, value)
+    return create_app().test_client()
+
+
+def run(args) -> dict:
+    """Latencies per mode; requests alternate between the modes so drift hits all alike."""
+    clients = {name: build(overrides) for name, overrides in MODES.items()}
+    body, content_type = encode_multipart([("image", "label.png", label(7), "image/png")])
+    latencies = {name: [] for name in MODES}
+    for n in range(args.warmup + args.requests):
+        for name, client in clients.items():
+            start = time.perf_counter()
+            response = client.post("/api/extract-text", data=body, content_type=content_type)
+            if n >= args.warmup:
+                latencies[name].append(time.perf_counter() - start)
+            assert response.status_code == 200, response.get_data(as_text=True)
+    return latencies
+
+
+def leaf_frames(paths: list, top: int) -> list:
+    """(frame, share of samples) of the frames most often on top of the stack."""
+    leaves = Counter()
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                stack, count = line.rsplit(" ", 1)
+                leaves[stack.rsplit(";", 1)[-1]] += int(count)
+    total = sum(leaves.values()) or 1
+    return [(frame, count / total) for frame, count in leaves.most_common(top)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--interval-ms", type=float, default=1.0)
+    parser.add_argument("--top", type=int, default=8)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="bench-profiles-")
+    # No credentials or rate limits: the fake is injected and nothing should throttle
+    for name, value in {
+        "VISION_EMULATOR_HOST": "127.0.0.1:1",
+        "VISION_WARMUP": False,
+        "RATELIMIT_ENABLED": False,
+        "QUOTA_ENABLED": False,
+        "OCR_CACHE_ENABLED": False,
+        "PROFILE_DIR": directory,
+        "PROFILE_INTERVAL_MS": args.interval_ms,
+        "PROFILE_SAMPLE_RATE": 0.0,
+    }.items():
+        setattr(Config, name, value)
+    vision_client.set_client(FakeVisionClient())
+
+    print(f"{args.requests} requests, sampling every {args.interval_ms} ms when profiled")
+    print(f"{'mode':<16}{'mean ms':>9}{'p50 ms':>9}{'p99 ms':>9}{'overhead':>10}")
+    latencies = run(args)
+    baseline = summarize(latencies["off"])["mean"]
+    for name in MODES:
+        r = summarize(latencies[name])
+        print(
+            f"{name:<16}{r['mean'] * 1000:>9.2f}{r['p50'] * 1000:>9.2f}{r['p99'] * 1000:>9.2f}"
+            f"{(r['mean'] / baseline - 1) * 100:>9.1f}%"
+        )
+
+    paths = [os.path.join(directory, n) for n in os.listdir(directory) if n.endswith(".folded")]
+    print(f"\nhottest leaf frames over all {len(paths)} profiles:")
+    for frame, share in leaf_frames(paths, args.top):
+        print(f"{share * 100:>6.1f}%  {frame}")
+    vision_client.set_client_factory(None)
+
+
+if __name__ == "__main__":
+    main()
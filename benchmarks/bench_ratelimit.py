@@ -0,0 +1,93 @@
+"""Measure the rate limiter's own overhead per request, in-process and across workers.
+
+    python -m benchmarks.bench_ratelimit --checks 20000 --processes 4
+"""
+import argparse, multiprocessing, os, tempfile, time
+from limits import RateLimitItemPerMinute
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter
+from app.services.ratelimit import TokenBucketQuota
+from .common import summarize
+
+
+def time_calls(fn, n: int) -> list:
+    samples = []
+    for i in range(n):
+        start = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def limiter_check(uri: str):
+    limiter = FixedWindowRateLimiter(storage_from_string(uri))
+    item = RateLimitItemPerMinute(10**9)
+    return lambda i: limiter.hit(item, f"client-{i % 100}")
+
+
+def quota_check(path: str):
+    quota = TokenBucketQuota(path, images_per_minute=10**9, bytes_per_minute=10**12)
+    return lambda i: quota.consume(f"key-{i % 100}", 4, 256 * 1024)
+
+
+def _worker(factory, target: str, n: int, queue):
+    queue.put(time_calls(factory(target), n))
+
+
+def run_parallel(factory, target: str, n: int, processes: int) -> tuple:
+    """Every process hammers the same shared store, like gunicorn workers would."""
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.Queue()
+    workers = [
+        ctx.Process(target=_worker, args=(factory, target, n, queue))
+        for _ in range(processes)
+    ]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    samples = [s for _ in workers for s in queue.get()]
+    for w in workers:
+        w.join()
+    return samples, time.perf_counter() - start
+
+
+def report(name: str, samples: list, elapsed: float):
+    stats = summarize(samples)
+    print(
+        f"{name:<28}{stats['p50'] * 1e6:>9.1f}{stats['p99'] * 1e6:>9.1f}"
+        f"{len(samples) / elapsed:>12.0f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--checks", type=int, default=20000, help="checks per process")
+    parser.add_argument("--processes", type=int, default=4)
+    args = parser.parse_args()
+
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        limits_uri = "sqlite://" + os.path.join(tmp, "limits.sqlite3")
+        quota_path = os.path.join(tmp, "quota.sqlite3")
+
+        print(f"{'backend':<28}{'p50 us':>9}{'p99 us':>9}{'checks/s':>12}")
+        for name, factory, target in (
+            ("limiter memory://", limiter_check, "memory://"),
+            ("limiter sqlite://", limiter_check, limits_uri),
+            ("quota in-process", quota_check, ""),
+            ("quota sqlite file", quota_check, quota_path),
+        ):
+            start = time.perf_counter()
+            samples = time_calls(factory(target), args.checks)
+            report(name, samples, time.perf_counter() - start)
+
+        for name, factory, target in (
+            ("limiter sqlite://", limiter_check, limits_uri),
+            ("quota sqlite file", quota_check, quota_path),
+        ):
+            samples, elapsed = run_parallel(factory, target, args.checks, args.processes)
+            report(f"{name} x{args.processes} procs", samples, elapsed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Search index: indexing throughput through the writer thread and /api/search query latency.
+
+    python -m benchmarks.bench_search --documents 1000000
+
+Documents are synthetic OCR text: --words words each, drawn from a Zipf-
+distributed vocabulary, so a few terms appear in most documents and most
+appear in very few, as in real receipts and letters. They are generated in
+chunks outside the timings; each chunk is queued with SearchIndex.add() (the
+only part on the request path) and flush()ed, so documents/s covers the
+whole write path. Queries run against the finished index, in this process.
+"""
+import argparse, os, random, string, tempfile, time
+from app.services.search import SearchIndex
+from .common import summarize
+
+
+def vocabulary(size: int, rng: random.Random) -> list:
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 10))))
+    words = sorted(words)
+    rng.shuffle(words)
+    return words
+
+
+def documents(count: int, words: int, vocab: list, rng: random.Random):
+    weights = [1 / rank for rank in range(1, len(vocab) + 1)]
+    cumulative = [0.0] * len(weights)
+    total = 0.0
+    for n, w in enumerate(weights):
+        total += w
+        cumulative[n] = total
+    for n in range(count):
+        text = " ".join(rng.choices(vocab, cum_weights=cumulative, k=words))
+        yield f"{n:016x}", {"text": text, "confidence": 0.95, "metadata": {"width": 800}}
+
+
+def index_all(index: SearchIndex, args, vocab: list) -> tuple:
+    """(seconds spent adding + flushing, per-add latencies of a sample)."""
+    rng = random.Random(args.seed)
+    stream = documents(args.documents, args.words, vocab, rng)
+    seconds, add_latencies = 0.0, []
+    remaining = args.documents
+    while remaining:
+        chunk = [next(stream) for _ in range(min(args.chunk, remaining))]
+        remaining -= len(chunk)
+        start = time.perf_counter()
+        for digest, result in chunk:
+            before = time.perf_counter()
+            index.add(digest, "scan.png", result)
+            if len(add_latencies) < 100000:
+                add_latencies.append(time.perf_counter() - before)
+        index.flush(timeout=600)
+        seconds += time.perf_counter() - start
+    return seconds, add_latencies
+
+
+def query_latency(index: SearchIndex, query: str, repeat: int, offset: int = 0) -> tuple:
+    latencies, hits = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        hits, _ = index.search(query, 20, offset)
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies), len(hits)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=1000000)
+    parser.add_argument("--words", type=int, default=60, help="words per document")
+    parser.add_argument("--vocabulary", type=int, default=50000)
+    parser.add_argument("--chunk", type=int, default=20000, help="documents queued per flush")
+    parser.add_argument("--batch-size", type=int, default=256, help="SEARCH_BATCH_SIZE")
+    parser.add_argument("--max-candidates", type=int, default=10000, help="SEARCH_MAX_CANDIDATES")
+    parser.add_argument("--repeat", type=int, default=50, help="runs per query")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    vocab = vocabulary(args.vocabulary, random.Random(args.seed))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "search.sqlite3")
+        index = SearchIndex(
+            path, args.batch_size, queue_size=args.chunk, max_candidates=args.max_candidates
+        )
+        seconds, adds = index_all(index, args, vocab)
+        add = summarize(adds)
+        size = sum(os.path.getsize(os.path.join(directory, n)) for n in os.listdir(directory))
+        print(f"{index.count()} documents of {args.words} words, {args.vocabulary} word vocabulary")
+        print(
+            f"indexing: {args.documents / seconds:,.0f} documents/s, "
+            f"add() p50 {add['p50'] * 1e6:.1f} us, p99 {add['p99'] * 1e6:.1f} us, "
+            f"index {size / 2**20:,.0f} MB"
+        )
+
+        # By rank in the Zipf distribution: 1 is in nearly every document
+        common, frequent, rare = vocab[0], vocab[99], vocab[-1]
+        queries = [
+            ("most common word (rank 1)", common, 0),
+            ("rank 100 word", frequent, 0),
+            (f"rare word (rank {args.vocabulary})", rare, 0),
+            ("two words (rank 1 + 100)", f"{common} {frequent}", 0),
+            ("prefix (3 letters)", f"{frequent[:3]}*", 0),
+            ("rank 100, page 50", frequent, 1000),
+        ]
+        print(f"\n{'query':<30}{'p50 ms':>9}{'p99 ms':>9}{'hits':>6}")
+        for name, query, offset in queries:
+            r, hits = query_latency(index, query, args.repeat, offset)
+            print(f"{name:<30}{r['p50'] * 1000:>9.2f}{r['p99'] * 1000:>9.2f}{hits:>6}")
+
+
+if __name__ == "__main__":
+    main()
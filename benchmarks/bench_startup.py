@@ -0,0 +1,149 @@
+"""Cold-start cost: import time, create_app() and time to first (OCR) response.
+
+    python -m benchmarks.bench_startup --runs 5
+    python -m benchmarks.bench_startup --runs 3 --gunicorn --workers 2
+
+Each run is a fresh interpreter, as on a new Cloud Run instance. In-process
+mode times the stages of one process; --gunicorn starts the real server,
+with and without --preload, and times the first 200 from /api/health
+(liveness), /api/health/ready and /api/extract-text, measured from spawn.
+"""
+import argparse, http.client, json, os, signal, statistics, subprocess, sys, time
+from .common import encode_multipart
+from .fake_vision import FakeVisionClient, FakeVisionServer
+from .load_test import ROOT, load_images
+
+CHILD = r"""
+import json, os, sys, time
+start = time.perf_counter()
+BODY = sys.stdin.buffer.read()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+client = app.test_client()
+client.get("/api/health")
+live = time.perf_counter()
+while client.get("/api/health/ready").status_code != 200:
+    time.sleep(0.005)
+ready = time.perf_counter()
+response = client.post(
+    "/api/extract-text", data=BODY, content_type=os.environ["BENCH_CONTENT_TYPE"]
+)
+assert response.status_code == 200, response.get_data(as_text=True)
+ocr = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "create_app_ms": (created - imported) * 1000,
+    "first_health_ms": (live - start) * 1000,
+    "ready_ms": (ready - start) * 1000,
+    "first_ocr_ms": (ocr - start) * 1000,
+}))
+"""
+
+
+def server_env(emulator: str, **extra) -> dict:
+    return {
+        **os.environ,
+        "VISION_EMULATOR_HOST": emulator,
+        "RATELIMIT_ENABLED": "false",
+        "OCR_CACHE_ENABLED": "false",
+        "QUOTA_ENABLED": "false",
+        **extra,
+    }
+
+
+def in_process(emulator: str, body: bytes, content_type: str) -> dict:
+    """One fresh interpreter: stage timings from inside, whole process from outside."""
+    start = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD],
+        cwd=ROOT,
+        env=server_env(emulator, BENCH_CONTENT_TYPE=content_type),
+        input=body,
+        capture_output=True,
+        check=True,
+    ).stdout
+    result = json.loads(out.decode().strip().splitlines()[-1])
+    result["process_ms"] = (time.perf_counter() - start) * 1000
+    return result
+
+
+def first_ok(port: int, method: str, path: str, started: float, body=None, headers=None, timeout=60):
+    """ms from `started` until `path` first answers 200."""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            conn.request(method, path, body=body, headers=headers or {})
+            if conn.getresponse().status == 200:
+                return (time.perf_counter() - started) * 1000
+        except OSError:
+            pass
+        time.sleep(0.005)
+    sys.exit(f"{path} never answered 200")
+
+
+def under_gunicorn(emulator: str, port: int, workers: int, preload: bool, body: bytes, content_type: str) -> dict:
+    cmd = [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}", f"--workers={workers}", "run:app"]
+    env = server_env(emulator, GUNICORN_PRELOAD="true" if preload else "false")
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        cmd,
+        cwd=ROOT,
+        env=env,
+        start_new_session=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        return {
+            "first_health_ms": first_ok(port, "GET", "/api/health", started),
+            "ready_ms": first_ok(port, "GET", "/api/health/ready", started),
+            "first_ocr_ms": first_ok(
+                port, "POST", "/api/extract-text", started, body, {"Content-Type": content_type}
+            ),
+        }
+    finally:
+        os.killpg(server.pid, signal.SIGTERM)
+        server.wait(timeout=30)
+
+
+def report(title: str, runs: list):
+    print(title)
+    for key in runs[0]:
+        values = [r[key] for r in runs]
+        print(f"  {key:<16}{statistics.median(values):>9.1f} ms  (min {min(values):.1f}, max {max(values):.1f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--gunicorn", action="store_true", help="also time the gunicorn server")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--port", type=int, default=8098)
+    args = parser.parse_args()
+
+    fake = FakeVisionServer(FakeVisionClient()).start()
+    filename, image = load_images("sample_images/*.jpg")[0]
+    body, content_type = encode_multipart([("image", filename, image, "image/jpeg")])
+    try:
+        report(
+            f"in-process, {args.runs} fresh interpreters (median)",
+            [in_process(fake.address, body, content_type) for _ in range(args.runs)],
+        )
+        if args.gunicorn:
+            for preload in (False, True):
+                report(
+                    f"gunicorn --workers={args.workers}{' --preload' if preload else ''}, from spawn (median)",
+                    [
+                        under_gunicorn(fake.address, args.port, args.workers, preload, body, content_type)
+                        for _ in range(args.runs)
+                    ],
+                )
+    finally:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Tail latency of single-image OCR with and without retries and hedging.
+
+The fake backend is mostly fast, but a share of calls stall and a share fail:
+
+    python -m benchmarks.bench_tail --requests 300 --slow-rate 0.05 --error-rate 0.02
+"""
+import argparse, time
+from concurrent.futures import ThreadPoolExecutor
+from app.services import admission, resilience, vision_client
+from app.services.ocr_service import OCRService
+from .common import bench_app, summarize
+from .fake_vision import FakeVisionClient, parse_latency
+
+
+def run(args, **overrides) -> dict:
+    fake = FakeVisionClient(
+        latency_model=parse_latency(args.latency),
+        slow_rate=args.slow_rate,
+        slow_latency=args.slow_latency,
+        error_rate=args.error_rate,
+        seed=1,
+    )
+    vision_client.set_client(fake)
+    admission.reset()
+    resilience._tracker = resilience.LatencyTracker()
+    app = bench_app(PREPROCESS_ENABLED=False, PREFLIGHT_ENABLED=False, **overrides)
+
+    def one(_):
+        with app.app_context():
+            start = time.perf_counter()
+            try:
+                OCRService(resilience.Deadline(args.deadline)).extract_text(b"image")
+                ok = True
+            except Exception:
+                ok = False
+            return time.perf_counter() - start, ok
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        outcomes = list(pool.map(one, range(args.requests)))
+    latencies = [latency for latency, _ in outcomes]
+    return {
+        **summarize(latencies),
+        "errors": sum(1 for _, ok in outcomes if not ok),
+        "rpcs": fake.rpc_count,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", default="lognormal:0.05,0.3")
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-latency", type=float, default=1.5)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--deadline", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f"{'policy':<18}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}{'rpcs':>7}")
+    for name, overrides in (
+        ("no retries", {"VISION_RETRY_MAX_ATTEMPTS": 1}),
+        ("retries", {}),
+        ("retries + hedge", {"VISION_HEDGE_ENABLED": True, "VISION_HEDGE_MIN_SAMPLES": 20}),
+    ):
+        r = run(args, **overrides)
+        print(
+            f"{name:<18}{r['p50'] * 1000:>9.1f}{r['p95'] * 1000:>9.1f}"
+            f"{r['p99'] * 1000:>9.1f}{r['errors']:>8}{r['rpcs']:>7}"
+        )
+    vision_client.set_client_factory(None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Peak RSS of one large batch upload, fully in memory vs spooled and mmap'd.
+
+Each mode runs in a fresh process; the request body is streamed from a temp
+file so the client side doesn't count against the server's memory:
+
+    python -m benchmarks.bench_upload_memory --images 16 --image-mb 8
+"""
+import argparse, json, os, resource, subprocess, sys, tempfile, threading
+
+MODES = {
+    # Whole body parsed into memory and held as bytes, like file.read() did
+    "in-memory": {"UPLOAD_SPOOL_THRESHOLD": str(10**12)},
+    "spooled+mmap": {"UPLOAD_SPOOL_THRESHOLD": str(1024 * 1024)},
+}
+
+
+def status_mb(field: str) -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+class AnonSampler(threading.Thread):
+    """Track peak RssAnon: heap copies, as opposed to mmap'd file pages the
+    kernel can drop under pressure (those still show up in plain RSS)."""
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.peak = status_mb("RssAnon")
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(0.002):
+            self.peak = max(self.peak, status_mb("RssAnon"))
+
+
+def child(args):
+    from app import create_app
+    from app.services import vision_client
+    from .fake_vision import FakeVisionClient
+
+    vision_client.set_client(FakeVisionClient(per_image_latency=0.005))
+    app = create_app()
+    client = app.test_client()
+
+    with tempfile.TemporaryFile() as spool:
+        # Write the body one part at a time so building it doesn't set the peak
+        boundary = "bench-upload-memory"
+        for n in range(args.images):
+            spool.write(
+                f"--{boundary}\r\nContent-Disposition: form-data; name=\"image\"; "
+                f"filename=\"{n}.jpg\"\r\nContent-Type: image/jpeg\r\n\r\n".encode()
+            )
+            spool.write(os.urandom(args.image_mb * 2**20))
+            spool.write(b"\r\n")
+        spool.write(f"--{boundary}--\r\n".encode())
+        content_type = f"multipart/form-data; boundary={boundary}"
+        size = spool.tell()
+        spool.seek(0)
+        baseline = status_mb("RssAnon")
+        sampler = AnonSampler()
+        sampler.start()
+        response = client.post(
+            "/api/extract-text-batch",
+            input_stream=spool,
+            content_type=content_type,
+            content_length=size,
+        )
+        sampler.stopped.set()
+        sampler.join()
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    ok = sum(r["success"] for r in response.get_json()["results"])
+    print(json.dumps(
+        {"baseline_mb": baseline, "peak_anon_mb": sampler.peak, "peak_rss_mb": peak_rss, "ok": ok}
+    ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=16)
+    parser.add_argument("--image-mb", type=int, default=8)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args)
+
+    print(f"batch of {args.images} x {args.image_mb} MB")
+    print(f"{'mode':<14}{'anon base MB':>14}{'anon peak MB':>14}{'peak RSS MB':>13}{'ok':>5}")
+    for name, overrides in MODES.items():
+        env = {
+            **os.environ,
+            **overrides,
+            "VISION_EMULATOR_HOST": "127.0.0.1:1",  # no credentials; the fake is injected
+            "VISION_WARMUP": "false",
+            "RATELIMIT_ENABLED": "false",
+            "PREPROCESS_ENABLED": "false",
+            "PREFLIGHT_ENABLED": "false",  # the uploads are random bytes
+            "OCR_CACHE_ENABLED": "false",
+            "MAX_CONTENT_LENGTH": str(2**31),
+        }
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_upload_memory", "--child",
+             "--images", str(args.images), "--image-mb", str(args.image_mb)],
+            env=env, capture_output=True, text=True, check=True,
+        ).stdout.strip().splitlines()[-1]
+        r = json.loads(out)
+        print(
+            f"{name:<14}{r['baseline_mb']:>14.0f}{r['peak_anon_mb']:>14.0f}"
+            f"{r['peak_rss_mb']:>13.0f}{r['ok']:>5}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import statistics, subprocess, uuid
+from flask import Flask
+from app.config import Config
+
+
+def bench_app(**overrides) -> Flask:
+    """Bare Flask app with the service config, for driving OCRService offline.
+
+    Unlike create_app() it needs no Google credentials; pair it with
+    vision_client.set_client(FakeVisionClient(...)).
+    """
+    app = Flask("benchmarks")
+    app.config.from_object(Config)
+    app.config.update(overrides)
+    app.extensions["ocr_cache"] = None
+    return app
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(values: list) -> dict:
+    return {
+        "mean": statistics.fmean(values) if values else 0.0,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+    }
+
+
+def encode_multipart(files: list) -> tuple:
+    """Encode [(field, filename, content, mimetype)] as multipart/form-data."""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for field, filename, content, mimetype in files:
+        parts.append(
+            (
+                f"--{boundary}\r\n"
+                f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+                f"Content-Type: {mimetype}\r\n\r\n"
+            ).encode("utf-8")
+            + content
+            + b"\r\n"
+        )
+    body = b"".join(parts) + f"--{boundary}--\r\n".encode("utf-8")
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
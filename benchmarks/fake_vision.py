@@ -0,0 +1,320 @@
+"""Offline stand-ins for Google Cloud Vision.
+
+FakeVisionClient replaces the client in-process (inject it with
+vision_client.set_client; AsyncFakeVisionClient for the asyncio stack).
+FakeVisionServer speaks the real gRPC protocol, so the full gunicorn stack
+can be pointed at it with VISION_EMULATOR_HOST:
+
+    python -m benchmarks.fake_vision --port 50051 --latency lognormal:0.15,0.4 --error-rate 0.01
+"""
+import argparse, asyncio, io, json, math, random, threading, time, zlib
+from concurrent import futures
+import grpc
+from PIL import Image, ImageDraw
+from google.api_core.exceptions import DeadlineExceeded, ServiceUnavailable
+from google.cloud import vision
+
+SERVICE = "google.cloud.vision.v1.ImageAnnotator"
+
+
+def make_annotation(text: str, confidence: float = 0.95) -> vision.AnnotateImageResponse:
+    """Build a document_text_detection response with one word per token of `text`."""
+    words = [
+        vision.Word(
+            confidence=confidence,
+            symbols=[vision.Symbol(text=ch, confidence=confidence) for ch in token],
+        )
+        for token in text.split()
+    ]
+    page = vision.Page(
+        blocks=[vision.Block(paragraphs=[vision.Paragraph(words=words)])]
+    )
+    return vision.AnnotateImageResponse(
+        full_text_annotation=vision.TextAnnotation(text=text, pages=[page])
+    )
+
+
+def read_boxes(content: bytes) -> vision.AnnotateImageResponse:
+    """A fake OCR engine that actually looks at the pixels.
+
+    Every dark rectangle is read as one word named after its size in tens of
+    pixels ("12x3" for 120x30), with its real bounding box, in top-to-bottom,
+    left-to-right order. Good enough to check where words land, e.g. when
+    several images share one mosaic canvas.
+    """
+    with Image.open(io.BytesIO(content)) as img:
+        ink = img.convert("L").point(lambda v: 255 if v < 128 else 0)
+    draw = ImageDraw.Draw(ink)
+    found = []
+    while True:
+        bbox = ink.getbbox()
+        if bbox is None:
+            break
+        # Walk right and down from the top-left dark pixel to find the rectangle
+        top = bbox[1]
+        left = bbox[0] + ink.crop((bbox[0], top, bbox[2], top + 1)).tobytes().index(255)
+        right, bottom = left, top
+        while right + 1 < ink.width and ink.getpixel((right + 1, top)):
+            right += 1
+        while bottom + 1 < ink.height and ink.getpixel((left, bottom + 1)):
+            bottom += 1
+        # Erase it with a small margin so compression fringes don't read as words
+        draw.rectangle([left - 2, top - 2, right + 2, bottom + 2], fill=0)
+        found.append((top, left, right + 1, bottom + 1))
+
+    line_break = vision.TextAnnotation.TextProperty(
+        detected_break=vision.TextAnnotation.DetectedBreak(
+            type_=vision.TextAnnotation.DetectedBreak.BreakType.LINE_BREAK
+        )
+    )
+    paragraphs, texts = [], []
+    for top, left, right, bottom in sorted(found):
+        text = f"{round((right - left) / 10)}x{round((bottom - top) / 10)}"
+        poly = vision.BoundingPoly(
+            vertices=[
+                vision.Vertex(x=left, y=top),
+                vision.Vertex(x=right, y=top),
+                vision.Vertex(x=right, y=bottom),
+                vision.Vertex(x=left, y=bottom),
+            ]
+        )
+        symbols = [vision.Symbol(text=ch, confidence=0.9) for ch in text]
+        symbols[-1].property = line_break
+        word = vision.Word(symbols=symbols, confidence=0.9, bounding_box=poly)
+        paragraphs.append(vision.Paragraph(words=[word], confidence=0.9, bounding_box=poly))
+        texts.append(text)
+    page = vision.Page(blocks=[vision.Block(paragraphs=paragraphs, confidence=0.9)])
+    return vision.AnnotateImageResponse(
+        full_text_annotation=vision.TextAnnotation(text="\n".join(texts), pages=[page])
+    )
+
+
+def parse_latency(spec: str, rng: random.Random = None):
+    """Parse a latency distribution into a callable returning seconds.
+
+    constant:0.1 | uniform:0.05,0.2 | normal:0.1,0.02 | lognormal:median,sigma
+    """
+    rng = rng or random.Random()
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v]
+    if kind == "constant":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        median, sigma = values
+        return lambda: median * math.exp(rng.gauss(0.0, sigma))
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class FakeVisionClient:
+    """Offline stand-in for vision.ImageAnnotatorClient.
+
+    Every RPC sleeps `latency` seconds (or a draw from `latency_model`) plus
+    `per_image_latency` per image, fails with UNAVAILABLE at `error_rate`, and
+    answers each image with a canned annotation. With several `annotations`,
+    the text is chosen from a checksum of the image bytes, so the same image
+    always reads the same. RPC and image counts are recorded.
+
+    For tail-latency tests, `slow_rate` of the calls take `slow_latency`
+    instead, `fail_first` makes the first N calls fail, and a call that would
+    outlast its `timeout` raises DeadlineExceeded when the timeout expires.
+    A `reader(content)` (e.g. read_boxes) replaces the canned annotations.
+    """
+
+    def __init__(
+        self,
+        text: str = "Hello World",
+        confidence: float = 0.95,
+        latency: float = 0.0,
+        per_image_latency: float = 0.0,
+        latency_model=None,
+        error_rate: float = 0.0,
+        annotations: list = None,
+        seed: int = None,
+        slow_rate: float = 0.0,
+        slow_latency: float = 0.0,
+        fail_first: int = 0,
+        reader=None,
+    ):
+        self.response = make_annotation(text, confidence)
+        self.annotations = [make_annotation(t, confidence) for t in annotations or []]
+        self.latency = latency
+        self.per_image_latency = per_image_latency
+        self.latency_model = latency_model
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.fail_first = fail_first
+        self.reader = reader
+        self.rpc_count = 0
+        self.image_count = 0
+        self.error_count = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _record(self, images: int, timeout: float = None):
+        delay, failed = self._draw(images)
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise DeadlineExceeded("fake Vision backend: deadline exceeded")
+        if delay:
+            time.sleep(delay)
+        if failed:
+            raise ServiceUnavailable("fake Vision backend: injected failure")
+
+    def _draw(self, images: int):
+        """Count one RPC and decide its (delay in seconds, failed)."""
+        with self._lock:
+            self.rpc_count += 1
+            self.image_count += images
+            failed = self.rpc_count <= self.fail_first or (
+                self.error_rate and self._rng.random() < self.error_rate
+            )
+            if failed:
+                self.error_count += 1
+            slow = self.slow_rate and self._rng.random() < self.slow_rate
+        base = self.latency_model() if self.latency_model else self.latency
+        return (self.slow_latency if slow else base) + self.per_image_latency * images, failed
+
+    def annotate(self, request) -> vision.AnnotateImageResponse:
+        if self.reader is not None:
+            try:
+                return self.reader(request.image.content)
+            except Exception:
+                # Like Vision: an unreadable image fails alone, not its batch
+                return vision.AnnotateImageResponse(error={"code": 3, "message": "Bad image data."})
+        if self.annotations:
+            index = zlib.crc32(request.image.content) % len(self.annotations)
+            return vision.AnnotateImageResponse(self.annotations[index])
+        return vision.AnnotateImageResponse(self.response)
+
+    def batch_annotate_images(self, request=None, *, requests=None, timeout=None, **kwargs):
+        requests = list(requests if requests is not None else request.requests)
+        self._record(len(requests), timeout)
+        return vision.BatchAnnotateImagesResponse(
+            responses=[self.annotate(r) for r in requests]
+        )
+
+    def document_text_detection(self, image, **kwargs):
+        request = vision.AnnotateImageRequest(
+            image=image,
+            features=[vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)],
+        )
+        return self.batch_annotate_images(requests=[request], **kwargs).responses[0]
+
+
+class AsyncFakeVisionClient:
+    """FakeVisionClient behind vision.ImageAnnotatorAsyncClient's interface.
+
+    Same latency model, failures and counters (read through to `backend`),
+    but an RPC awaits asyncio.sleep instead of holding a thread. Inject it
+    with vision_client.set_async_client_factory.
+    """
+
+    def __init__(self, backend: FakeVisionClient = None, **kwargs):
+        self.backend = backend or FakeVisionClient(**kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    async def batch_annotate_images(self, request=None, *, requests=None, timeout=None, **kwargs):
+        requests = list(requests if requests is not None else request.requests)
+        delay, failed = self.backend._draw(len(requests))
+        if timeout is not None and delay > timeout:
+            await asyncio.sleep(timeout)
+            raise DeadlineExceeded("fake Vision backend: deadline exceeded")
+        if delay:
+            await asyncio.sleep(delay)
+        if failed:
+            raise ServiceUnavailable("fake Vision backend: injected failure")
+        return vision.BatchAnnotateImagesResponse(
+            responses=[self.backend.annotate(r) for r in requests]
+        )
+
+
+class FakeVisionServer:
+    """gRPC ImageAnnotator server backed by a FakeVisionClient.
+
+    document_text_detection and annotate_image are client-side helpers over
+    BatchAnnotateImages, so that is the only method served.
+    """
+
+    def __init__(self, backend: FakeVisionClient, port: int = 0, max_workers: int = 64):
+        self.backend = backend
+        self.server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers))
+        handler = grpc.method_handlers_generic_handler(
+            SERVICE,
+            {
+                "BatchAnnotateImages": grpc.unary_unary_rpc_method_handler(
+                    self._batch_annotate_images,
+                    request_deserializer=vision.BatchAnnotateImagesRequest.deserialize,
+                    response_serializer=vision.BatchAnnotateImagesResponse.serialize,
+                )
+            },
+        )
+        self.server.add_generic_rpc_handlers((handler,))
+        self.port = self.server.add_insecure_port(f"127.0.0.1:{port}")
+
+    @property
+    def address(self) -> str:
+        return f"127.0.0.1:{self.port}"
+
+    def _batch_annotate_images(self, request, context):
+        try:
+            return self.backend.batch_annotate_images(
+                request, timeout=context.time_remaining()
+            )
+        except ServiceUnavailable as e:
+            context.abort(grpc.StatusCode.UNAVAILABLE, str(e))
+        except DeadlineExceeded as e:
+            context.abort(grpc.StatusCode.DEADLINE_EXCEEDED, str(e))
+
+    def start(self):
+        self.server.start()
+        return self
+
+    def stop(self, grace: float = None):
+        self.server.stop(grace)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local fake Vision gRPC server")
+    parser.add_argument("--port", type=int, default=50051)
+    parser.add_argument(
+        "--latency", default="constant:0", help="e.g. lognormal:0.15,0.4 (seconds)"
+    )
+    parser.add_argument("--per-image-latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="share of slow calls")
+    parser.add_argument("--slow-latency", type=float, default=0.0, help="seconds")
+    parser.add_argument(
+        "--annotations", help="JSON file with a list of texts to answer with"
+    )
+    args = parser.parse_args()
+
+    annotations = None
+    if args.annotations:
+        with open(args.annotations, encoding="utf-8") as f:
+            annotations = json.load(f)
+
+    backend = FakeVisionClient(
+        latency_model=parse_latency(args.latency),
+        per_image_latency=args.per_image_latency,
+        error_rate=args.error_rate,
+        annotations=annotations,
+        slow_rate=args.slow_rate,
+        slow_latency=args.slow_latency,
+    )
+    server = FakeVisionServer(backend, args.port).start()
+    print(f"Fake Vision listening on {server.address} (VISION_EMULATOR_HOST={server.address})")
+    try:
+        server.server.wait_for_termination()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
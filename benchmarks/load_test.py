@@ -0,0 +1,217 @@
+"""End-to-end load test of the gunicorn stack against the fake Vision server.
+
+    python -m benchmarks.load_test --endpoint single --concurrency 16 --requests 400
+    python -m benchmarks.load_test --endpoint batch --batch-size 10 --compare benchmarks/results/<old>.json
+
+Starts benchmarks.fake_vision in-process, launches gunicorn pointed at it via
+VISION_EMULATOR_HOST (rate limiting and the result cache are disabled so every
+request reaches Vision), drives the endpoint at a fixed concurrency, and
+reports latency percentiles, throughput and per-worker memory. Results are
+written to benchmarks/results/ tagged with the git revision.
+"""
+import argparse, glob, http.client, json, os, signal, subprocess, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from .common import encode_multipart, git_revision, summarize
+from .fake_vision import FakeVisionClient, FakeVisionServer, parse_latency
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+PATHS = {"single": "/api/extract-text", "batch": "/api/extract-text-batch"}
+
+
+def load_images(pattern: str) -> list:
+    images = []
+    for path in sorted(glob.glob(os.path.join(ROOT, pattern))):
+        with open(path, "rb") as f:
+            images.append((os.path.basename(path), f.read()))
+    if not images:
+        sys.exit(f"No images match {pattern}")
+    return images
+
+
+def start_server(args, emulator: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "VISION_EMULATOR_HOST": emulator,
+        "RATELIMIT_ENABLED": "false",
+        "OCR_CACHE_ENABLED": "false",
+    }
+    cmd = args.server_cmd.format(port=args.port, workers=args.workers, threads=args.threads)
+    return subprocess.Popen(cmd.split(), cwd=ROOT, env=env, start_new_session=True)
+
+
+def wait_ready(port: int, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/api/health/ready")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.1)
+    sys.exit("Server did not become healthy")
+
+
+def worker_memory(master_pid: int) -> list:
+    """RSS and peak RSS (MB) of each child of the gunicorn master, from /proc."""
+    try:
+        with open(f"/proc/{master_pid}/task/{master_pid}/children") as f:
+            pids = [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+    workers = []
+    for pid in pids:
+        fields = {}
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    key, _, value = line.partition(":")
+                    if key in ("VmRSS", "VmHWM"):
+                        fields[key] = int(value.split()[0]) / 1024
+        except OSError:
+            continue
+        workers.append({"pid": pid, "rss_mb": fields.get("VmRSS"), "peak_rss_mb": fields.get("VmHWM")})
+    return workers
+
+
+def drive(args, images: list) -> dict:
+    path = PATHS[args.endpoint]
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+    local = threading.local()
+    counter = iter(range(args.requests))
+
+    def one_request(i):
+        conn = getattr(local, "conn", None)
+        if conn is None:
+            conn = local.conn = http.client.HTTPConnection("127.0.0.1", args.port, timeout=120)
+        if args.endpoint == "single":
+            name, content = images[i % len(images)]
+            files = [("image", name, content, "image/jpeg")]
+        else:
+            files = [
+                ("image", name, content, "image/jpeg")
+                for name, content in (images[(i + k) % len(images)] for k in range(args.batch_size))
+            ]
+        body, content_type = encode_multipart(files)
+        start = time.perf_counter()
+        try:
+            conn.request("POST", path, body=body, headers={"Content-Type": content_type})
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+        except OSError:
+            local.conn = None
+            status = "connection-error"
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    def loop():
+        for i in counter:
+            one_request(i)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for _ in range(args.concurrency):
+            executor.submit(loop)
+    wall = time.perf_counter() - start
+
+    images_sent = args.requests * (1 if args.endpoint == "single" else args.batch_size)
+    return {
+        "latency_ms": summarize(latencies),
+        "requests_per_second": args.requests / wall,
+        "images_per_second": images_sent / wall,
+        "wall_seconds": wall,
+        "statuses": statuses,
+    }
+
+
+def compare(current: dict, baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline_path} ({baseline.get('revision')}):")
+    rows = [(f"p{p}", "latency_ms", f"p{p}") for p in (50, 95, 99)]
+    for label, group, key in rows:
+        old, new = baseline[group][key], current[group][key]
+        print(f"  {label:<6}{old:>10.1f} -> {new:>10.1f} ms  ({(new - old) / old:+.1%})")
+    old, new = baseline["requests_per_second"], current["requests_per_second"]
+    print(f"  {'rps':<6}{old:>10.1f} -> {new:>10.1f}     ({(new - old) / old:+.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--endpoint", choices=PATHS, default="single")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--images", default="sample_images/*.jpg")
+    parser.add_argument("--latency", default="lognormal:0.15,0.4", help="fake Vision RPC latency")
+    parser.add_argument("--per-image-latency", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument(
+        "--server-cmd",
+        default="gunicorn --bind 127.0.0.1:{port} --workers={workers} --threads={threads} run:app",
+    )
+    parser.add_argument("--label", default="", help="suffix for the results file name")
+    parser.add_argument("--compare", help="previous results JSON to diff against")
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    backend = FakeVisionClient(
+        latency_model=parse_latency(args.latency),
+        per_image_latency=args.per_image_latency,
+        error_rate=args.error_rate,
+    )
+    fake = FakeVisionServer(backend).start()
+    server = start_server(args, fake.address)
+    try:
+        wait_ready(args.port)
+        results = drive(args, images)
+        results["workers"] = worker_memory(server.pid)
+    finally:
+        os.killpg(server.pid, signal.SIGTERM)
+        server.wait(timeout=30)
+        fake.stop()
+
+    results.update(
+        revision=git_revision(),
+        timestamp=time.strftime("%Y-%m-%dT%H:%M:%S"),
+        config={k: v for k, v in vars(args).items() if k not in ("compare",)},
+        vision_rpcs=backend.rpc_count,
+    )
+
+    latency = results["latency_ms"]
+    print(
+        f"{args.endpoint}: {args.requests} requests @ {args.concurrency} concurrent, "
+        f"{args.workers} workers x {args.threads} threads"
+    )
+    print(
+        f"  p50 {latency['p50']:.1f} ms  p95 {latency['p95']:.1f} ms  p99 {latency['p99']:.1f} ms"
+    )
+    print(
+        f"  {results['requests_per_second']:.1f} req/s  {results['images_per_second']:.1f} images/s  "
+        f"statuses {results['statuses']}  vision rpcs {backend.rpc_count}"
+    )
+    for worker in results["workers"]:
+        print(f"  worker {worker['pid']}: rss {worker['rss_mb']:.1f} MB, peak {worker['peak_rss_mb']:.1f} MB")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    name = f"{results['revision']}-{args.endpoint}{'-' + args.label if args.label else ''}.json"
+    path = os.path.join(RESULTS_DIR, name)
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"  saved {os.path.relpath(path, ROOT)}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
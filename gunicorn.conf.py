@@ -0,0 +1,41 @@
+# Loaded automatically by gunicorn from the working directory.
+# Bind address and worker count come from the command line (see Dockerfile).
+import os, shutil, tempfile
+
+# Each worker writes its Prometheus samples here; /metrics merges them
+multiproc_dir = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "ocr-prometheus")
+)
+# Created here, not in on_starting: with preload_app the master imports
+# app.utils.metrics before any server hook runs. Samples from a previous run
+# would be merged into this one's.
+shutil.rmtree(multiproc_dir, ignore_errors=True)
+os.makedirs(multiproc_dir, exist_ok=True)
+
+# Rate-limit counters and quota buckets live in one file on tmpfs, so limits
+# apply to the whole instance instead of being multiplied by the worker count
+shared_dir = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+os.environ.setdefault(
+    "RATELIMIT_STORAGE_URI", "sqlite://" + os.path.join(shared_dir, "ocr_ratelimit.sqlite3")
+)
+os.environ.setdefault("QUOTA_DB_PATH", os.path.join(shared_dir, "ocr_quota.sqlite3"))
+
+# Import the app (and the Vision library) once in the master and fork workers
+# from it, instead of every worker paying the imports on a cold instance.
+# Vision channels are not fork-safe, so each worker opens its own in post_fork.
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+if preload_app:
+    os.environ["VISION_WARMUP_AFTER_FORK"] = "true"
+
+
+def post_fork(server, worker):
+    if preload_app:
+        from app.services import vision_client
+
+        vision_client.start_warm_up()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,5 +1,7 @@
 import pytest
 from app import create_app
+from app.services import vision_client
+from benchmarks.fake_vision import FakeVisionClient
 
 
 @pytest.fixture
@@ -9,3 +11,12 @@ def client():
 
     with app.test_client() as client:
         yield client
+
+
+@pytest.fixture
+def fake_vision():
+    """Route every Vision call in the process to an offline fake client."""
+    fake = FakeVisionClient()
+    vision_client.set_client(fake)
+    yield fake
+    vision_client.set_client_factory(None)
@@ -0,0 +1,121 @@
+import io, threading
+
+import pytest
+
+from app.services import admission
+from app.services.admission import AIMDLimit, Overloaded, Ticket, VisionExecutor
+from benchmarks.bench_mosaic import label
+
+
+@pytest.fixture
+def tiny_executor():
+    """Replace the process-wide executor with one slot and one queue place."""
+    executor = VisionExecutor(AIMDLimit(1, 1, 1, adaptive=False), max_queue=1)
+    admission._executor = executor
+    yield executor
+    admission.reset()
+
+
+def test_aimd_grows_on_fast_success_and_halves_on_error():
+    limit = AIMDLimit(initial=4, min_limit=2, max_limit=8, latency_target=1.0)
+    for _ in range(4):
+        limit.on_success(0.1)
+    assert limit.limit == 4 and limit._limit > 4.9
+    limit.on_error()
+    assert limit.limit == 2
+    halved = limit._limit
+    # A second failure inside the cooldown doesn't shrink it again
+    limit.on_error()
+    assert limit._limit == halved
+    limit.on_success(5.0)  # slower than target counts as congestion
+    assert limit.limit == 2
+
+
+def test_executor_queues_then_sheds():
+    gate = threading.Event()
+    executor = VisionExecutor(AIMDLimit(1, 1, 1, adaptive=False), max_queue=1)
+
+    running = executor.submit(gate.wait)
+    queued = executor.submit(lambda: "queued")
+    with pytest.raises(Overloaded) as shed:
+        executor.submit(lambda: "shed")
+    assert shed.value.retry_after >= 1
+    assert executor.stats()["queued"] == 1
+
+    gate.set()
+    assert running.result(timeout=2) is True
+    assert queued.result(timeout=2) == "queued"
+
+
+def test_executor_drops_work_that_waited_too_long():
+    gate = threading.Event()
+    executor = VisionExecutor(
+        AIMDLimit(1, 1, 1, adaptive=False), max_queue=1, queue_timeout=0
+    )
+    executor.submit(gate.wait)
+    stale = executor.submit(lambda: "stale")
+    gate.set()
+    with pytest.raises(Overloaded):
+        stale.result(timeout=2)
+
+
+def test_higher_priority_call_preempts_the_newest_lower_one():
+    gate = threading.Event()
+    executor = VisionExecutor(AIMDLimit(1, 1, 1, adaptive=False), max_queue=1)
+    executor.submit(gate.wait, ticket=Ticket("interactive"))
+    backfill = executor.submit(lambda: "backfill", ticket=Ticket("backfill"))
+    interactive = executor.submit(lambda: "interactive", ticket=Ticket("interactive"))
+
+    assert isinstance(backfill.exception(timeout=1), Overloaded)
+    # Nothing below interactive is queued now, so another one is refused
+    with pytest.raises(Overloaded):
+        executor.submit(lambda: "refused", ticket=Ticket("interactive"))
+    gate.set()
+    assert interactive.result(timeout=2) == "interactive"
+
+
+def test_queued_call_fails_when_its_class_wait_runs_out():
+    gate = threading.Event()
+    executor = VisionExecutor(
+        AIMDLimit(1, 1, 1, adaptive=False), max_queue=4, max_wait={"interactive": 0.1}
+    )
+    executor.submit(gate.wait)
+    interactive = executor.submit(lambda: "late", ticket=Ticket("interactive"))
+    batch = executor.submit(lambda: "batch")
+    try:
+        # Fails while the slot is still busy, not when the slot frees up
+        assert isinstance(interactive.exception(timeout=1), Overloaded)
+        assert executor.stats()["queued_by_priority"] == {
+            "interactive": 0, "batch": 1, "backfill": 0
+        }
+    finally:
+        gate.set()
+    assert batch.result(timeout=2) == "batch"
+
+
+def test_extract_text_returns_503_with_retry_after_when_full(
+    client, fake_vision, tiny_executor
+):
+    gate = threading.Event()
+    # Interactive fillers: a lower class would be preempted by the upload
+    tiny_executor.submit(gate.wait, ticket=Ticket("interactive"))
+    tiny_executor.submit(gate.wait, ticket=Ticket("interactive"))
+    try:
+        response = client.post(
+            "/api/extract-text",
+            data={"image": (io.BytesIO(label(0)), "test.png")},
+            content_type="multipart/form-data",
+        )
+        assert response.status_code == 503
+        assert int(response.headers["Retry-After"]) >= 1
+
+        batch = client.post(
+            "/api/extract-text-batch",
+            data={"image": [(io.BytesIO(label(1)), "a.png")]},
+            content_type="multipart/form-data",
+        )
+        assert batch.status_code == 503
+        assert "Retry-After" in batch.headers
+    finally:
+        gate.set()
+    assert fake_vision.rpc_count == 0
@@ -97,10 +97,10 @@ def test_extract_text_batch_success(client):
     img2.name = "image2.png"
 
     with (
-        patch("app.services.ocr_service.OCRService.extract_text") as mock_ocr,
+        patch("app.services.ocr_service.OCRService.extract_text_batch") as mock_ocr,
         patch("app.services.ocr_service.OCRService.extract_metadata") as mock_meta,
     ):
-        mock_ocr.side_effect = [
+        mock_ocr.return_value = [
             {"text": "Hello", "confidence": 0.9, "processing_time_ms": 10},
             {"text": "World", "confidence": 0.8, "processing_time_ms": 12},
         ]
@@ -0,0 +1,184 @@
+import asyncio, json, time
+
+import pytest
+
+from app.asgi import create_asgi_app
+from app.config import Config
+from app.services import resilience, vision_client
+from app.services.ocr_service import OCRService
+from app.services.resilience import LatencyTracker
+from benchmarks.bench_mosaic import label
+from benchmarks.common import encode_multipart
+from benchmarks.fake_vision import AsyncFakeVisionClient
+
+
+@pytest.fixture
+def asgi(monkeypatch, fake_vision):
+    monkeypatch.setattr(Config, "RATELIMIT_ENABLED", False)
+    monkeypatch.setattr(Config, "OCR_CACHE_ENABLED", False)
+    vision_client.set_async_client_factory(lambda: AsyncFakeVisionClient(fake_vision))
+    yield create_asgi_app()
+    vision_client.set_async_client_factory(None)
+
+
+async def call(app, method, path, files=None, query=b""):
+    """One HTTP request through the ASGI app; returns (status, headers, body)."""
+    body, headers = b"", []
+    if files:
+        body, content_type = encode_multipart(files)
+        headers = [(b"content-type", content_type.encode())]
+    headers.append((b"content-length", str(len(body)).encode()))
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": query,
+        "headers": headers,
+        "http_version": "1.1",
+        "client": ("127.0.0.1", 40000),
+        "server": ("testserver", 80),
+    }
+    messages = [{"type": "http.request", "body": body}]
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        await asyncio.Event().wait()
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    return sent[0]["status"], dict(sent[0]["headers"]), b"".join(m.get("body", b"") for m in sent[1:])
+
+
+def image(seed: int) -> tuple:
+    return ("image", f"{seed}.png", label(seed), "image/png")
+
+
+def test_concurrent_requests_do_not_hold_threads(asgi, fake_vision):
+    fake_vision.latency = 0.3
+
+    async def burst():
+        return await asyncio.gather(
+            *(call(asgi, "POST", "/api/extract-text", [image(s)]) for s in range(40))
+        )
+
+    start = time.perf_counter()
+    responses = asyncio.run(burst())
+    elapsed = time.perf_counter() - start
+    assert [status for status, _, _ in responses] == [200] * 40
+    assert json.loads(responses[0][2])["text"] == "Hello World"
+    assert fake_vision.rpc_count == 40
+    # 40 sequential calls would take 12 s; the thread pool has only 8 threads
+    assert elapsed < 3
+
+
+def test_batch_stream_and_fallback_routes(asgi, fake_vision):
+    async def scenario():
+        batch = await call(
+            asgi, "POST", "/api/extract-text-batch", [image(1), image(2), ("image", "x.txt", b"x", "text/plain")],
+            query=b"stream=true",
+        )
+        stats = await call(asgi, "GET", "/api/cache/stats")
+        missing = await call(asgi, "GET", "/api/missing")
+        return batch, stats, missing
+
+    batch, stats, missing = asyncio.run(scenario())
+    status, headers, body = batch
+    assert status == 200 and headers[b"content-type"].startswith(b"application/x-ndjson")
+    lines = [json.loads(line) for line in body.splitlines()]
+    assert sorted(line["index"] for line in lines[:-1]) == [0, 1, 2]
+    assert lines[-1]["summary"] and lines[-1]["succeeded"] == 2 and lines[-1]["failed"] == 1
+    assert fake_vision.rpc_count == 1
+    assert stats[0] == 200 and json.loads(stats[2])["cache"] == {"enabled": False}
+    assert missing[0] == 404
+
+
+def test_shed_when_vision_slots_stay_busy(monkeypatch, asgi, fake_vision):
+    monkeypatch.setitem(asgi.config, "VISION_ASYNC_CONCURRENCY", 1)
+    monkeypatch.setitem(asgi.config, "VISION_QUEUE_TIMEOUT_INTERACTIVE_SECONDS", 0.05)
+    fake_vision.latency = 0.3
+
+    async def burst():
+        return await asyncio.gather(
+            *(call(asgi, "POST", "/api/extract-text", [image(s)]) for s in range(2))
+        )
+
+    statuses = sorted(status for status, _, _ in asyncio.run(burst()))
+    assert statuses == [200, 503]
+
+
+@pytest.mark.parametrize("concurrency, rpcs", [(8, 2), (1, 1)])
+def test_hedge_only_with_a_spare_slot(monkeypatch, asgi, fake_vision, concurrency, rpcs):
+    monkeypatch.setitem(asgi.config, "VISION_HEDGE_ENABLED", True)
+    monkeypatch.setitem(asgi.config, "VISION_ASYNC_CONCURRENCY", concurrency)
+    monkeypatch.setattr(resilience, "_tracker", LatencyTracker())
+    for _ in range(20):
+        resilience.get_latency_tracker().record(0.01)
+    latencies = iter([0.6])
+    fake_vision.latency_model = lambda: next(latencies, 0.0)
+
+    start = time.perf_counter()
+    status, _, body = asyncio.run(call(asgi, "POST", "/api/extract-text", [image(1)]))
+    elapsed = time.perf_counter() - start
+    assert status == 200 and json.loads(body)["text"] == "Hello World"
+    assert fake_vision.rpc_count == rpcs
+    # The backup answers first; with every slot busy none is sent
+    assert elapsed < 0.4 if rpcs == 2 else elapsed >= 0.6
+
+
+def test_readiness_waits_for_lifespan_warm_up(asgi):
+    async def scenario():
+        before = await call(asgi, "GET", "/api/health/ready")
+        events = [{"type": "lifespan.shutdown"}, {"type": "lifespan.startup"}]
+        sent = []
+
+        async def receive():
+            return events.pop()
+
+        async def send(message):
+            sent.append(message["type"])
+
+        vision_client.start_warm_up(asgi.config)
+        await asgi({"type": "lifespan"}, receive, send)
+        await asgi._warmup_task
+        vision_client._warmup_done.wait(5)
+        after = await call(asgi, "GET", "/api/health/ready")
+        return before, sent, after
+
+    before, sent, after = asyncio.run(scenario())
+    assert before[0] == 503
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    assert after[0] == 200 and json.loads(after[2]) == {"status": "ready"}
+
+
+def test_profiled_request_samples_pool_threads(monkeypatch, tmp_path, fake_vision):
+    monkeypatch.setattr(Config, "RATELIMIT_ENABLED", False)
+    monkeypatch.setattr(Config, "PROFILE_ENABLED", True)
+    monkeypatch.setattr(Config, "PROFILE_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(Config, "PROFILE_INTERVAL_MS", 0.5)
+    monkeypatch.setattr(Config, "PROFILE_DIR", str(tmp_path))
+    # Pool work long enough to be sampled even on a busy machine
+    extract_metadata = OCRService.extract_metadata
+    monkeypatch.setattr(
+        OCRService,
+        "extract_metadata",
+        lambda self, content: time.sleep(0.05) or extract_metadata(self, content),
+    )
+    vision_client.set_async_client_factory(lambda: AsyncFakeVisionClient(fake_vision))
+    try:
+        app = create_asgi_app()
+        status, headers, _ = asyncio.run(call(app, "POST", "/api/extract-text", [image(3)]))
+    finally:
+        vision_client.set_async_client_factory(None)
+
+    assert status == 200
+    profile_id = headers[b"x-profile-id"].decode()
+    meta = json.loads((tmp_path / f"{profile_id}.json").read_text())
+    assert meta["status"] == 200 and meta["samples"] > 0
+    # Only the pool threads working for the request are sampled, never the loop
+    stacks = (tmp_path / f"{profile_id}.folded").read_text().splitlines()
+    assert stacks and all("traced (utils/profiling.py:" in stack for stack in stacks)
@@ -0,0 +1,114 @@
+import io, json
+
+from google.cloud import vision
+
+from app.services.ocr_service import pack_batches
+from benchmarks.bench_mosaic import label
+
+
+def _images(count):
+    return [(io.BytesIO(label(i)), f"image{i}.jpg") for i in range(count)]
+
+
+def test_pack_batches_respects_image_and_byte_limits():
+    assert pack_batches([1] * 5, max_images=2, max_bytes=100) == [[0, 1], [2, 3], [4]]
+    assert pack_batches([60, 60, 30], max_images=16, max_bytes=100) == [[0], [1, 2]]
+    # An image bigger than the whole budget is sent on its own
+    assert pack_batches([500, 10], max_images=16, max_bytes=100) == [[0], [1]]
+
+
+def test_batch_endpoint_packs_images_into_few_rpcs(client, fake_vision):
+    response = client.post(
+        "/api/extract-text-batch",
+        data={"image": _images(20)},
+        content_type="multipart/form-data",
+    )
+    data = response.get_json()
+    assert response.status_code == 200
+    assert [r["filename"] for r in data["results"]] == [
+        f"image{i}.jpg" for i in range(20)
+    ]
+    assert all(r["success"] for r in data["results"])
+    assert data["results"][0]["text"] == "Hello World"
+    assert fake_vision.image_count == 20
+    assert fake_vision.rpc_count == 2
+
+
+def test_batch_endpoint_isolates_per_image_errors(client, fake_vision):
+    def annotate(request):
+        if request.image.content == label(1):
+            return vision.AnnotateImageResponse(error={"message": "bad image"})
+        return vision.AnnotateImageResponse(fake_vision.response)
+
+    fake_vision.annotate = annotate
+    response = client.post(
+        "/api/extract-text-batch",
+        data={"image": _images(3)},
+        content_type="multipart/form-data",
+    )
+    results = response.get_json()["results"]
+    assert [r["success"] for r in results] == [True, False, True]
+    assert "bad image" in results[1]["error"]
+
+
+def test_batch_endpoint_rpc_failure_fails_only_its_chunk(client, fake_vision):
+    client.application.config["VISION_BATCH_MAX_IMAGES"] = 2
+    calls = []
+    original = fake_vision.batch_annotate_images
+
+    def flaky(requests=None, **kwargs):
+        calls.append(len(requests))
+        if len(calls) == 1:
+            raise RuntimeError("connection reset")
+        return original(requests=requests, **kwargs)
+
+    fake_vision.batch_annotate_images = flaky
+    client.application.config["VISION_BATCH_PARALLEL_CHUNKS"] = 1
+    response = client.post(
+        "/api/extract-text-batch",
+        data={"image": _images(4)},
+        content_type="multipart/form-data",
+    )
+    results = response.get_json()["results"]
+    assert [r["success"] for r in results] == [False, False, True, True]
+    assert "connection reset" in results[0]["error"]
+
+
+def _ndjson(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_batch_endpoint_streams_ndjson_with_query_flag(client, fake_vision):
+    client.application.config["VISION_BATCH_MAX_IMAGES"] = 2
+    files = _images(3) + [(io.BytesIO(b"x"), "notes.txt")]
+    response = client.post(
+        "/api/extract-text-batch?stream=true",
+        data={"image": files},
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+
+    lines = _ndjson(response)
+    items, summary = lines[:-1], lines[-1]
+    assert sorted(item["index"] for item in items) == [0, 1, 2, 3]
+    assert items[0] == {
+        "index": 3,
+        "filename": "notes.txt",
+        "success": False,
+        "error": "Invalid file type.",
+    }
+    assert summary["summary"] is True
+    assert (summary["total"], summary["succeeded"], summary["failed"]) == (4, 3, 1)
+
+
+def test_batch_endpoint_streams_ndjson_with_accept_header(client, fake_vision):
+    response = client.post(
+        "/api/extract-text-batch",
+        data={"image": _images(2)},
+        content_type="multipart/form-data",
+        headers={"Accept": "application/x-ndjson"},
+    )
+    lines = _ndjson(response)
+    assert len(lines) == 3
+    assert lines[-1]["succeeded"] == 2
@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+from app import bulk
+from app.config import Config
+from benchmarks.bench_mosaic import label
+
+
+@pytest.fixture
+def images(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "OCR_CACHE_ENABLED", False)
+    folder = tmp_path / "images"
+    (folder / "nested").mkdir(parents=True)
+    for n in range(3):
+        (folder / f"{n}.png").write_bytes(label(n))
+    (folder / "nested" / "3.png").write_bytes(label(3))
+    (folder / "notes.txt").write_text("not an image")
+    return folder
+
+
+def rows(path) -> list:
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_directory_and_manifest_inputs(images, tmp_path, fake_vision, capsys):
+    manifest = tmp_path / "manifest.jsonl"
+    manifest.write_text(
+        "\n".join(
+            [
+                json.dumps({"id": "a", "path": "images/0.png"}),
+                json.dumps({"request_id": "b", "path": "images/missing.png"}),
+                "not json",
+            ]
+        )
+    )
+    output = tmp_path / "out.jsonl"
+    code = bulk.main(
+        [str(images), str(manifest), "-o", str(output), "--mode", "thread", "--workers", "2"]
+    )
+
+    results = {row["id"]: row for row in rows(output)}
+    assert code == 1  # the missing file
+    assert len(results) == 6
+    assert results["a"]["success"] and results["a"]["text"] == "Hello World"
+    assert results[str(images / "nested" / "3.png")]["success"]
+    assert not results["b"]["success"] and "Could not read file" in results["b"]["error"]
+    assert "6 images (5 ok, 1 failed, 0 already done)" in capsys.readouterr().err
+
+
+def test_rerun_resumes_after_last_checkpoint(images, tmp_path, fake_vision):
+    output = tmp_path / "out.jsonl"
+    args = [str(images), "-o", str(output), "--mode", "thread", "--workers", "1"]
+    args += ["--batch-size", "2"]
+    assert bulk.main(args) == 0
+    assert fake_vision.rpc_count == 2
+
+    # Interrupted after the first chunk: its entry is checkpointed, later output is torn
+    checkpoint = tmp_path / "out.jsonl.ckpt"
+    checkpoint.write_text(checkpoint.read_text().splitlines()[0] + "\n")
+    with open(output, "a") as f:
+        f.write('{"id": "torn')
+
+    assert bulk.main(args) == 0
+    assert fake_vision.rpc_count == 3
+    ids = [row["id"] for row in rows(output)]
+    assert len(ids) == len(set(ids)) == 4
+
+    assert bulk.main(args) == 0
+    assert fake_vision.rpc_count == 3
+
+
+def test_process_pool(images, tmp_path, fake_vision):
+    output = tmp_path / "out.jsonl"
+    pattern = str(images / "**" / "*.png")
+    args = [pattern, "-o", str(output), "--mode", "process", "--workers", "2", "--batch-size", "1"]
+    assert bulk.main(args) == 0
+    assert sorted(row["filename"] for row in rows(output)) == ["0.png", "1.png", "2.png", "3.png"]
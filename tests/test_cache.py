@@ -0,0 +1,69 @@
+from app.services.cache import MemoryCache, OCRCache, SQLiteCache, content_key
+from app.services.ocr_service import OCRService
+from benchmarks.bench_mosaic import label
+
+
+# ---------------------------
+# Cache tiers
+# ---------------------------
+def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", {"text": "A"})
+    cache.set("b", {"text": "B"})
+    cache.get("a")
+    cache.set("c", {"text": "C"})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"text": "A"}
+    assert cache.get("c") == {"text": "C"}
+
+
+def test_memory_cache_ttl_expiry():
+    cache = MemoryCache(max_entries=2, ttl_seconds=-1)
+    cache.set("a", {"text": "A"})
+    assert cache.get("a") is None
+
+
+def test_disk_tier_is_shared_and_promotes_to_memory(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    writer = OCRCache(MemoryCache(), SQLiteCache(path))
+    writer.set("k", {"text": "Hello", "confidence": 0.9})
+
+    # A second cache (another worker) sees the entry through the disk tier
+    reader = OCRCache(MemoryCache(), SQLiteCache(path))
+    assert reader.get("k") == {"text": "Hello", "confidence": 0.9}
+    assert reader.get("k") == {"text": "Hello", "confidence": 0.9}
+    stats = reader.stats()
+    assert stats["disk_hits"] == 1
+    assert stats["memory_hits"] == 1
+    assert stats["hit_rate"] == 1.0
+
+
+# ---------------------------
+# OCRService integration
+# ---------------------------
+def test_extract_text_second_call_is_cache_hit(client, fake_vision):
+    content = label(0)
+    with client.application.app_context():
+        first = OCRService().extract_text(content)
+        second = OCRService().extract_text(content)
+
+        assert first["cache"] == "miss"
+        assert second["cache"] == "hit"
+        assert second["text"] == "Hello World"
+        assert fake_vision.rpc_count == 1
+
+        stats = client.application.extensions["ocr_cache"].stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+
+
+def test_cache_stats_endpoint(client):
+    cache = client.application.extensions["ocr_cache"]
+    cache.set(content_key(b"x"), {"text": "x", "confidence": 1.0})
+    cache.get(content_key(b"x"))
+
+    response = client.get("/api/cache/stats")
+    data = response.get_json()
+    assert response.status_code == 200
+    assert data["cache"]["enabled"] is True
+    assert data["cache"]["memory_hits"] == 1
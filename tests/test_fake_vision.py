@@ -0,0 +1,45 @@
+import random
+
+import pytest
+from google.api_core.exceptions import ServiceUnavailable
+from google.cloud import vision
+
+from app.services import vision_client
+from benchmarks.fake_vision import FakeVisionClient, FakeVisionServer, parse_latency
+
+
+@pytest.fixture
+def fake_server():
+    server = FakeVisionServer(FakeVisionClient(annotations=["first", "second"])).start()
+    yield server
+    server.stop()
+
+
+def test_parse_latency_distributions():
+    rng = random.Random(1)
+    assert parse_latency("constant:0.2")() == 0.2
+    assert 0.1 <= parse_latency("uniform:0.1,0.3", rng)() <= 0.3
+    assert parse_latency("normal:0.1,0.5", rng)() >= 0
+    assert parse_latency("lognormal:0.1,0.5", rng)() > 0
+    with pytest.raises(ValueError):
+        parse_latency("pareto:1")
+
+
+def test_emulator_host_routes_client_to_fake_server(fake_server):
+    client = vision_client.build_client({"VISION_EMULATOR_HOST": fake_server.address})
+    image = vision.Image(content=b"same bytes")
+    first = client.document_text_detection(image=image).full_text_annotation.text
+    again = client.document_text_detection(image=image).full_text_annotation.text
+
+    assert first in ("first", "second")
+    assert again == first
+    assert fake_server.backend.rpc_count == 2
+
+
+def test_fake_server_injects_errors(fake_server):
+    fake_server.backend.error_rate = 1.0
+    client = vision_client.build_client({"VISION_EMULATOR_HOST": fake_server.address})
+    with pytest.raises(ServiceUnavailable):
+        client.document_text_detection(
+            image=vision.Image(content=b"x"), retry=None, timeout=5
+        )
@@ -0,0 +1,72 @@
+import io
+
+import pytest
+from PIL import Image
+
+from app.services.frames import frame_count, iter_frames
+from app.services.ocr_service import OCRService
+from benchmarks.bench_mosaic import label
+
+
+def multi_page(colors, format="TIFF") -> bytes:
+    pages = [Image.new("RGB", (64, 48), color) for color in colors]
+    out = io.BytesIO()
+    pages[0].save(out, format=format, save_all=True, append_images=pages[1:])
+    return out.getvalue()
+
+
+def test_duplicate_frames_are_skipped():
+    content = multi_page(["white", "black", "white", "red"])
+    assert frame_count(content) == 4
+    stats = {}
+    frames = list(iter_frames(content, max_frames=10, stats=stats))
+    assert [index for index, _ in frames] == [0, 1, 3]
+    assert stats["duplicates"] == 1
+    assert all(Image.open(io.BytesIO(data)).format == "JPEG" for _, data in frames)
+
+
+def test_frames_are_decoded_lazily_and_capped():
+    frames = iter_frames(multi_page(["white", "black", "red"]), max_frames=2)
+    assert next(frames)[0] == 0
+    assert [index for index, _ in frames] == [1]
+
+
+@pytest.fixture
+def app(client):
+    app = client.application
+    app.config.update(OCR_CACHE_ENABLED=False)
+    app.extensions["ocr_cache"] = None
+    return app
+
+
+def test_multi_page_tiff_is_merged_per_frame(app, fake_vision):
+    fake_vision.annotate = lambda request: fake_vision.response
+    content = multi_page(["white", "black", "black"])
+    with app.app_context():
+        result = OCRService().extract_text(content)
+    assert [f["frame"] for f in result["frames"]] == [0, 1]
+    assert result["frame_count"] == 3 and result["duplicate_frames"] == 1
+    assert result["text"] == "Hello World\nHello World"
+    assert fake_vision.image_count == 2
+
+
+def test_route_accepts_tiff(client, fake_vision):
+    response = client.post(
+        "/api/extract-text",
+        data={"image": (io.BytesIO(multi_page(["white", "black"])), "scan.tiff", "image/tiff")},
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == 200
+    assert response.get_json()["frame_count"] == 2
+
+
+def test_animated_gif_in_batch(client, fake_vision):
+    gif = multi_page(["white", "black"], format="GIF")
+    response = client.post(
+        "/api/extract-text-batch",
+        data={"image": [(io.BytesIO(gif), "anim.gif"), (io.BytesIO(label(0)), "a.png")]},
+        content_type="multipart/form-data",
+    )
+    results = response.get_json()["results"]
+    assert results[0]["frame_count"] == 2 and len(results[0]["frames"]) == 2
+    assert results[1]["success"]
@@ -0,0 +1,154 @@
+import io, json, threading, time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from benchmarks.bench_mosaic import label
+
+
+@pytest.fixture
+def jobs_client(client, tmp_path):
+    client.application.config["JOBS_DB_PATH"] = str(tmp_path / "jobs.sqlite3")
+    client.application.config["JOBS_SPOOL_DIR"] = str(tmp_path / "spool")
+    yield client
+    runner = client.application.extensions.get("ocr_jobs")
+    if runner is not None:
+        runner.shutdown()
+
+
+def _submit(client, files, **form):
+    return client.post(
+        "/api/jobs",
+        data={"image": files, **form},
+        content_type="multipart/form-data",
+    )
+
+
+def _wait_for(client, job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f"/api/jobs/{job_id}").get_json()["job"]
+        if job["status"] in ("completed", "failed"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError("job did not finish")
+
+
+def test_job_submission_returns_immediately_and_completes(jobs_client, fake_vision):
+    files = [
+        (io.BytesIO(label(0)), "a.jpg"),
+        (io.BytesIO(b"bad"), "b.exe"),
+        (io.BytesIO(label(2)), "c.png"),
+    ]
+    response = _submit(jobs_client, files)
+    data = response.get_json()
+    assert response.status_code == 202
+    assert data["status"] == "queued"
+
+    job = _wait_for(jobs_client, data["job_id"])
+    assert job["status"] == "completed"
+    assert (job["total"], job["completed"], job["failed"]) == (3, 2, 1)
+
+    results = jobs_client.get(data["results_url"]).get_json()
+    assert [r["filename"] for r in results["results"]] == ["a.jpg", "b.exe", "c.png"]
+    assert [r["success"] for r in results["results"]] == [True, False, True]
+    assert results["results"][0]["text"] == "Hello World"
+
+    page = jobs_client.get(data["results_url"] + "?offset=1&limit=1").get_json()
+    assert [r["filename"] for r in page["results"]] == ["b.exe"]
+    assert page["next_offset"] == 2
+
+
+def test_job_with_a_spooled_body_ocrs_every_image(jobs_client, fake_vision):
+    # Above the threshold uploads arrive as mmap'd memoryviews, not bytes
+    jobs_client.application.config["UPLOAD_SPOOL_THRESHOLD"] = 0
+    files = [(io.BytesIO(label(0)), "a.jpg"), (io.BytesIO(label(1)), "b.png")]
+    response = _submit(jobs_client, files)
+    assert response.status_code == 202
+
+    job = _wait_for(jobs_client, response.get_json()["job_id"])
+    assert (job["status"], job["completed"], job["failed"]) == ("completed", 2, 0)
+    assert fake_vision.image_count == 2
+
+
+def test_job_webhook_called_on_completion(jobs_client, fake_vision):
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers["Content-Length"])
+            received.append(json.loads(self.rfile.read(length)))
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    jobs_client.application.config["JOBS_CALLBACK_ALLOWED_HOSTS"] = "127.0.0.1"
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.handle_request, daemon=True)
+    thread.start()
+    try:
+        response = _submit(
+            jobs_client,
+            [(io.BytesIO(label(0)), "a.jpg")],
+            callback_url=f"http://127.0.0.1:{server.server_port}/done",
+        )
+        job_id = response.get_json()["job_id"]
+        thread.join(timeout=5)
+    finally:
+        server.server_close()
+
+    assert received and received[0]["job_id"] == job_id
+    assert received[0]["status"] == "completed"
+    assert "callback_url" not in received[0]
+
+
+def test_job_rejects_bad_callback_and_unknown_id(jobs_client):
+    for url in ["file:///etc/passwd", "http://169.254.169.254/computeMetadata/v1/"]:
+        response = _submit(jobs_client, [(io.BytesIO(b"img"), "a.jpg")], callback_url=url)
+        assert response.status_code == 400, url
+
+    jobs_client.application.config["JOBS_CALLBACK_ALLOWED_HOSTS"] = "hooks.internal"
+    response = _submit(
+        jobs_client, [(io.BytesIO(b"img"), "a.jpg")], callback_url="https://example.com/done"
+    )
+    assert response.status_code == 400
+
+    assert jobs_client.get("/api/jobs/does-not-exist").status_code == 404
+    assert jobs_client.get("/api/jobs/does-not-exist/results").status_code == 404
+
+
+def test_callback_urls_must_resolve_to_public_addresses(monkeypatch):
+    from app.services.webhooks import allowed_hosts, check_callback_url
+
+    for url in [
+        "http://127.0.0.1:8080/done",
+        "http://10.1.2.3/done",
+        "http://[::ffff:192.168.0.1]/done",
+        "http://[fe80::1]/done",
+        "http://localhost/done",
+        "ftp://example.com/done",
+    ]:
+        with pytest.raises(ValueError):
+            check_callback_url(url)
+
+    allowed = allowed_hosts(" Hooks.internal, 10.0.0.5 ")
+    assert allowed == {"hooks.internal", "10.0.0.5"}
+    check_callback_url("http://10.0.0.5/done", allowed)
+    with pytest.raises(ValueError):
+        check_callback_url("http://10.0.0.6/done", allowed)
+
+
+def test_webhook_checks_the_address_it_connects_to(monkeypatch):
+    from app.services import webhooks
+
+    # The host resolved publicly when the job was submitted and now points
+    # at loopback (DNS rebinding): the connection itself is refused
+    monkeypatch.setattr(webhooks, "check_callback_url", lambda url, allowed: None)
+    server = HTTPServer(("127.0.0.1", 0), BaseHTTPRequestHandler)
+    try:
+        with pytest.raises(OSError, match="private address"):
+            webhooks.post_json(f"http://127.0.0.1:{server.server_port}/done", {})
+    finally:
+        server.server_close()
@@ -0,0 +1,65 @@
+import io
+
+from google.cloud import vision
+
+from app.services.layout import project
+from benchmarks.bench_mosaic import label
+
+BREAK = vision.TextAnnotation.DetectedBreak.BreakType
+
+
+def poly(x, y):
+    return vision.BoundingPoly(
+        vertices=[vision.Vertex(x=x, y=y), vision.Vertex(x=x + 10, y=y + 5)]
+    )
+
+
+def word(text, confidence, x, last_break=BREAK.SPACE):
+    symbols = [vision.Symbol(text=ch) for ch in text]
+    symbols[-1].property = vision.TextAnnotation.TextProperty(
+        detected_break=vision.TextAnnotation.DetectedBreak(type_=last_break)
+    )
+    return vision.Word(symbols=symbols, confidence=confidence, bounding_box=poly(x, 0))
+
+
+def annotation():
+    paragraph = vision.Paragraph(
+        words=[word("Hello", 0.9, 0), word("World", 0.7, 20, BREAK.LINE_BREAK)],
+        confidence=0.8,
+        bounding_box=poly(0, 0),
+    )
+    block = vision.Block(paragraphs=[paragraph], confidence=0.8, bounding_box=poly(0, 0))
+    return vision.TextAnnotation(text="Hello World\n", pages=[vision.Page(blocks=[block])])
+
+
+def test_text_level_only_computes_confidence():
+    assert project(annotation(), "text") == (0.8, None)
+
+
+def test_words_level_has_boxes():
+    confidence, words = project(annotation(), "words")
+    assert confidence == 0.8
+    assert [w["text"] for w in words] == ["Hello", "World"]
+    assert words[1]["bounding_box"] == [[20, 0], [30, 5]]
+
+
+def test_blocks_and_paragraphs_rebuild_text_from_breaks():
+    _, blocks = project(annotation(), "blocks")
+    _, paragraphs = project(annotation(), "paragraphs")
+    assert blocks[0]["text"] == paragraphs[0]["text"] == "Hello World"
+    assert blocks[0]["bounding_box"] == [[0, 0], [10, 5]]
+
+
+def test_level_parameter_on_endpoint(client, fake_vision):
+    fake_vision.response = vision.AnnotateImageResponse(full_text_annotation=annotation())
+
+    def post(level):
+        return client.post(
+            f"/api/extract-text?level={level}",
+            data={"image": (io.BytesIO(label(0)), "test.png")},
+            content_type="multipart/form-data",
+        )
+
+    data = post("words").get_json()
+    assert len(data["words"]) == 2 and "blocks" not in data
+    assert post("glyphs").status_code == 400
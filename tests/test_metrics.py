@@ -0,0 +1,51 @@
+import io, os, subprocess, sys, textwrap
+
+from benchmarks.bench_mosaic import label
+
+
+def test_metrics_endpoint_reports_every_stage(client, fake_vision):
+    client.post(
+        "/api/extract-text",
+        data={"image": (io.BytesIO(label(0)), "test.png")},
+        content_type="multipart/form-data",
+    )
+    response = client.get("/metrics")
+    body = response.get_data(as_text=True)
+
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain")
+    for stage in (
+        "multipart_parse",
+        "validation",
+        "file_read",
+        "metadata",
+        "vision_rpc",
+        "confidence",
+        "clean_text",
+        "serialize",
+    ):
+        assert f'ocr_stage_seconds_count{{stage="{stage}"}}' in body
+    assert "ocr_vision_inflight" in body
+    assert "ocr_vision_queue_depth" in body
+    assert 'ocr_requests_total{endpoint="OCR_extract_text",status="200"}' in body
+
+
+def test_metrics_are_merged_across_worker_processes(tmp_path):
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+    worker = textwrap.dedent(
+        """
+        from app.utils import metrics
+        metrics.VISION_RPCS.labels("batch_annotate_images", "ok").inc(3)
+        """
+    )
+    for _ in range(2):
+        subprocess.run([sys.executable, "-c", worker], env=env, check=True)
+
+    reader = "from app.utils import metrics; print(metrics.render()[0].decode())"
+    output = subprocess.run(
+        [sys.executable, "-c", reader], env=env, check=True, capture_output=True, text=True
+    ).stdout
+    assert (
+        'ocr_vision_rpcs_total{method="batch_annotate_images",outcome="ok"} 6.0'
+        in output
+    )
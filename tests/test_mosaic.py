@@ -0,0 +1,77 @@
+import io, random
+
+import pytest
+from PIL import Image, ImageDraw
+
+from app.services.mosaic import plan
+from app.services.ocr_service import OCRService
+from benchmarks.bench_mosaic import label
+from benchmarks.fake_vision import read_boxes
+
+
+def test_plan_keeps_tiles_apart_and_inside_the_canvas():
+    sizes = [(i, (random.Random(i).randint(50, 600), random.Random(-i).randint(50, 600))) for i in range(40)]
+    canvases = plan(sizes, canvas=2048, padding=48, max_tiles=64)
+    assert sorted(t.item for tiles in canvases for t in tiles) == list(range(40))
+    for tiles in canvases:
+        for a in tiles:
+            assert a.x >= 48 and a.y >= 48
+            assert a.x + a.width + 48 <= 2048 and a.y + a.height + 48 <= 2048
+            for b in tiles:
+                if a is not b:
+                    apart_x = a.x + a.width + 48 <= b.x or b.x + b.width + 48 <= a.x
+                    apart_y = a.y + a.height + 48 <= b.y or b.y + b.height + 48 <= a.y
+                    assert apart_x or apart_y
+
+
+@pytest.fixture
+def app(client, fake_vision):
+    app = client.application
+    app.extensions["ocr_cache"] = None
+    fake_vision.reader = read_boxes
+    return app
+
+
+def test_mosaic_matches_per_image_ocr(app, fake_vision):
+    contents = [label(seed) for seed in range(12)]
+    with app.app_context():
+        single = OCRService(level="words").extract_text_batch(contents)
+        billed = fake_vision.image_count
+        tiled = OCRService(level="words").extract_text_batch(contents, mosaic=True)
+    assert fake_vision.image_count - billed == 1
+    for expected, result in zip(single, tiled):
+        assert result["mosaic"] is True
+        assert result["text"] == expected["text"] and expected["text"]
+        for a, b in zip(expected["words"], result["words"]):
+            assert a["text"] == b["text"]
+            for (ax, ay), (bx, by) in zip(a["bounding_box"], b["bounding_box"]):
+                assert abs(ax - bx) <= 2 and abs(ay - by) <= 2
+
+
+def test_large_and_broken_images_are_not_lost(app, fake_vision):
+    big = io.BytesIO()
+    page = Image.new("RGB", (1200, 900), "white")
+    ImageDraw.Draw(page).rectangle([100, 100, 700, 140], fill="black")  # not blank
+    page.save(big, format="PNG")
+    truncated = io.BytesIO()
+    Image.open(io.BytesIO(label(1))).save(truncated, format="JPEG")
+    truncated = truncated.getvalue()[:-40]  # the header parses, the pixels don't
+    contents = [label(0), big.getvalue(), truncated, label(2)]
+    with app.app_context():
+        results = OCRService().extract_text_batch(contents, mosaic=True)
+    assert results[0]["mosaic"] and results[3]["mosaic"]
+    assert "mosaic" not in results[1]
+    assert isinstance(results[2], ValueError)
+    assert fake_vision.image_count == 2
+
+
+def test_batch_route_opt_in(client, fake_vision):
+    fake_vision.reader = read_boxes
+    response = client.post(
+        "/api/extract-text-batch?mosaic=true",
+        data={"image": [(io.BytesIO(label(s)), f"{s}.png", "image/png") for s in (3, 4)]},
+        content_type="multipart/form-data",
+    )
+    results = response.get_json()["results"]
+    assert [r["mosaic"] for r in results] == [True, True]
+    assert fake_vision.image_count == 1
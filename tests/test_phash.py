@@ -0,0 +1,96 @@
+import io, random
+
+import pytest
+from PIL import Image, ImageDraw
+
+from app.services.ocr_service import OCRService
+from app.services.phash import PerceptualIndex, dhash
+
+
+def document(seed: int, size=(640, 800)) -> Image.Image:
+    """A page of random black 'words' on white."""
+    rng = random.Random(seed)
+    img = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(img)
+    for y in range(40, size[1] - 40, 28):
+        x = 40
+        while x < size[0] - 80:
+            width = rng.randint(20, 90)
+            draw.rectangle([x, y, x + width, y + 12], fill="black")
+            x += width + rng.randint(8, 16)
+    return img
+
+
+def encode(img: Image.Image, format: str, **params) -> bytes:
+    out = io.BytesIO()
+    img.save(out, format=format, **params)
+    return out.getvalue()
+
+
+def distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def test_dhash_survives_reencoding_but_not_other_content():
+    original = dhash(encode(document(1), "PNG"))
+    assert distance(original, dhash(encode(document(1), "JPEG", quality=60))) <= 15
+    assert distance(original, dhash(encode(document(1).resize((320, 400)), "PNG"))) <= 15
+    assert distance(original, dhash(encode(document(2), "PNG"))) > 64
+    assert dhash(b"not an image") is None
+
+
+def test_lookup_returns_nearest_within_threshold():
+    index = PerceptualIndex(max_distance=20)
+    base = random.Random(0).getrandbits(256)
+    index.add(base, "a")
+    index.add(base ^ 0b1111, "b")  # 4 bits away
+    assert index.lookup(base ^ 0b1) == ("a", 1)
+    assert index.lookup(base ^ 0b11111) == ("b", 1)
+    assert index.lookup(base ^ ((1 << 25) - 1)) is None  # 25 bits away from a
+
+
+def test_blank_images_are_not_indexed():
+    index = PerceptualIndex()
+    index.add(0, "blank")
+    assert len(index) == 0
+    assert index.lookup(1) is None
+
+
+def test_least_recently_used_entries_are_evicted():
+    rng = random.Random(1)
+    hashes = [rng.getrandbits(256) for _ in range(3)]
+    index = PerceptualIndex(max_entries=2)
+    index.add(hashes[0], "a")
+    index.add(hashes[1], "b")
+    index.lookup(hashes[0])
+    index.add(hashes[2], "c")
+    assert index.lookup(hashes[1]) is None
+    assert index.lookup(hashes[0]) == ("a", 0)
+    assert len(index) == 2
+
+
+def test_index_is_reloaded_from_disk(tmp_path):
+    path = str(tmp_path / "phash.sqlite3")
+    value = random.Random(2).getrandbits(256)
+    PerceptualIndex(path=path).add(value, "a")
+    assert PerceptualIndex(path=path).lookup(value ^ 0b101) == ("a", 2)
+
+
+@pytest.fixture
+def app(client):
+    app = client.application
+    app.extensions["ocr_phash"] = PerceptualIndex()
+    return app
+
+
+def test_reencoded_upload_reuses_cached_result(app, fake_vision):
+    with app.app_context():
+        first = OCRService().extract_text(encode(document(3), "PNG"))
+        second = OCRService().extract_text(encode(document(3), "JPEG", quality=70))
+        other = OCRService().extract_text(encode(document(4), "PNG"))
+    assert first["cache"] == "miss"
+    assert second["cache"] == "near_hit"
+    assert second["text"] == first["text"]
+    assert second["near_duplicate_distance"] <= 15
+    assert other["cache"] == "miss"
+    assert fake_vision.rpc_count == 2
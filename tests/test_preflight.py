@@ -0,0 +1,144 @@
+import io
+
+import pytest
+from PIL import Image, ImageDraw
+
+from app.services import ocr_service
+from app.services.ocr_service import OCRService
+from app.services.preflight import Preflight, read_header, sniff
+from app.utils import metrics
+from benchmarks.bench_mosaic import label
+
+
+def encode(img: Image.Image, format: str) -> bytes:
+    out = io.BytesIO()
+    img.save(out, format=format)
+    return out.getvalue()
+
+
+def page(size=(1200, 1600), color="white", mode="RGB") -> Image.Image:
+    return Image.new(mode, size, color)
+
+
+def skipped(reason: str) -> float:
+    return metrics.PREFLIGHT_SKIPPED.labels(reason)._value.get()
+
+
+@pytest.fixture
+def app(client):
+    app = client.application
+    app.config.update(OCR_CACHE_ENABLED=False)
+    app.extensions["ocr_cache"] = None
+    return app
+
+
+def test_sniff_reads_the_magic_bytes():
+    img = Image.new("RGB", (16, 16), "red")
+    for fmt in ("JPEG", "PNG", "GIF", "TIFF", "BMP", "WEBP", "ICO"):
+        assert sniff(encode(img, fmt)) == fmt
+    assert sniff(b"%PDF-1.7") is None
+    assert sniff(b"") is None
+
+
+def test_read_header_trusts_content_not_names():
+    header = read_header(encode(page((300, 200), mode="L"), "PNG"))
+    assert header == {"format": "PNG", "mode": "L", "width": 300, "height": 200, "frames": 1}
+
+    with pytest.raises(ValueError, match="not a supported image"):
+        read_header(b"<html>scan.jpg</html>")
+    # Right magic bytes, header cut short
+    with pytest.raises(ValueError, match="PNG image is corrupt"):
+        read_header(encode(page(), "PNG")[:20])
+
+
+def test_blank_pages_and_pages_with_text():
+    preflight = Preflight()
+    assert preflight.is_blank(encode(page(), "JPEG"))
+    assert preflight.is_blank(encode(page(color=(60, 90, 200)), "PNG"))
+    noisy = Image.effect_noise((1200, 1600), 2).point(lambda v: 235 + (v - 128) // 32)
+    assert preflight.is_blank(encode(noisy, "JPEG"))
+
+    # One short line of text on an otherwise empty A4 scan
+    img = page((2480, 3508))
+    ImageDraw.Draw(img).rectangle([200, 300, 900, 340], fill="black")
+    assert not preflight.is_blank(encode(img, "JPEG"))
+
+    # Black text on a transparent background is not an empty black page
+    img = page((800, 600), (0, 0, 0, 0), "RGBA")
+    ImageDraw.Draw(img).rectangle([100, 100, 500, 130], fill=(0, 0, 0, 255))
+    assert not preflight.is_blank(encode(img, "PNG"))
+    assert preflight.is_blank(encode(page((800, 600), (0, 0, 0, 0), "RGBA"), "PNG"))
+
+    assert not preflight.is_blank(b"\x89PNG\r\n\x1a\n broken")
+
+
+def test_blank_image_skips_vision(client, fake_vision):
+    before = skipped("blank")
+    response = client.post(
+        "/api/extract-text",
+        data={"image": (io.BytesIO(encode(page(), "JPEG")), "empty.jpg")},
+        content_type="multipart/form-data",
+    )
+    data = response.get_json()
+    assert response.status_code == 200
+    assert data["text"] == "" and data["blank"] is True
+    assert data["metadata"]["width"] == 1200
+    assert fake_vision.rpc_count == 0
+    assert skipped("blank") - before == 1
+
+
+def test_non_image_is_rejected_before_vision(client, fake_vision):
+    before = skipped("unsupported")
+    response = client.post(
+        "/api/extract-text",
+        data={"image": (io.BytesIO(b"%PDF-1.7 invoice"), "invoice.jpg")},
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == 400
+    assert "not a supported image" in response.get_json()["error"]
+    assert fake_vision.rpc_count == 0
+    assert skipped("unsupported") - before == 1
+
+
+def test_batch_sends_only_readable_images_with_content(client, fake_vision):
+    before = skipped("corrupt")
+    images = [
+        (io.BytesIO(label(1)), "label.png"),
+        (io.BytesIO(encode(page(), "PNG")), "blank.png"),
+        (io.BytesIO(b"not an image"), "junk.jpg"),
+        (io.BytesIO(encode(page(), "JPEG")[:40]), "truncated.jpg"),
+    ]
+    response = client.post(
+        "/api/extract-text-batch", data={"image": images}, content_type="multipart/form-data"
+    )
+    results = response.get_json()["results"]
+    assert [r["success"] for r in results] == [True, True, False, False]
+    assert results[0]["text"] == "Hello World"
+    assert results[1]["text"] == "" and results[1]["blank"] is True
+    assert "corrupt" in results[3]["error"]
+    assert fake_vision.image_count == 1
+    assert skipped("corrupt") - before == 1
+
+
+def test_header_is_parsed_once_per_upload(app, fake_vision, monkeypatch):
+    calls = []
+
+    def counting(content):
+        calls.append(len(content))
+        return read_header(content)
+
+    monkeypatch.setattr(ocr_service, "read_header", counting)
+    content = label(3)
+    with app.app_context():
+        ocr = OCRService()
+        assert ocr.extract_text(content)["text"] == "Hello World"
+        assert ocr.extract_metadata(content)["format"] == "PNG"
+    assert len(calls) == 1
+
+
+def test_preflight_can_be_disabled(app, fake_vision):
+    app.config["PREFLIGHT_ENABLED"] = False
+    with app.app_context():
+        result = OCRService().extract_text(encode(page(), "PNG"))
+    assert result["text"] == "Hello World" and "blank" not in result
+    assert fake_vision.rpc_count == 1
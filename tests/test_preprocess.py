@@ -0,0 +1,70 @@
+from io import BytesIO
+
+from PIL import Image
+
+from app.services.ocr_service import OCRService
+from app.services.preprocess import EXIF_ORIENTATION, ImagePreprocessor
+
+
+def _image_bytes(size, fmt="JPEG", mode="RGB", orientation=None):
+    img = Image.effect_noise(size, 64).convert(mode)
+    out = BytesIO()
+    if orientation:
+        exif = Image.Exif()
+        exif[EXIF_ORIENTATION] = orientation
+        img.save(out, format=fmt, exif=exif)
+    else:
+        img.save(out, format=fmt)
+    return out.getvalue()
+
+
+def test_large_jpeg_is_downscaled():
+    content = _image_bytes((2400, 1800))
+    optimized, stats = ImagePreprocessor(max_dimension=1000).process(content)
+
+    with Image.open(BytesIO(optimized)) as img:
+        assert max(img.size) == 1000
+    assert stats["bytes_saved"] == len(content) - len(optimized) > 0
+    assert "draft" in stats["applied"] and "downscale" in stats["applied"]
+
+
+def test_small_image_passes_through_untouched():
+    content = _image_bytes((200, 100), fmt="PNG")
+    optimized, stats = ImagePreprocessor(max_dimension=1000).process(content)
+    assert optimized is content
+    assert stats["bytes_saved"] == 0 and stats["applied"] == []
+
+
+def test_exif_orientation_and_grayscale_are_applied():
+    content = _image_bytes((1600, 400), orientation=6)
+    optimized, stats = ImagePreprocessor(
+        max_dimension=800, grayscale=True
+    ).process(content)
+
+    with Image.open(BytesIO(optimized)) as img:
+        assert img.mode == "L"
+        assert img.size == (200, 800)  # rotated to portrait, then downscaled
+    assert {"orientation", "grayscale"} <= set(stats["applied"])
+
+
+def test_unreadable_bytes_are_sent_as_is():
+    optimized, stats = ImagePreprocessor().process(b"not an image")
+    assert optimized == b"not an image"
+    assert stats["bytes_saved"] == 0
+
+
+def test_extract_text_sends_optimized_payload(client, fake_vision):
+    content = _image_bytes((2400, 2400))
+    sent = []
+
+    def annotate(request):
+        sent.append(request.image.content)
+        return fake_vision.response
+
+    fake_vision.annotate = annotate
+    with client.application.app_context():
+        result = OCRService().extract_text(content)
+
+    assert len(sent[0]) < len(content)
+    assert result["preprocessing"]["optimized_bytes"] == len(sent[0])
+    assert result["text"] == "Hello World"
@@ -0,0 +1,141 @@
+import asyncio
+
+import pytest
+
+from app import create_app
+from app.routes import request_priority
+from app.services.admission import FairQueue, Ticket, max_waits, parse_weights
+from app.services.async_ocr import FairSlots
+
+
+def drain(queue: FairQueue) -> list:
+    order = []
+    while queue:
+        order.append(queue.pop()[1])
+    return order
+
+
+def test_classes_are_served_in_priority_order():
+    queue = FairQueue()
+    queue.push(Ticket("backfill"), "backfill")
+    queue.push(Ticket("batch"), "batch")
+    queue.push(Ticket("interactive"), "interactive")
+    assert queue.counts() == {"interactive": 1, "batch": 1, "backfill": 1}
+    assert drain(queue) == ["interactive", "batch", "backfill"]
+    with pytest.raises(IndexError):
+        queue.pop()
+    with pytest.raises(ValueError):
+        queue.push(Ticket("urgent"), "x")
+
+
+def test_clients_share_a_class_by_weight():
+    queue = FairQueue()
+    for n in range(4):
+        queue.push(Ticket("batch", "a"), f"a{n}")
+    for n in range(2):
+        queue.push(Ticket("batch", "b"), f"b{n}")
+    # b queued last but is not stuck behind all of a's calls
+    assert drain(queue) == ["a0", "b0", "a1", "b1", "a2", "a3"]
+
+    queue = FairQueue({"a": 2})
+    for n in range(4):
+        queue.push(Ticket("batch", "a"), f"a{n}")
+    for n in range(2):
+        queue.push(Ticket("batch", "b"), f"b{n}")
+    assert drain(queue) == ["a0", "a1", "b0", "a2", "a3", "b1"]
+
+    # Cost counts: one 4-image chunk goes after two single images
+    queue = FairQueue()
+    queue.push(Ticket("batch", "a", 4), "chunk")
+    queue.push(Ticket("batch", "b"), "b0")
+    queue.push(Ticket("batch", "b"), "b1")
+    assert drain(queue) == ["b0", "b1", "chunk"]
+
+
+def test_an_idle_class_starts_a_new_client_level():
+    queue = FairQueue()
+    for n in range(3):
+        queue.push(Ticket("batch", "a"), f"a{n}")
+    drain(queue)
+    queue.push(Ticket("batch", "a"), "a3")
+    queue.push(Ticket("batch", "b"), "b0")
+    assert drain(queue) == ["a3", "b0"]
+
+
+def test_evict_takes_the_last_scheduled_call_of_the_lowest_class():
+    queue = FairQueue()
+    queue.push(Ticket("batch"), "batch")
+    queue.push(Ticket("backfill", "a"), "a0")
+    queue.push(Ticket("backfill", "a"), "a1")
+    queue.push(Ticket("backfill", "b"), "b0")
+    assert queue.evict("interactive") == "a1"
+    assert queue.evict("batch") == "b0"
+    assert queue.evict("batch") == "a0"
+    assert queue.evict("batch") is None
+    assert queue.evict("interactive") == "batch"
+    assert not queue
+
+
+def test_remove_only_finds_waiting_calls():
+    queue = FairQueue()
+    item = object()
+    queue.push(Ticket("batch"), item)
+    assert queue.remove("batch", item)
+    assert not queue.remove("batch", item)
+
+
+def test_parse_weights_and_max_waits():
+    assert parse_weights("") == {}
+    assert parse_weights("key=4, key:with=equals=0.5 ,zero=0") == {
+        "key": 4.0,
+        "key:with=equals": 0.5,
+        "zero": 0.01,
+    }
+    waits = max_waits(
+        {"VISION_QUEUE_TIMEOUT_SECONDS": 10, "VISION_QUEUE_TIMEOUT_INTERACTIVE_SECONDS": 2}
+    )
+    assert waits == {"interactive": 2.0, "batch": 10.0, "backfill": 10.0}
+
+
+def test_fair_slots_hand_over_and_skip_timed_out_waiters():
+    async def scenario():
+        slots = FairSlots(1)
+        await slots.acquire(Ticket("batch"), 1)
+        assert slots.locked()
+        order = []
+
+        async def waiter(priority, timeout):
+            await slots.acquire(Ticket(priority), timeout)
+            order.append(priority)
+
+        backfill = asyncio.ensure_future(waiter("backfill", 1))
+        gave_up = asyncio.ensure_future(waiter("interactive", 0.01))
+        await asyncio.sleep(0.05)
+        interactive = asyncio.ensure_future(waiter("interactive", 1))
+        await asyncio.sleep(0)
+        with pytest.raises(asyncio.TimeoutError):
+            await gave_up
+
+        slots.release()
+        await interactive
+        slots.release()
+        await backfill
+        slots.release()
+        return order, slots.locked(), slots._held
+
+    assert asyncio.run(scenario()) == (["interactive", "backfill"], False, 0)
+
+
+def test_x_priority_can_only_lower_the_class():
+    app = create_app()
+    cases = [
+        ("interactive", None, "interactive"),
+        ("interactive", "Backfill", "backfill"),
+        ("batch", "interactive", "batch"),
+        ("batch", "urgent", "batch"),
+        ("backfill", "batch", "backfill"),
+    ]
+    for default, header, expected in cases:
+        headers = {"X-Priority": header} if header else {}
+        with app.test_request_context(headers=headers):
+            assert request_priority(default) == expected, (default, header)
@@ -0,0 +1,81 @@
+import io, os
+from collections import Counter
+
+import pytest
+
+from app import create_app
+from app.config import Config
+from app.utils.profiling import ProfileStore
+from benchmarks.bench_mosaic import label
+
+IMAGE = label(0)
+
+
+@pytest.fixture
+def profiled(monkeypatch, tmp_path):
+    monkeypatch.setattr(Config, "PROFILE_ENABLED", True)
+    monkeypatch.setattr(Config, "PROFILE_TOKEN", "secret")
+    monkeypatch.setattr(Config, "PROFILE_INTERVAL_MS", 1.0)
+    monkeypatch.setattr(Config, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(Config, "OCR_CACHE_ENABLED", False)
+    app = create_app()
+    app.config["TESTING"] = True
+    with app.test_client() as client:
+        yield client
+
+
+def extract(client, headers=None):
+    return client.post(
+        "/api/extract-text",
+        data={"image": (io.BytesIO(IMAGE), "test.png")},
+        content_type="multipart/form-data",
+        headers=headers or {},
+    )
+
+
+def test_token_request_is_profiled_and_downloadable(profiled, fake_vision):
+    fake_vision.latency = 0.05
+    token = {"X-Profile-Token": "secret"}
+    response = extract(profiled, {**token, "X-Request-ID": "req-1"})
+    assert response.status_code == 200
+    assert response.headers["X-Profile-ID"] == "req-1"
+
+    assert profiled.get("/api/profiles").status_code == 403
+    listing = profiled.get("/api/profiles", headers=token).get_json()["profiles"]
+    assert [p["id"] for p in listing] == ["req-1"]
+    assert listing[0]["status"] == 200 and listing[0]["endpoint"] == "OCR_extract_text"
+    assert listing[0]["samples"] > 0
+
+    download = profiled.get("/api/profiles/req-1", headers=token)
+    assert download.status_code == 200
+    lines = download.get_data(as_text=True).splitlines()
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any("ExtractText.post (app/routes.py:" in line for line in lines)
+    assert profiled.get("/api/profiles/../x", headers=token).status_code == 404
+
+
+def test_untagged_requests_are_not_profiled(profiled, fake_vision, tmp_path):
+    response = extract(profiled, {"X-Profile-Token": "wrong"})
+    assert response.status_code == 200
+    assert "X-Profile-ID" not in response.headers
+    assert os.listdir(tmp_path) == []
+
+
+def test_profiling_off_adds_no_hooks(client, fake_vision):
+    assert "X-Profile-ID" not in extract(client).headers
+    assert client.get("/api/profiles").status_code == 404
+    hooks = client.application.before_request_funcs[None]
+    assert [f.__name__ for f in hooks if f.__name__ == "start_profile"] == []
+
+
+def test_store_deletes_oldest_profiles_beyond_cap(tmp_path):
+    store = ProfileStore(str(tmp_path), max_bytes=1500)
+    stacks = Counter({"a;b;" + "c" * 400: 3})
+    for n in range(4):
+        store.save(f"p{n}", stacks, {"id": f"p{n}"})
+        for suffix in (".folded", ".json"):
+            os.utime(tmp_path / f"p{n}{suffix}", (n, n))
+    store.rotate()
+    assert [p["id"] for p in store.list()] == ["p3", "p2", "p1"]
+    assert sum(p["bytes"] for p in store.list()) <= 1500
+    assert store.path("p0") is None
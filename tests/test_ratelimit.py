@@ -0,0 +1,75 @@
+import io, multiprocessing
+
+from limits import RateLimitItemPerMinute
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter
+
+from app import create_app
+from app.config import Config
+from app.services.ratelimit import QuotaExceeded, SQLiteStorage, TokenBucketQuota
+
+
+def _hit_in_child(uri, queue):
+    limiter = FixedWindowRateLimiter(storage_from_string(uri))
+    queue.put([limiter.hit(RateLimitItemPerMinute(3), "client") for _ in range(2)])
+
+
+def test_sqlite_storage_is_shared_between_processes(tmp_path):
+    uri = f"sqlite:///{tmp_path / 'limits.sqlite3'}"
+    storage = storage_from_string(uri)
+    assert isinstance(storage, SQLiteStorage)
+    limiter = FixedWindowRateLimiter(storage)
+    assert limiter.hit(RateLimitItemPerMinute(3), "client")
+
+    # Another worker process sees the same window: 1 + 2 hits, the 4th is refused
+    queue = multiprocessing.get_context("fork").Queue()
+    child = multiprocessing.get_context("fork").Process(
+        target=_hit_in_child, args=(uri, queue)
+    )
+    child.start()
+    child.join()
+    assert queue.get() == [True, True]
+    assert not limiter.hit(RateLimitItemPerMinute(3), "client")
+
+
+def test_token_bucket_weighs_images_and_bytes():
+    quota = TokenBucketQuota("", images_per_minute=10, bytes_per_minute=1000)
+    remaining = quota.consume("key-a", images=6, nbytes=100)
+    assert remaining["images"] == 4
+
+    try:
+        quota.consume("key-a", images=6, nbytes=100)
+    except QuotaExceeded as e:
+        # 2 images short at 10/minute refill -> about 12 seconds
+        assert 10 <= e.retry_after <= 13
+    else:
+        raise AssertionError("quota should have been exceeded")
+
+    # Bytes are a separate bucket; other keys are independent
+    quota.consume("key-b", images=1, nbytes=900)
+    try:
+        quota.consume("key-b", images=1, nbytes=900)
+        raise AssertionError("byte quota should have been exceeded")
+    except QuotaExceeded:
+        pass
+
+
+def test_extract_text_returns_429_when_quota_exhausted(monkeypatch, fake_vision):
+    monkeypatch.setattr(Config, "QUOTA_IMAGES_PER_MINUTE", 2)
+    monkeypatch.setattr(Config, "RATELIMIT_ENABLED", False)
+    app = create_app()
+    client = app.test_client()
+
+    def upload(key):
+        return client.post(
+            "/api/extract-text-batch",
+            data={"image": [(io.BytesIO(b"img"), f"{n}.jpg") for n in range(2)]},
+            content_type="multipart/form-data",
+            headers={"X-API-Key": key},
+        )
+
+    assert upload("alice").status_code == 200
+    refused = upload("alice")
+    assert refused.status_code == 429
+    assert int(refused.headers["Retry-After"]) >= 1
+    assert upload("bob").status_code == 200
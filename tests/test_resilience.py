@@ -0,0 +1,126 @@
+import io, threading, time
+
+import pytest
+
+from app.services import admission, resilience, vision_client
+from app.services.admission import AIMDLimit, VisionExecutor
+from app.services.ocr_service import OCRService
+from app.services.resilience import Deadline, LatencyTracker, RequestTimeout, RetryPolicy
+from benchmarks.bench_mosaic import label
+
+IMAGE = label(0)
+
+
+@pytest.fixture
+def app(client):
+    app = client.application
+    app.config.update(
+        OCR_CACHE_ENABLED=False,
+        PREPROCESS_ENABLED=False,
+        VISION_RETRY_INITIAL_BACKOFF_SECONDS=0.01,
+        VISION_RETRY_MAX_BACKOFF_SECONDS=0.02,
+    )
+    app.extensions["ocr_cache"] = None
+    resilience._tracker = LatencyTracker()
+    yield app
+    resilience._tracker = LatencyTracker()
+
+
+def test_backoff_is_jittered_and_capped():
+    policy = RetryPolicy(max_attempts=5, initial_backoff=0.1, max_backoff=0.3)
+    delays = [policy.backoff(n) for n in range(5) for _ in range(50)]
+    assert all(0 <= d <= 0.3 for d in delays)
+    assert len(set(delays)) > 1
+
+
+def test_transient_errors_are_retried(app, fake_vision):
+    fake_vision.fail_first = 2
+    with app.app_context():
+        result = OCRService().extract_text(IMAGE)
+    assert result["text"] == "Hello World"
+    assert fake_vision.rpc_count == 3
+
+
+def test_retries_are_bounded(app, fake_vision):
+    fake_vision.fail_first = 10
+    with app.app_context():
+        with pytest.raises(RuntimeError, match="Google Vision API error"):
+            OCRService().extract_text(IMAGE)
+    assert fake_vision.rpc_count == 3
+
+
+def test_deadline_cuts_slow_call(app, fake_vision):
+    fake_vision.latency = 2.0
+    start = time.perf_counter()
+    with app.app_context():
+        with pytest.raises(RequestTimeout):
+            OCRService(Deadline(0.1)).extract_text(IMAGE)
+    assert time.perf_counter() - start < 1.0
+
+
+def test_client_deadline_header_gives_504(client, fake_vision):
+    fake_vision.latency = 2.0
+    response = client.post(
+        "/api/extract-text",
+        data={"image": (io.BytesIO(IMAGE), "test.png")},
+        content_type="multipart/form-data",
+        headers={"X-Request-Timeout": "0.1"},
+    )
+    assert response.status_code == 504
+
+
+
+def test_deadline_bounds_the_wait_for_an_executor_slot(app, fake_vision):
+    admission._executor = executor = VisionExecutor(AIMDLimit(1, 1, 1, adaptive=False))
+    gate = threading.Event()
+    executor.submit(gate.wait)
+    try:
+        start = time.perf_counter()
+        with app.app_context():
+            with pytest.raises(RequestTimeout):
+                OCRService(Deadline(0.2)).extract_text(IMAGE)
+            results = OCRService(Deadline(0.2)).extract_text_batch([label(1), label(2)])
+        assert all(isinstance(r, RequestTimeout) for r in results)
+        assert time.perf_counter() - start < 1.0
+        # The timed-out calls left the queue instead of running late
+        gate.set()
+        executor.submit(lambda: None).result(timeout=2)
+        assert executor.stats()["queued"] == 0 and fake_vision.rpc_count == 0
+    finally:
+        gate.set()
+        admission.reset()
+
+
+def test_vision_rpcs_disable_the_client_library_retry(app, fake_vision):
+    calls = []
+
+    class Spy:
+        def __getattr__(self, name):
+            method = getattr(fake_vision, name)
+
+            def call(*args, **kwargs):
+                calls.append(kwargs.get("retry", "default"))
+                return method(*args, **kwargs)
+
+            return call
+
+    vision_client.set_client(Spy())
+    with app.app_context():
+        OCRService().extract_text(IMAGE)
+        OCRService().extract_text_batch([label(1), label(2)])
+    assert calls == [None, None]
+
+
+def test_hedge_answers_before_slow_primary(app, fake_vision):
+    app.config["VISION_HEDGE_ENABLED"] = True
+    for _ in range(20):
+        resilience.get_latency_tracker().record(0.01)
+    latencies = iter([1.0])
+    fake_vision.latency_model = lambda: next(latencies, 0.0)
+
+    start = time.perf_counter()
+    with app.app_context():
+        result = OCRService().extract_text(IMAGE)
+    assert result["text"] == "Hello World"
+    assert time.perf_counter() - start < 0.5
+    assert fake_vision.rpc_count == 2
@@ -0,0 +1,92 @@
+import io, time
+
+import pytest
+
+from app import create_app
+from app.config import Config
+from app.services.search import SearchIndex, match_expression
+from app.utils import metrics
+from benchmarks.bench_mosaic import label
+
+IMAGE = label(0)
+
+
+def result(text: str) -> dict:
+    return {"text": text, "confidence": 0.9, "metadata": {"format": "PNG"}}
+
+
+@pytest.fixture
+def index(tmp_path):
+    return SearchIndex(str(tmp_path / "search.sqlite3"), batch_size=2, flush_seconds=0.05)
+
+
+def test_match_expression_quotes_words():
+    assert match_expression('total: "NOT" recei*') == '"total:" """NOT""" "recei"*'
+    assert match_expression(" * ") == ""
+
+
+def test_ranked_deduplicated_and_paginated(index):
+    index.add("a", "a.png", result("Grocery receipt total 12.50"))
+    index.add("b", "b.png", result("receipt receipt receipt"))
+    index.add("c", "c.png", result("Café invoice"))
+    index.add("a", "a-copy.png", result("Grocery receipt total 12.50"))
+    index.flush()
+    assert index.count() == 3
+
+    hits, more = index.search("receipt", limit=1)
+    assert more and hits[0]["hash"] == "b"
+    assert hits[0]["snippet"] == "[receipt] [receipt] [receipt]"
+    hits, more = index.search("receipt", limit=1, offset=1)
+    assert not more and hits[0]["filename"] == "a.png"
+    assert hits[0]["metadata"] == {"format": "PNG"}
+
+    assert [h["hash"] for h in index.search("cafe")[0]] == ["c"]  # diacritics folded
+    assert [h["hash"] for h in index.search("gro*  TOTAL")[0]] == ["a"]
+    assert index.search("receipt invoice") == ([], False)
+    with pytest.raises(ValueError):
+        index.search("  ")
+
+
+def test_only_newest_candidates_are_ranked(tmp_path):
+    index = SearchIndex(str(tmp_path / "search.sqlite3"), max_candidates=2)
+    for n, text in enumerate(["total total total", "total", "total"]):
+        index.add(str(n), f"{n}.png", result(text))
+    index.flush()
+    hits, more = index.search("total")
+    assert sorted(h["hash"] for h in hits) == ["1", "2"] and not more
+
+
+def test_full_queue_drops_instead_of_blocking(tmp_path):
+    index = SearchIndex(str(tmp_path / "search.sqlite3"), queue_size=1, flush_seconds=0.5)
+    dropped = metrics.SEARCH_DOCUMENTS.labels("dropped")
+    before = dropped._value.get()
+    start = time.perf_counter()
+    for n in range(50):
+        index.add(str(n), "x.png", result("word"))
+    assert time.perf_counter() - start < 0.5
+    assert dropped._value.get() - before >= 40
+
+
+def test_search_endpoint(monkeypatch, tmp_path, fake_vision):
+    monkeypatch.setattr(Config, "SEARCH_ENABLED", True)
+    monkeypatch.setattr(Config, "SEARCH_DB_PATH", str(tmp_path / "search.sqlite3"))
+    app = create_app()
+    client = app.test_client()
+    assert client.get("/api/search?q=hello").get_json()["results"] == []
+
+    response = client.post(
+        "/api/extract-text",
+        data={"image": (io.BytesIO(IMAGE), "scan.png")},
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == 200
+    app.extensions["ocr_search"].flush()
+
+    data = client.get("/api/search?q=hello&limit=500").get_json()
+    assert data["query"] == "hello" and data["next_offset"] is None
+    assert [r["filename"] for r in data["results"]] == ["scan.png"]
+    assert client.get("/api/search?q=*").status_code == 400
+
+
+def test_search_endpoint_disabled(client):
+    assert client.get("/api/search?q=hello").status_code == 404
@@ -0,0 +1,81 @@
+import threading
+
+import pytest
+
+from app.services.ocr_service import OCRService
+from app.services.singleflight import SingleFlight
+from benchmarks.bench_mosaic import label
+
+
+@pytest.fixture
+def app(client):
+    app = client.application
+    app.config.update(OCR_CACHE_ENABLED=False, PREPROCESS_ENABLED=False)
+    app.extensions["ocr_cache"] = None
+    return app
+
+
+def run_concurrently(app, n, fn):
+    barrier = threading.Barrier(n)
+    outcomes = [None] * n
+
+    def worker(i):
+        with app.app_context():
+            barrier.wait()
+            try:
+                outcomes[i] = fn()
+            except Exception as e:
+                outcomes[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return outcomes
+
+
+def test_concurrent_identical_uploads_share_one_call(app, fake_vision):
+    fake_vision.latency = 0.2
+    outcomes = run_concurrently(app, 5, lambda: OCRService().extract_text(label(0)))
+    assert all(r["text"] == "Hello World" for r in outcomes)
+    assert fake_vision.rpc_count == 1
+
+
+def test_waiters_receive_the_leaders_error(app, fake_vision):
+    app.config["VISION_RETRY_MAX_ATTEMPTS"] = 1
+    fake_vision.latency = 0.2
+    fake_vision.fail_first = 1
+    outcomes = run_concurrently(app, 3, lambda: OCRService().extract_text(label(0)))
+    assert all(isinstance(r, RuntimeError) for r in outcomes)
+    assert fake_vision.rpc_count == 1
+
+
+def test_key_is_released_after_the_call():
+    flights = SingleFlight()
+    future, leader = flights.begin("k")
+    assert leader and flights.begin("k") == (future, False)
+    flights.run("k", future, lambda: 42)
+    assert future.result() == 42 and len(flights) == 0
+    assert flights.begin("k")[1]
+
+
+def test_batch_duplicates_are_sent_once(app, fake_vision):
+    with app.app_context():
+        results = OCRService().extract_text_batch([label(1), label(2), label(1), label(1)])
+    assert [r["text"] for r in results] == ["Hello World"] * 4
+    assert fake_vision.image_count == 2
+
+
+def test_key_is_released_before_waiters_see_a_failure():
+    flights = SingleFlight()
+    future, _ = flights.begin("k")
+    seen = []
+    # A waiter woken by the failure retries at once and must lead a new call
+    future.add_done_callback(lambda f: seen.append(flights.begin("k")[1]))
+
+    def fail():
+        raise RuntimeError("boom")
+
+    flights.run("k", future, fail)
+    assert seen == [True]
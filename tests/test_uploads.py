@@ -0,0 +1,62 @@
+import io
+
+import pytest
+from flask import request
+from PIL import Image
+
+from app.services import uploads
+from app.services.admission import Overloaded
+from app.services.uploads import ByteBudget, read_upload
+from app.utils.file_utils import as_stream
+
+
+def png_bytes() -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", (40, 30), "white").save(out, format="PNG")
+    return out.getvalue()
+
+
+def test_pillow_reads_a_memoryview_without_copying():
+    view = memoryview(bytearray(png_bytes()))
+    with Image.open(as_stream(view)) as img:
+        assert img.size == (40, 30)
+
+
+@pytest.mark.parametrize("threshold, expected", [(10**9, bytes), (0, memoryview)])
+def test_large_uploads_are_spooled_and_mapped(client, threshold, expected):
+    app = client.application
+    app.config["UPLOAD_SPOOL_THRESHOLD"] = threshold
+    content = png_bytes()
+    with app.test_request_context(
+        "/", method="POST", data={"image": (io.BytesIO(content), "a.png")},
+        content_type="multipart/form-data",
+    ):
+        data = read_upload(request.files["image"])
+        assert isinstance(data, expected)
+        assert bytes(data) == content
+
+
+def test_byte_budget_blocks_then_sheds():
+    budget = ByteBudget(limit=100, timeout=0.05)
+    held = budget.acquire(80)
+    with pytest.raises(Overloaded):
+        budget.acquire(30)
+    budget.release(held)
+    # Oversized requests are clamped so they can still run alone
+    assert budget.acquire(500) == 100
+    assert budget.used == 100
+
+
+def test_batch_budget_is_released_after_request(client, fake_vision):
+    app = client.application
+    app.config.update(UPLOAD_SPOOL_THRESHOLD=0, PREPROCESS_ENABLED=False)
+    uploads.reset()
+    response = client.post(
+        "/api/extract-text-batch",
+        data={"image": [(io.BytesIO(png_bytes()), f"{n}.png") for n in range(3)]},
+        content_type="multipart/form-data",
+    )
+    assert response.status_code == 200
+    assert all(r["success"] for r in response.get_json()["results"])
+    assert uploads.get_byte_budget(app.config).used == 0
+    uploads.reset()
@@ -0,0 +1,97 @@
+import subprocess, sys, threading
+
+from app.config import CREDENTIAL_VARS, Config, credentials_info
+from app.services import vision_client
+from app.services.ocr_service import OCRService
+from benchmarks.fake_vision import FakeVisionClient
+
+
+def test_pool_is_built_once_and_round_robins(client):
+    created = []
+
+    def factory():
+        created.append(FakeVisionClient())
+        return created[-1]
+
+    vision_client.set_client_factory(factory)
+    try:
+        config = {"VISION_POOL_SIZE": 3}
+        handed_out = [vision_client.get_client(config) for _ in range(6)]
+        assert len(created) == 3
+        assert handed_out[:3] == created
+        assert handed_out[3:] == created
+    finally:
+        vision_client.set_client_factory(None)
+
+
+def test_ocr_service_reuses_pooled_client(client, fake_vision):
+    with client.application.app_context():
+        assert OCRService().client is fake_vision
+        assert OCRService().client is fake_vision
+
+
+def test_pool_is_dropped_in_forked_child(fake_vision):
+    vision_client.get_client({})
+    assert vision_client._pool is not None
+    vision_client._after_fork_in_child()
+    assert vision_client._pool is None
+
+
+def test_channel_options_from_config():
+    options = dict(
+        vision_client.channel_options(
+            {"VISION_KEEPALIVE_MS": 5000, "VISION_MAX_MESSAGE_BYTES": 1024}
+        )
+    )
+    assert options["grpc.keepalive_time_ms"] == 5000
+    assert options["grpc.max_send_message_length"] == 1024
+    assert options["grpc.max_receive_message_length"] == 1024
+
+
+def test_app_import_does_not_load_the_vision_library():
+    code = "import sys, app; print(any(m.startswith('google.cloud') for m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "False"
+
+
+def test_readiness_follows_background_warm_up():
+    release = threading.Event()
+
+    def factory():
+        release.wait(5)
+        return FakeVisionClient()
+
+    vision_client.set_client_factory(factory)
+    try:
+        vision_client.start_warm_up({"VISION_POOL_SIZE": 1})
+        assert vision_client.readiness() == ("starting", None)
+        release.set()
+        vision_client._warmup_done.wait(5)
+        assert vision_client.readiness() == ("ready", None)
+
+        vision_client.set_client_factory(lambda: 1 / 0)
+        vision_client.start_warm_up()
+        vision_client._warmup_done.wait(5)
+        assert vision_client.readiness() == ("failed", "division by zero")
+    finally:
+        vision_client.set_client_factory(None)
+
+
+def test_ready_endpoint_and_probes_are_not_rate_limited(client, fake_vision):
+    vision_client.start_warm_up({})
+    vision_client._warmup_done.wait(5)
+    assert client.get("/api/health/ready").get_json() == {"status": "ready"}
+    statuses = {client.get("/api/health").status_code for _ in range(10)}
+    assert statuses == {200}
+
+
+def test_env_credentials_are_not_written_to_disk(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(Config, "GOOGLE_CREDENTIALS", str(tmp_path / "missing.json"))
+    monkeypatch.setattr(Config, "VISION_EMULATOR_HOST", "")
+    for name in CREDENTIAL_VARS:
+        monkeypatch.setenv(name, "x")
+    monkeypatch.setenv("GOOGLE_PRIVATE_KEY", "-----BEGIN-----\\nabc\\n-----END-----")
+    Config.validate_credentials()
+    assert list(tmp_path.iterdir()) == []
+    assert credentials_info()["private_key"] == "-----BEGIN-----\nabc\n-----END-----"